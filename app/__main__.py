@@ -0,0 +1,4 @@
+from app.runner import main
+
+# spawn 방식 워커는 패키지의 __main__ 을 다시 불러오지 못하므로 구현은 app.runner 에 둔다
+main()
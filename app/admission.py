@@ -0,0 +1,280 @@
+import os
+import math
+import time
+import logging
+from enum import IntEnum
+from json import dumps
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.auth import AuthenticationError, token_authority
+from app.metrics import registry, event_loop_monitor
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+# 마지막 갱신 이후 쌓인 토큰을 채우고 요청 비용만큼 뺀다. 모자라면 기다릴 시간을 돌려준다
+TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', ARGV[3])
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class Priority(IntEnum):
+    EMERGENCY = 0  # 구급 호출, 구급차 위치 전송
+    DISPATCH = 1  # 대시보드, 병원 측 호출 확인
+    AUTH = 2  # 로그인 (bcrypt)
+    MANAGEMENT = 3  # 회원가입, 코드 발급, 기록 조회 등 나머지
+
+
+ROUTE_PRIORITIES = {
+    "/emergency/new": Priority.EMERGENCY,
+    "/emergency/call": Priority.EMERGENCY,
+    "/emergency/finish": Priority.EMERGENCY,
+    "/emergency/live": Priority.EMERGENCY,
+    "/emergency/dashboard": Priority.DISPATCH,
+    "/emergency/hospital": Priority.DISPATCH,
+    "/user/login": Priority.AUTH,
+    "/user/logout": Priority.AUTH,
+}
+EXEMPT_PREFIXES = ("/health/", "/metrics", "/stats", "/docs", "/redoc", "/openapi")
+
+# 과부하 정도(0~1 이상)가 이 값을 넘으면 해당 등급부터 거절한다
+SHED_THRESHOLDS = {
+    Priority.EMERGENCY: math.inf,
+    Priority.DISPATCH: 0.9,
+    Priority.AUTH: 0.7,
+    Priority.MANAGEMENT: 0.5,
+}
+
+admission_rejected = registry.counter(
+    "aidnet_admission_rejected_total",
+    "Requests rejected by admission control",
+    ("priority", "reason"),
+)
+
+
+def classify(path: str) -> Priority | None:
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    return ROUTE_PRIORITIES.get(path, Priority.MANAGEMENT)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate  # 초당 채워지는 토큰 수
+        self.burst = burst
+
+    @classmethod
+    def from_env(cls, priority: Priority, rate: float, burst: float) -> "TokenBucket":
+        return cls(
+            float(os.getenv(f"ADMISSION_{priority.name}_RATE", rate)),
+            float(os.getenv(f"ADMISSION_{priority.name}_BURST", burst)),
+        )
+
+
+class AdmissionController:
+    key_prefix = "admission:"
+
+    def __init__(
+        self,
+        buckets: dict[Priority, TokenBucket],
+        max_inflight: int = 256,
+        max_lag: float = 0.1,
+        enabled: bool = True,
+    ):
+        self.buckets = buckets
+        self.max_inflight = max_inflight
+        self.max_lag = max_lag  # 초 단위 이벤트 루프 지연 한도
+        self.enabled = enabled
+        self._redis: redis.Redis | None = None
+        self._take = None
+        # 버킷이 거절한 대상은 다시 찰 때까지 Redis 에 묻지 않고 바로 거절한다
+        self._denied: dict[str, float] = {}
+        self.inflight = 0
+        self.admitted = {priority: 0 for priority in Priority}
+        self.limited = {priority: 0 for priority in Priority}
+        self.shed = {priority: 0 for priority in Priority}
+        self.limiter_errors = 0
+        self.denied_locally = 0
+
+    def load(self) -> float:
+        # 처리 중인 요청 수와 이벤트 루프 지연 중 더 나쁜 쪽을 과부하 정도로 본다
+        return max(
+            self.inflight / self.max_inflight,
+            event_loop_monitor.last_lag / self.max_lag,
+        )
+
+    async def take(self, priority: Priority, identity: str) -> float:
+        key = f"{self.key_prefix}{priority.name.lower()}:{identity}"
+        now = time.monotonic()
+        denied_until = self._denied.get(key)
+        if denied_until is not None:
+            if denied_until > now:
+                self.denied_locally += 1
+                return denied_until - now
+            del self._denied[key]
+
+        bucket = self.buckets[priority]
+        try:
+            allowed, retry_after = await self._take(
+                keys=[key], args=[bucket.rate, bucket.burst, repr(time.time()), 1]
+            )
+        except Exception:
+            # 제한기가 고장 나도 응급 요청이 막히면 안 되므로 통과시킨다
+            self.limiter_errors += 1
+            logger.exception("Token bucket check failed")
+            return 0.0
+        if allowed:
+            return 0.0
+        retry_after = float(retry_after)
+        if len(self._denied) >= 10000:
+            self._denied = {k: v for k, v in self._denied.items() if v > now}
+        self._denied[key] = now + retry_after
+        return retry_after
+
+    async def admit(
+        self, priority: Priority, identity: str
+    ) -> tuple[str, float] | None:
+        if self.load() >= SHED_THRESHOLDS[priority]:
+            self.shed[priority] += 1
+            admission_rejected.inc(priority.name, "overloaded")
+            return "overloaded", 1.0
+        if self._take is not None:
+            retry_after = await self.take(priority, identity)
+            if retry_after > 0:
+                self.limited[priority] += 1
+                admission_rejected.inc(priority.name, "rate_limited")
+                return "rate_limited", retry_after
+        self.admitted[priority] += 1
+        return None
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._take = redis_connection.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def stop(self):
+        self._take = None
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "inflight": self.inflight,
+            "load": self.load(),
+            "limiter_errors": self.limiter_errors,
+            "denied_locally": self.denied_locally,
+            **{
+                f"{name}_{priority.name.lower()}": counts[priority]
+                for name, counts in (
+                    ("admitted", self.admitted),
+                    ("limited", self.limited),
+                    ("shed", self.shed),
+                )
+                for priority in Priority
+            },
+        }
+
+
+def _identity(scope) -> str:
+    # 토큰이 있으면 사용자 단위, 없으면 접속 주소 단위로 제한한다
+    token = None
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            token = value[7:].decode()
+            break
+    if token is None and scope["type"] == "websocket":
+        for pair in scope.get("query_string", b"").decode().split("&"):
+            if pair.startswith("token="):
+                token = pair[6:]
+                break
+    if token is not None:
+        try:
+            return "user:" + token_authority.authenticate(token).user_id
+        except AuthenticationError:
+            pass
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController | None = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] not in ("http", "websocket") or not controller.enabled:
+            return await self.app(scope, receive, send)
+        priority = classify(scope["path"])
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        rejected = await controller.admit(priority, _identity(scope))
+        if rejected is not None:
+            reason, retry_after = rejected
+            if scope["type"] == "websocket":
+                # 1013: 나중에 다시 시도
+                return await send({"type": "websocket.close", "code": 1013})
+            body = dumps(
+                {
+                    "code": 429,
+                    "message": "Too Many Requests",
+                    "data": {"priority": priority.name, "reason": reason},
+                    "errors": [],
+                }
+            ).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", str(math.ceil(retry_after)).encode()),
+                    ],
+                }
+            )
+            return await send({"type": "http.response.body", "body": body})
+
+        # 웹소켓은 오래 유지되므로 처리 중 요청 수에는 넣지 않는다
+        if scope["type"] == "websocket":
+            return await self.app(scope, receive, send)
+        controller.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.inflight -= 1
+
+
+admission_controller = AdmissionController(
+    buckets={
+        Priority.EMERGENCY: TokenBucket.from_env(Priority.EMERGENCY, 20, 40),
+        Priority.DISPATCH: TokenBucket.from_env(Priority.DISPATCH, 10, 20),
+        Priority.AUTH: TokenBucket.from_env(Priority.AUTH, 1, 5),
+        Priority.MANAGEMENT: TokenBucket.from_env(Priority.MANAGEMENT, 2, 10),
+    },
+    max_inflight=int(os.getenv("ADMISSION_MAX_INFLIGHT", "256")),
+    max_lag=float(os.getenv("ADMISSION_MAX_LAG", "0.1")),
+    enabled=os.getenv("ADMISSION_ENABLED", "1") == "1",
+)
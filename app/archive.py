@@ -0,0 +1,195 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from dotenv import load_dotenv
+
+from app.tourstore import tour_store
+from app.track import encode_track, unpack_points
+from database.tour import TourArchive
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+
+def _datetime(timestamp: bytes | None) -> datetime | None:
+    return datetime.fromtimestamp(float(timestamp), timezone.utc) if timestamp else None
+
+
+class TourArchiver:
+    group = "archiver"
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        block: float = 1.0,
+        claim_idle: float = 60.0,
+    ):
+        self.batch_size = batch_size
+        self.block = block  # 초 단위, 새 항목을 기다리는 시간
+        self.claim_idle = claim_idle  # 초 단위, 멈춘 항목을 넘겨받는 기준
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis: redis.Redis | None = None
+        self._worker: asyncio.Task | None = None
+        self.archived = 0
+        self.batches = 0
+        self.points = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.claimed = 0
+        self.failures = 0
+        self.elapsed = 0.0
+
+    async def _ensure_group(self):
+        try:
+            await self._redis.xgroup_create(
+                tour_store.archive_stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    async def archive(self, entries: list[tuple[bytes, dict]]) -> int:
+        started = time.perf_counter()
+        keys = []
+        for _, fields in entries:
+            key = tour_store.archive_key(
+                fields[b"user_id"].decode(), fields[b"archive_id"].decode()
+            )
+            keys.append((key, key + ":track"))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, track_key in keys:
+                pipe.hgetall(key)
+                pipe.lrange(track_key, 0, -1)
+            results = await pipe.execute()
+
+        rows = []
+        for (_, fields), data, items in zip(entries, results[::2], results[1::2]):
+            # 이미 보관하고 지운 뒤 ACK 만 못 한 항목은 건너뛴다
+            if not data:
+                continue
+            tour = tour_store.decode(data)
+            points = unpack_points(items)
+            track = encode_track(points) if len(points) else None
+            rows.append(
+                TourArchive(
+                    id=fields[b"archive_id"].decode(),
+                    user_id=fields[b"user_id"].decode(),
+                    patient_name=tour["patient_name"],
+                    symptom=tour["symptom"],
+                    license_number=tour["license_number"],
+                    status=tour["status"],
+                    hospital=tour["hospital"],
+                    started_at=_datetime(data.get(b"created_at")),
+                    finished_at=_datetime(data[b"finished_at"]),
+                    point_count=len(points),
+                    track=track,
+                )
+            )
+            self.points += len(points)
+            self.raw_bytes += points.nbytes
+            self.encoded_bytes += len(track or b"")
+        if rows:
+            # 처리 도중 죽어 다시 넘겨받은 항목이 중복 저장되지 않도록 충돌은 무시한다
+            await TourArchive.bulk_create(rows, ignore_conflicts=True)
+
+        ids = [entry_id for entry_id, _ in entries]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.xack(tour_store.archive_stream, self.group, *ids)
+            pipe.xdel(tour_store.archive_stream, *ids)
+            pipe.delete(*(key for pair in keys for key in pair))
+            await pipe.execute()
+
+        self.archived += len(rows)
+        self.batches += 1
+        self.elapsed += time.perf_counter() - started
+        return len(rows)
+
+    async def _claim(self) -> list[tuple[bytes, dict]]:
+        _, entries, *_ = await self._redis.xautoclaim(
+            tour_store.archive_stream,
+            self.group,
+            self.consumer,
+            min_idle_time=int(self.claim_idle * 1000),
+            count=self.batch_size,
+        )
+        self.claimed += len(entries)
+        return entries
+
+    async def _read(self) -> list[tuple[bytes, dict]]:
+        started = time.monotonic()
+        response = await self._redis.xreadgroup(
+            self.group,
+            self.consumer,
+            {tour_store.archive_stream: ">"},
+            count=self.batch_size,
+            block=int(self.block * 1000),
+        )
+        if response:
+            return response[0][1]
+        # 블로킹 읽기를 흉내만 내는 서버(fakeredis 등)에서 바쁜 대기를 하지 않도록 한다
+        remaining = self.block - (time.monotonic() - started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return []
+
+    async def _run(self):
+        claimed_at = 0.0
+        while True:
+            try:
+                await self._ensure_group()
+                break
+            except Exception:
+                logger.exception("Failed to create tour archive consumer group")
+                await asyncio.sleep(self.block)
+        while True:
+            try:
+                # 다른 워커가 처리하다 멈춘 항목을 가끔 넘겨받아 마저 보관한다
+                entries = []
+                if time.monotonic() - claimed_at > self.claim_idle:
+                    claimed_at = time.monotonic()
+                    entries = await self._claim()
+                if not entries:
+                    entries = await self._read()
+                if entries:
+                    await self.archive(entries)
+            except Exception:
+                self.failures += 1
+                logger.exception("Failed to archive finished tours")
+                await asyncio.sleep(self.block)
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "archived": self.archived,
+            "batches": self.batches,
+            "claimed": self.claimed,
+            "failures": self.failures,
+            "points": self.points,
+            "compression_ratio": (
+                self.raw_bytes / self.encoded_bytes if self.encoded_bytes else 0.0
+            ),
+            "avg_batch_ms": self.elapsed / self.batches * 1000 if self.batches else 0.0,
+        }
+
+
+tour_archiver = TourArchiver(
+    batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", "200")),
+    block=float(os.getenv("ARCHIVE_BLOCK", "1.0")),
+    claim_idle=float(os.getenv("ARCHIVE_CLAIM_IDLE", "60")),
+)
@@ -0,0 +1,294 @@
+import os
+import jwt
+import time
+import uuid
+import asyncio
+import logging
+import functools
+from json import dumps, loads
+from datetime import timedelta
+from dotenv import load_dotenv
+
+import redis.asyncio as redis
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jwt.exceptions import InvalidTokenError
+from tortoise.signals import post_save, post_delete
+
+from app.bitflag import UserFlag, UserBitflag
+from database.user import User as DatabaseUser
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+# 클레임 구조가 바뀌면 올려서 이전 형식의 토큰을 모두 거부한다
+CLAIMS_VERSION = 1
+MAX_TOKEN_LIFETIME = timedelta(days=10)
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+class Principal:
+    __slots__ = ("user_id", "username", "permissions", "token_id", "expires_at")
+
+    def __init__(
+        self,
+        user_id: str,
+        username: str,
+        permissions: UserBitflag,
+        token_id: str,
+        expires_at: float,
+    ):
+        self.user_id = user_id
+        self.username = username
+        self.permissions = permissions
+        self.token_id = token_id
+        self.expires_at = expires_at
+
+    def has(self, flag: UserFlag) -> bool:
+        return self.permissions.has(flag)
+
+
+class TokenAuthority:
+    revoked_key = "auth:revoked"
+    not_before_key = "auth:not_before"
+    revoke_channel = "auth:revoke"
+
+    def __init__(self, prune_interval: float = 60.0):
+        self.prune_interval = prune_interval
+        # jti -> 만료 시각, user_id -> 이 시각 이전에 발급된 토큰 무효
+        self.revoked: dict[str, float] = {}
+        self.not_before: dict[str, float] = {}
+        self._redis: redis.Redis | None = None
+        self._listener: asyncio.Task | None = None
+        self._pruner: asyncio.Task | None = None
+        self.authenticated = 0
+        self.rejected = 0
+        self.resubscribes = 0
+
+    @staticmethod
+    def _secret() -> str:
+        return os.environ["JWT_SECRET_KEY"]
+
+    def issue(self, user: DatabaseUser, expires_delta: timedelta) -> str:
+        issued_at = time.time()
+        return jwt.encode(
+            {
+                "sub": str(user.id),
+                "username": user.username,
+                "perm": user.flags,
+                "pv": CLAIMS_VERSION,
+                "jti": uuid.uuid4().hex,
+                "iat": issued_at,
+                "exp": int(issued_at + expires_delta.total_seconds()),
+            },
+            self._secret(),
+            algorithm="HS256",
+        )
+
+    def authenticate(self, token: str) -> Principal:
+        try:
+            payload = jwt.decode(
+                token,
+                self._secret(),
+                algorithms=["HS256"],
+                options={"require": ["sub", "jti", "iat", "exp"]},
+            )
+        except InvalidTokenError:
+            self.rejected += 1
+            raise AuthenticationError("Invalid token")
+        user_id = payload["sub"]
+        if (
+            payload.get("pv") != CLAIMS_VERSION
+            or payload["jti"] in self.revoked
+            or payload["iat"] < self.not_before.get(user_id, 0.0)
+        ):
+            self.rejected += 1
+            raise AuthenticationError("Token has been revoked")
+        self.authenticated += 1
+        return Principal(
+            user_id=user_id,
+            username=payload.get("username", ""),
+            permissions=UserBitflag.unzip(payload.get("perm", 0)),
+            token_id=payload["jti"],
+            expires_at=payload["exp"],
+        )
+
+    async def revoke_token(self, principal: Principal):
+        self.revoked[principal.token_id] = principal.expires_at
+        if self._redis is None:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.revoked_key, {principal.token_id: principal.expires_at})
+            pipe.publish(
+                self.revoke_channel,
+                dumps({"jti": principal.token_id, "exp": principal.expires_at}),
+            )
+            await pipe.execute()
+
+    async def revoke_user(self, user_id: str):
+        not_before = time.time()
+        self.not_before[user_id] = not_before
+        if self._redis is None:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hset(self.not_before_key, user_id, not_before)
+            pipe.publish(
+                self.revoke_channel,
+                dumps({"sub": user_id, "nbf": not_before}),
+            )
+            await pipe.execute()
+
+    def _apply(self, message: dict):
+        if "jti" in message:
+            self.revoked[message["jti"]] = message["exp"]
+        else:
+            current = self.not_before.get(message["sub"], 0.0)
+            self.not_before[message["sub"]] = max(current, message["nbf"])
+
+    async def _load(self):
+        revoked = await self._redis.zrangebyscore(
+            self.revoked_key, time.time(), "+inf", withscores=True
+        )
+        for token_id, expires_at in revoked:
+            self.revoked[token_id.decode()] = expires_at
+        for user_id, not_before in (
+            await self._redis.hgetall(self.not_before_key)
+        ).items():
+            self._apply({"sub": user_id.decode(), "nbf": float(not_before)})
+
+    async def _subscribe(self):
+        # 구독을 먼저 걸어 두어야 적재하는 동안 들어온 폐기를 놓치지 않는다
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.revoke_channel)
+        await self._load()
+        return pubsub
+
+    async def _listen(self, pubsub):
+        while True:
+            if pubsub is not None:
+                try:
+                    async for message in pubsub.listen():
+                        try:
+                            self._apply(loads(message["data"]))
+                        except Exception:
+                            logger.exception("Failed to apply token revocation")
+                except Exception:
+                    logger.exception("Lost token revocation subscription")
+                finally:
+                    await pubsub.aclose()
+            # 끊긴 동안 놓친 폐기는 다시 구독한 뒤 Redis 에서 전체를 읽어 채운다
+            await asyncio.sleep(1.0)
+            try:
+                pubsub = await self._subscribe()
+                self.resubscribes += 1
+            except Exception:
+                logger.exception("Failed to resubscribe to token revocations")
+                pubsub = None
+
+    def prune(self):
+        now = time.time()
+        self.revoked = {
+            token_id: expires_at
+            for token_id, expires_at in self.revoked.items()
+            if expires_at > now
+        }
+        # 최대 유효기간보다 오래된 기준 시각은 더 이상 걸러낼 토큰이 없다
+        oldest = now - MAX_TOKEN_LIFETIME.total_seconds()
+        self.not_before = {
+            user_id: not_before
+            for user_id, not_before in self.not_before.items()
+            if not_before > oldest
+        }
+        return oldest
+
+    async def _prune_redis(self, oldest: float):
+        stale_users = [
+            user_id
+            for user_id, not_before in (
+                await self._redis.hgetall(self.not_before_key)
+            ).items()
+            if float(not_before) <= oldest
+        ]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.revoked_key, "-inf", time.time())
+            if stale_users:
+                pipe.hdel(self.not_before_key, *stale_users)
+            await pipe.execute()
+
+    async def _prune_periodically(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            try:
+                await self._prune_redis(self.prune())
+            except Exception:
+                logger.exception("Failed to prune revoked tokens")
+
+    async def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._listener = asyncio.create_task(self._listen(await self._subscribe()))
+        self._pruner = asyncio.create_task(self._prune_periodically())
+
+    async def stop(self):
+        for task in (self._listener, self._pruner):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._listener = None
+        self._pruner = None
+        self._redis = None
+        self.revoked.clear()
+        self.not_before.clear()
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self.revoked),
+            "revoked_users": len(self.not_before),
+            "authenticated": self.authenticated,
+            "rejected": self.rejected,
+            "resubscribes": self.resubscribes,
+        }
+
+
+token_authority = TokenAuthority(
+    prune_interval=float(os.getenv("AUTH_PRUNE_INTERVAL", "60")),
+)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+
+async def get_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    try:
+        return token_authority.authenticate(token)
+    except AuthenticationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@functools.cache
+def require(flag: UserFlag):
+    async def dependency(principal: Principal = Depends(get_principal)) -> Principal:
+        if not principal.has(flag):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"FLAG: {flag.name}, insufficient permissions",
+            )
+        return principal
+
+    return dependency
+
+
+@post_save(DatabaseUser)
+async def _revoke_saved_user(sender, instance, created, using_db, update_fields):
+    # 권한이나 비밀번호가 바뀌면 기존 토큰의 perm 클레임은 더 이상 믿을 수 없다
+    if not created:
+        await token_authority.revoke_user(str(instance.id))
+
+
+@post_delete(DatabaseUser)
+async def _revoke_deleted_user(sender, instance, using_db):
+    await token_authority.revoke_user(str(instance.id))
@@ -0,0 +1,313 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Iterable
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.connection import ConnectionManager
+from app.spatial import UNKNOWN_BEDS, HospitalIndex, hospital_index
+from app.specialty import SPECIALTY_BITS
+from interface.emergency import EmergencyTourOPCode
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+# 병원별 해시의 값을 바꾸고, 실제로 바뀐 필드만 seq 를 붙여 변경 기록에 남긴다
+UPDATE_SCRIPT = """
+local changed = {}
+for i = 3, #ARGV, 3 do
+    local field = ARGV[i]
+    local current = redis.call('HGET', KEYS[1], field)
+    local old = tonumber(current or '0')
+    local new = tonumber(ARGV[i + 2])
+    if ARGV[i + 1] == 'add' then
+        new = old + new
+    end
+    if new < 0 then
+        new = 0
+    end
+    if new ~= old or (current == false and ARGV[i + 1] == 'set') then
+        redis.call('HSET', KEYS[1], field, new)
+        changed[#changed + 1] = field
+        changed[#changed + 1] = new
+    end
+end
+if #changed == 0 then
+    return 0
+end
+redis.call('SADD', KEYS[2], ARGV[2])
+local seq = redis.call('INCR', KEYS[4])
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[1], '0-' .. seq,
+    'hospital_id', ARGV[2], unpack(changed))
+return seq
+"""
+
+COUNTERS = ("beds", "occupied")
+
+
+class CapacityBoard:
+    ids_key = "hospital:{capacity}:ids"
+    log_key = "hospital:{capacity}:log"
+    seq_key = "hospital:{capacity}:seq"
+
+    def __init__(self, index: HospitalIndex, history: int = 10000, block: float = 1.0):
+        self.index = index
+        self.history = history
+        self.block = block
+        # Redis 상태를 그대로 비춘 로컬 사본, 매칭은 이것을 반영한 인덱스 열을 읽는다
+        self.hospitals: dict[int, dict[str, int]] = {}
+        self.seq = 0
+        # 연결 키 -> 받아 볼 병원 (None 이면 전체), 병원 id -> 그 병원만 골라 보는 연결
+        self.watchers: dict[str, frozenset[int] | None] = {}
+        self.followers: dict[int, set[str]] = {}
+        self.everyone: set[str] = set()
+        self._redis: redis.Redis | None = None
+        self._manager: ConnectionManager | None = None
+        self._update = None
+        self._tail: asyncio.Task | None = None
+        self.updates = 0
+        self.unchanged = 0
+        self.received = 0
+        self.pushes = 0
+        self.reloads = 0
+
+    @staticmethod
+    def key(hospital_id: int) -> str:
+        return f"hospital:{{capacity}}:{hospital_id}"
+
+    @staticmethod
+    def _arguments(changes: dict[str, int] | None, mode: str) -> list[str | int]:
+        if changes is None:
+            return []
+        # 클라이언트가 보낸 값이라 모양이 다르면 소켓을 끊지 않고 오류로 돌려준다
+        if not isinstance(changes, dict):
+            raise ValueError(f"Capacity {mode} must be an object")
+        arguments = []
+        for field, value in changes.items():
+            if field not in COUNTERS and field not in SPECIALTY_BITS:
+                raise ValueError(f"Unknown capacity field {field}")
+            if type(value) is not int:
+                raise ValueError(f"Capacity field {field} must be an integer")
+            arguments.extend((field, mode, value))
+        return arguments
+
+    async def update(
+        self,
+        hospital_id: int,
+        values: dict[str, int] | None = None,
+        deltas: dict[str, int] | None = None,
+        client=None,
+    ) -> int:
+        # values 는 그대로 쓰고 deltas 는 더한다 (입원 +1, 퇴원 -1 등). 바뀐 게 없으면 0
+        arguments = self._arguments(values, "set") + self._arguments(deltas, "add")
+        seq = await self._update(
+            keys=[self.key(hospital_id), self.ids_key, self.log_key, self.seq_key],
+            args=[self.history, hospital_id, *arguments],
+            client=client,
+        )
+        self.updates += 1
+        if client is None and not seq:
+            self.unchanged += 1
+        return seq
+
+    def view(self, hospital_id: int) -> dict:
+        state = self.hospitals.get(hospital_id, {})
+        info = self.index.info.get(hospital_id, {})
+        beds = state["beds"] if "beds" in state else info.get("beds", UNKNOWN_BEDS)
+        occupied = state.get("occupied", 0)
+        known = beds != UNKNOWN_BEDS
+        return {
+            "hospital_id": hospital_id,
+            "beds": beds if known else None,
+            "occupied": occupied,
+            "available": max(beds - occupied, 0) if known else None,
+            "specialties": {
+                name: count for name, count in state.items() if name in SPECIALTY_BITS
+            },
+        }
+
+    def apply(self, hospital_id: int):
+        info = self.index.info.get(hospital_id)
+        if info is None:
+            return
+        state = self.hospitals.get(hospital_id, {})
+        # 보고된 진료과만 당직 인원으로 덮어쓰고, 나머지는 등록된 의료진 정보를 따른다
+        specialties = info["specialties"]
+        for name, count in state.items():
+            bit = SPECIALTY_BITS.get(name)
+            if bit is None:
+                continue
+            specialties = specialties | bit if count > 0 else specialties & ~bit
+        self.index.set_capacity(
+            hospital_id,
+            beds=state["beds"] if "beds" in state else info["beds"],
+            load=state.get("occupied", 0),
+            specialties=specialties,
+        )
+
+    async def reload(self):
+        # seq 를 먼저 읽으면 그 뒤 변경은 값 자체를 다시 적용하므로 사본이 어긋나지 않는다
+        seq = int(await self._redis.get(self.seq_key) or 0)
+        hospital_ids = [
+            int(value) for value in await self._redis.smembers(self.ids_key)
+        ]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for hospital_id in hospital_ids:
+                pipe.hgetall(self.key(hospital_id))
+            results = await pipe.execute()
+        self.hospitals = {
+            hospital_id: {field.decode(): int(value) for field, value in data.items()}
+            for hospital_id, data in zip(hospital_ids, results)
+        }
+        self.seq = seq
+        self.reloads += 1
+        for hospital_id in self.index.info:
+            self.apply(hospital_id)
+        self._push(list(self.index.info), self.everyone)
+        for key, hospital_ids in self.watchers.items():
+            if hospital_ids is not None:
+                self._push(self._known(hospital_ids), (key,))
+
+    def _push(self, hospital_ids: list[int], keys):
+        if not hospital_ids or not keys:
+            return
+        data = {
+            "version": self.seq,
+            "hospitals": [self.view(hospital_id) for hospital_id in hospital_ids],
+        }
+        # 병원 하나만 바뀐 경우에는 밀린 이전 상태를 최신 상태로 덮어쓴다
+        key = f"capacity:{hospital_ids[0]}" if len(hospital_ids) == 1 else None
+        encoded: dict[str, str | bytes] = {}
+        for watcher in tuple(keys):
+            connection = self._manager.active_connections.get(watcher)
+            if connection is None:
+                continue
+            codec = connection.codec
+            if codec.subprotocol not in encoded:
+                encoded[codec.subprotocol] = codec.encode(
+                    EmergencyTourOPCode.CAPACITY.value, data
+                )
+            if connection.enqueue(encoded[codec.subprotocol], key=key):
+                self.pushes += 1
+
+    def _known(self, hospital_ids: frozenset[int]) -> list[int]:
+        return sorted(
+            hospital_id
+            for hospital_id in hospital_ids
+            if hospital_id in self.index.info
+        )
+
+    @staticmethod
+    def parse(value: str) -> frozenset[int] | None:
+        # "all" 이면 전체, 아니면 쉼표로 구분한 병원 id
+        if value == "all":
+            return None
+        return frozenset(int(hospital_id) for hospital_id in value.split(","))
+
+    def watch(self, key: str, hospital_ids: Iterable[int] | None = None):
+        # 병원을 고르지 않으면 모든 병원의 상태와 변경을 받는다
+        self.unwatch(key)
+        if hospital_ids is None:
+            self.watchers[key] = None
+            self.everyone.add(key)
+            self._push(list(self.index.info), (key,))
+            return
+        hospital_ids = frozenset(hospital_ids)
+        self.watchers[key] = hospital_ids
+        for hospital_id in hospital_ids:
+            self.followers.setdefault(hospital_id, set()).add(key)
+        self._push(self._known(hospital_ids), (key,))
+
+    def unwatch(self, key: str):
+        hospital_ids = self.watchers.pop(key, None)
+        self.everyone.discard(key)
+        for hospital_id in hospital_ids or ():
+            followers = self.followers[hospital_id]
+            followers.discard(key)
+            if not followers:
+                del self.followers[hospital_id]
+
+    def _receive(self, entries: list) -> bool:
+        changed: dict[int, None] = {}
+        for entry_id, fields in entries:
+            seq = int(entry_id.split(b"-")[1])
+            if seq <= self.seq:
+                continue
+            if seq != self.seq + 1:
+                return False  # 기록이 잘려 나가 중간 변경을 놓쳤다
+            self.seq = seq
+            hospital_id = int(fields.pop(b"hospital_id"))
+            state = self.hospitals.setdefault(hospital_id, {})
+            for field, value in fields.items():
+                state[field.decode()] = int(value)
+            self.apply(hospital_id)
+            changed[hospital_id] = None
+        self.received += len(entries)
+        for hospital_id in changed:
+            self._push(
+                [hospital_id], self.everyone.union(self.followers.get(hospital_id, ()))
+            )
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                started = time.monotonic()
+                response = await self._redis.xread(
+                    {self.log_key: f"0-{self.seq}"},
+                    count=500,
+                    block=int(self.block * 1000),
+                )
+                if response:
+                    if not self._receive(response[0][1]):
+                        await self.reload()
+                    continue
+                # 블로킹 읽기를 흉내만 내는 서버(fakeredis 등)에서 바쁜 대기를 하지 않도록 한다
+                remaining = self.block - (time.monotonic() - started)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            except Exception:
+                logger.exception("Failed to read hospital capacity changes")
+                await asyncio.sleep(self.block)
+
+    async def start(self, redis_connection: redis.Redis, manager: ConnectionManager):
+        self._redis = redis_connection
+        self._manager = manager
+        self._update = redis_connection.register_script(UPDATE_SCRIPT)
+        self.index.capacity = self
+        await self.reload()
+        self._tail = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._tail is not None:
+            self._tail.cancel()
+            await asyncio.gather(self._tail, return_exceptions=True)
+            self._tail = None
+        self.index.capacity = None
+        self.watchers.clear()
+        self.followers.clear()
+        self.everyone.clear()
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "hospitals": len(self.hospitals),
+            "version": self.seq,
+            "watchers": len(self.watchers),
+            "followed": len(self.followers),
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+            "received": self.received,
+            "pushes": self.pushes,
+            "reloads": self.reloads,
+        }
+
+
+capacity_board = CapacityBoard(
+    hospital_index,
+    history=int(os.getenv("CAPACITY_HISTORY", "10000")),
+    block=float(os.getenv("CAPACITY_BLOCK", "1.0")),
+)
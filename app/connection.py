@@ -0,0 +1,321 @@
+import os
+import asyncio
+from enum import Enum
+from collections import deque
+
+from dotenv import load_dotenv
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from app.protocol import Codec, JSONCodec
+from interface.emergency import EmergencyTourOPCode
+
+load_dotenv(verbose=True)
+
+
+class SlowConsumerPolicy(Enum):
+    DROP_OLDEST = "drop_oldest"  # 가장 오래된 메시지 버리기
+    COALESCE = "coalesce"  # 같은 키의 메시지는 최신 상태로 덮어쓰기
+    DISCONNECT = "disconnect"  # 큐가 가득 차면 연결 끊기
+
+
+# 최신 값만 의미 있는 위치 프레임만 덮어쓴다
+COALESCED_OPS = frozenset({EmergencyTourOPCode.UPDATE_LOCATION.value})
+
+
+def coalesce_key(topic: str, op: int, data: dict | None) -> str | None:
+    # seq 가 붙은 프레임은 하나라도 빠지면 클라이언트가 이어 받기를 다시 하고,
+    # 상태 변경은 덮어쓰면 사라진다. 일부 필드만 담긴 프레임끼리는 필드 구성이 같을 때만 덮어쓴다
+    if op not in COALESCED_OPS or not data or "seq" in data:
+        return None
+    return f"{topic}:{op}:{','.join(sorted(data))}"
+
+
+class Connection:
+    __slots__ = (
+        "websocket",
+        "codec",
+        "max_queue",
+        "policy",
+        "queue",
+        "pending",
+        "sent",
+        "dropped",
+        "coalesced",
+        "max_depth",
+        "closed",
+        "held",
+        "_wakeup",
+        "_writer",
+        "_closer",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        policy: SlowConsumerPolicy,
+        codec: Codec = JSONCodec,
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue: deque[list] = deque()
+        self.pending: dict[str, list] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.closed = False
+        self.held: list[str] | None = None
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+        self._closer: asyncio.Task | None = None
+
+    def enqueue(self, payload: str | bytes, key: str | None = None) -> bool:
+        if self.closed:
+            return False
+        if self.policy == SlowConsumerPolicy.COALESCE and key is not None:
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry[1] = payload
+                self.coalesced += 1
+                return True
+
+        if len(self.queue) >= self.max_queue:
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                self.dropped += 1
+                self.close(code=1013)
+                return False
+            old_key, _ = self.queue.popleft()
+            if old_key is not None:
+                self.pending.pop(old_key, None)
+            self.dropped += 1
+
+        entry = [key, payload]
+        self.queue.append(entry)
+        if key is not None and self.policy == SlowConsumerPolicy.COALESCE:
+            self.pending[key] = entry
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._wakeup.set()
+        return True
+
+    def hold(self):
+        self.held = []
+
+    def release(self, after: int):
+        # 잡아 둔 발행 프레임 중 이미 보낸 seq 까지는 버린다
+        held, self.held = self.held, None
+        for payload in held or ():
+            op, data = JSONCodec.decode(payload)
+            if data and data.get("seq", after + 1) <= after:
+                continue
+            self.enqueue(
+                payload if self.codec is JSONCodec else self.codec.encode(op, data)
+            )
+
+    async def _write(self):
+        try:
+            while True:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                key, payload = self.queue.popleft()
+                if key is not None:
+                    self.pending.pop(key, None)
+                if self.codec.binary:
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+                self.sent += 1
+        except Exception:
+            self.closed = True
+
+    async def _close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # 이미 끊긴 연결
+
+    def close(self, code: int = 1000):
+        self.closed = True
+        self._writer.cancel()
+        if self._closer is None:
+            self._closer = asyncio.create_task(self._close(code))
+
+    def stop(self):
+        self.closed = True
+        self._writer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy.value,
+            "protocol": self.codec.subprotocol,
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        max_queue: int = 256,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST,
+    ):
+        self.max_queue = max_queue
+        self.policy = policy
+        self.active_connections: dict[str, Connection] = {}
+        self.subscribers: dict[str, set[str]] = {}
+        self.subscriptions: dict[str, tuple[str, ...]] = {}
+        self.heartbeat = None  # HeartbeatWheel 이 시작되면 연결되고 끊길 때 알린다
+
+    async def connect(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        topics: tuple[str, ...] = (),
+        policy: SlowConsumerPolicy | None = None,
+        codec: Codec = JSONCodec,
+        subprotocol: str | None = None,
+    ):
+        await websocket.accept(subprotocol=subprotocol)
+        if user_id in self.active_connections:
+            self.active_connections[user_id].close(code=1001)
+        self.active_connections.update(
+            {
+                user_id: Connection(
+                    websocket, self.max_queue, policy or self.policy, codec
+                )
+            }
+        )
+        self.subscriptions[user_id] = topics
+        for topic in topics:
+            self.subscribers.setdefault(topic, set()).add(user_id)
+        if self.heartbeat is not None:
+            self.heartbeat.add(user_id)
+
+    def _remove(self, user_id: str) -> Connection:
+        connection = self.active_connections.pop(user_id)
+        for topic in self.subscriptions.pop(user_id, ()):
+            self.subscribers[topic].discard(user_id)
+            if not self.subscribers[topic]:
+                del self.subscribers[topic]
+        if self.heartbeat is not None:
+            self.heartbeat.remove(user_id)
+        return connection
+
+    def owns(self, user_id: str, websocket: WebSocket) -> bool:
+        # 같은 사용자의 새 연결이 이미 자리를 차지했으면 False
+        connection = self.active_connections.get(user_id)
+        return connection is not None and connection.websocket is websocket
+
+    async def disconnect(self, user_id: str, websocket: WebSocket):
+        if not self.owns(user_id, websocket):
+            return
+        connection = self.active_connections[user_id]
+        connection.stop()
+        self._remove(user_id)
+        # 클라이언트가 먼저 끊은 경우에는 닫기 프레임을 보낼 수 없다
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
+
+    def touch(self, user_id: str):
+        if self.heartbeat is not None:
+            self.heartbeat.touch(user_id)
+
+    def ping(self, user_ids: list[str]):
+        encoded: dict[str, str | bytes] = {}
+        for user_id in user_ids:
+            connection = self.active_connections.get(user_id)
+            if connection is None:
+                continue
+            codec = connection.codec
+            if codec.subprotocol not in encoded:
+                encoded[codec.subprotocol] = codec.encode(
+                    EmergencyTourOPCode.HELLO.value, None
+                )
+            connection.enqueue(encoded[codec.subprotocol])
+
+    def reap(self, user_ids: list[str]):
+        # 응답 없는 연결을 목록에서 먼저 빼서 이후 전송이 낭비되지 않게 한다
+        for user_id in user_ids:
+            if user_id in self.active_connections:
+                self._remove(user_id).close(code=1001)
+
+    def send_each(self, user_id: str, data: dict) -> bool:
+        connection = self.active_connections[user_id]
+        return connection.enqueue(connection.codec.encode(data["op"], data["data"]))
+
+    def broadcast(self, data: dict) -> int:
+        # 프로토콜별로 한 번만 인코딩해서 모든 연결에 같은 페이로드를 넣는다
+        encoded: dict[str, str | bytes] = {}
+        delivered = 0
+        for connection in tuple(self.active_connections.values()):
+            codec = connection.codec
+            if codec.subprotocol not in encoded:
+                encoded[codec.subprotocol] = codec.encode(data["op"], data["data"])
+            delivered += connection.enqueue(encoded[codec.subprotocol])
+        return delivered
+
+    async def deliver(self, topic: str, payload: str) -> int:
+        encoded: dict[str, str | bytes] = {JSONCodec.subprotocol: payload}
+        decoded = None
+        key = None
+        delivered = 0
+        for user_id in tuple(self.subscribers.get(topic, ())):
+            connection = self.active_connections.get(user_id)
+            if connection is None:
+                continue
+            if connection.held is not None:
+                connection.held.append(payload)
+                delivered += 1
+                continue
+            codec = connection.codec
+            needs_key = connection.policy == SlowConsumerPolicy.COALESCE
+            if decoded is None and (needs_key or codec.subprotocol not in encoded):
+                decoded = JSONCodec.decode(payload)
+                key = coalesce_key(topic, *decoded)
+            if codec.subprotocol not in encoded:
+                encoded[codec.subprotocol] = codec.encode(*decoded)
+            if connection.enqueue(encoded[codec.subprotocol], key=key):
+                delivered += 1
+        return delivered
+
+    def stats(self) -> dict:
+        # 사용자나 대시보드 토큰이 드러나지 않도록 연결별 값은 합쳐서만 내보낸다
+        connections = self.active_connections.values()
+        policies: dict[str, int] = {}
+        protocols: dict[str, int] = {}
+        for connection in connections:
+            policies[connection.policy.value] = (
+                policies.get(connection.policy.value, 0) + 1
+            )
+            protocols[connection.codec.subprotocol] = (
+                protocols.get(connection.codec.subprotocol, 0) + 1
+            )
+        return {
+            "active": len(self.active_connections),
+            "policies": policies,
+            "protocols": protocols,
+            "queue_depth": sum(len(c.queue) for c in connections),
+            "max_queue_depth": max((c.max_depth for c in connections), default=0),
+            "sent": sum(c.sent for c in connections),
+            "dropped": sum(c.dropped for c in connections),
+            "coalesced": sum(c.coalesced for c in connections),
+        }
+
+
+websocket_manager = ConnectionManager(
+    max_queue=int(os.getenv("WEBSOCKET_QUEUE_SIZE", "256")),
+    policy=SlowConsumerPolicy(
+        os.getenv("WEBSOCKET_SLOW_CONSUMER_POLICY", "drop_oldest")
+    ),
+)
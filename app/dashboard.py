@@ -0,0 +1,302 @@
+import os
+import time
+import asyncio
+import logging
+
+import orjson
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.connection import ConnectionManager
+from app.tourstore import tour_store
+from interface.emergency import EmergencyTourOPCode
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+# 연속된 seq 를 스트림 ID 로 써야 클라이언트가 빠진 변경을 알아챌 수 있다
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '0-' .. seq,
+    'user_id', ARGV[2], 'op', ARGV[3], 'data', ARGV[4])
+return seq
+"""
+
+
+class DashboardFilter:
+    __slots__ = ("statuses", "user_ids")
+
+    def __init__(
+        self,
+        statuses: frozenset[int] | None = None,
+        user_ids: frozenset[str] | None = None,
+    ):
+        self.statuses = statuses
+        self.user_ids = user_ids
+
+    @classmethod
+    def parse(cls, status: str | None, user_id: str | None) -> "DashboardFilter":
+        return cls(
+            frozenset(int(value) for value in status.split(",")) if status else None,
+            frozenset(user_id.split(",")) if user_id else None,
+        )
+
+    def matches(self, user_id: str, status: int | None) -> bool:
+        if self.user_ids is not None and user_id not in self.user_ids:
+            return False
+        return self.statuses is None or status in self.statuses
+
+
+class DashboardSession:
+    __slots__ = ("key", "filter", "seq", "visible", "hidden", "buffer")
+
+    def __init__(self, key: str, dashboard_filter: DashboardFilter):
+        self.key = key
+        self.filter = dashboard_filter
+        self.seq = 0
+        self.visible: set[str] = set()
+        # 스냅샷 없이 이어 받는 세션은 클라이언트가 무엇을 보고 있는지 모른다
+        self.hidden: set[str] | None = None
+        # 스냅샷이나 재전송 중에 들어온 변경은 끝난 뒤 순서대로 보낸다
+        self.buffer: list[tuple] | None = None
+
+
+class DashboardFeed:
+    log_key = "emergency:{dashboard}:log"
+    seq_key = "emergency:{dashboard}:seq"
+
+    def __init__(self, history: int = 10000, page_size: int = 200, block: float = 1.0):
+        self.history = history
+        self.page_size = page_size
+        self.block = block
+        self.sessions: dict[str, DashboardSession] = {}
+        self._redis: redis.Redis | None = None
+        self._manager: ConnectionManager | None = None
+        self._append = None
+        self._tail: asyncio.Task | None = None
+        self.recorded = 0
+        self.received = 0
+        self.deltas_sent = 0
+        self.encoded = 0
+        self.snapshots = 0
+        self.snapshot_tours = 0
+        self.replays = 0
+
+    async def record(self, op: int, user_id: str, data: dict, client=None):
+        self.recorded += 1
+        return await self._append(
+            keys=[self.log_key, self.seq_key],
+            args=[self.history, user_id, op, orjson.dumps(data)],
+            client=client,
+        )
+
+    @staticmethod
+    def _entry(entry_id: bytes, fields: dict[bytes, bytes]) -> tuple:
+        return (
+            int(entry_id.split(b"-")[1]),
+            fields[b"user_id"].decode(),
+            int(fields[b"op"]),
+            orjson.loads(fields[b"data"]),
+        )
+
+    def _send(self, session: DashboardSession, op: int, data: dict, cache: dict):
+        connection = self._manager.active_connections.get(session.key)
+        if connection is None:
+            return
+        # 같은 변경은 프로토콜과 종류별로 한 번만 인코딩한다
+        cache_key = (connection.codec.subprotocol, data.get("removed", False))
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = cache[cache_key] = connection.codec.encode(op, data)
+            self.encoded += 1
+        connection.enqueue(payload)
+
+    def _deliver(self, session: DashboardSession, entry: tuple, cache: dict):
+        seq, user_id, op, data = entry
+        if seq <= session.seq:
+            return
+        session.seq = seq
+        status = data.get("status")
+        keep = not data.get("finished") and (
+            session.filter.matches(user_id, status)
+            or (status is None and user_id in session.visible)
+        )
+        if keep:
+            session.visible.add(user_id)
+            if session.hidden is not None:
+                session.hidden.discard(user_id)
+            removed = False
+        elif user_id in session.visible or (
+            session.hidden is not None and user_id not in session.hidden
+        ):
+            # 필터에서 벗어났거나 끝난 투어는 한 번만 제거하라고 알린다
+            session.visible.discard(user_id)
+            if session.hidden is not None:
+                session.hidden.add(user_id)
+            removed = True
+        else:
+            return
+        delta = {"seq": seq, "user_id": user_id, "op": op, "changes": data}
+        if removed:
+            delta["removed"] = True
+        self._send(session, EmergencyTourOPCode.DELTA.value, delta, cache)
+        self.deltas_sent += 1
+
+    def dispatch(self, entries: list[tuple]):
+        for entry in entries:
+            cache: dict = {}
+            for session in tuple(self.sessions.values()):
+                if session.buffer is not None:
+                    session.buffer.append(entry)
+                else:
+                    self._deliver(session, entry, cache)
+
+    def _drain(self, session: DashboardSession):
+        buffered, session.buffer = session.buffer, None
+        cache: dict = {}
+        for entry in buffered or ():
+            self._deliver(session, entry, cache)
+            cache.clear()
+
+    async def _send_page(
+        self,
+        session: DashboardSession,
+        seq: int,
+        page: int,
+        user_ids: list[str],
+        done: bool = False,
+    ) -> bool:
+        tours = await tour_store.get_many(user_ids) if user_ids else {}
+        if session.key not in self.sessions:
+            return False
+        visible = []
+        for user_id, tour in tours.items():
+            if session.filter.matches(user_id, tour["status"]):
+                session.visible.add(user_id)
+                visible.append({"user_id": user_id, **tour})
+        self.snapshot_tours += len(visible)
+        self._send(
+            session,
+            EmergencyTourOPCode.SNAPSHOT.value,
+            {"seq": seq, "page": page, "tours": visible, "done": done},
+            {},
+        )
+        return True
+
+    async def snapshot(self, session: DashboardSession):
+        # 현재 seq 를 먼저 읽어야 그 이후 변경이 스냅샷 위에 빠짐없이 쌓인다
+        session.buffer = []
+        session.visible.clear()
+        session.hidden = None
+        seq = int(await self._redis.get(self.seq_key) or 0)
+        page, user_ids = 0, []
+        async for user_id in tour_store.user_ids(count=self.page_size):
+            user_ids.append(user_id)
+            if len(user_ids) >= self.page_size:
+                if not await self._send_page(session, seq, page, user_ids):
+                    return
+                page, user_ids = page + 1, []
+        if not await self._send_page(session, seq, page, user_ids, done=True):
+            return
+        self.snapshots += 1
+        session.seq = seq
+        self._drain(session)
+
+    async def resync(self, key: str, seq: int | None):
+        session = self.sessions.get(key)
+        if session is None or session.buffer is not None:
+            return
+        if seq is not None:
+            session.buffer = []
+            first = await self._redis.xrange(self.log_key, count=1)
+            latest = int(await self._redis.get(self.seq_key) or 0)
+            # 놓친 변경이 아직 기록에 남아 있으면 그 부분만 다시 보낸다.
+            # 마지막 번호보다 큰 seq 는 다른 기록(초기화 전 등)의 것이라 스냅샷으로 맞춘다
+            if seq == latest or (
+                seq < latest and first and self._entry(*first[0])[0] <= seq + 1
+            ):
+                entries = await self._redis.xrange(
+                    self.log_key, min=f"0-{seq + 1}", max=f"0-{latest}"
+                )
+                if key not in self.sessions:
+                    return
+                session.seq = seq
+                cache: dict = {}
+                for entry in entries:
+                    self._deliver(session, self._entry(*entry), cache)
+                    cache.clear()
+                self.replays += 1
+                self._drain(session)
+                return
+            session.buffer = None
+        await self.snapshot(session)
+
+    async def attach(
+        self, key: str, dashboard_filter: DashboardFilter, seq: int | None = None
+    ):
+        session = self.sessions[key] = DashboardSession(key, dashboard_filter)
+        if seq is not None:
+            session.hidden = set()
+        await self.resync(key, seq)
+
+    def detach(self, key: str):
+        self.sessions.pop(key, None)
+
+    async def _run(self):
+        last = None
+        while True:
+            try:
+                if last is None:
+                    last = int(await self._redis.get(self.seq_key) or 0)
+                started = time.monotonic()
+                response = await self._redis.xread(
+                    {self.log_key: f"0-{last}"},
+                    count=500,
+                    block=int(self.block * 1000),
+                )
+                if response:
+                    entries = [self._entry(*entry) for entry in response[0][1]]
+                    last = entries[-1][0]
+                    self.received += len(entries)
+                    self.dispatch(entries)
+                    continue
+                # 블로킹 읽기를 흉내만 내는 서버(fakeredis 등)에서 바쁜 대기를 하지 않도록 한다
+                remaining = self.block - (time.monotonic() - started)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            except Exception:
+                logger.exception("Failed to read dashboard changes")
+                await asyncio.sleep(self.block)
+
+    def start(self, redis_connection: redis.Redis, manager: ConnectionManager):
+        self._redis = redis_connection
+        self._manager = manager
+        self._append = redis_connection.register_script(APPEND_SCRIPT)
+        self._tail = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._tail is not None:
+            self._tail.cancel()
+            await asyncio.gather(self._tail, return_exceptions=True)
+            self._tail = None
+        self.sessions.clear()
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "recorded": self.recorded,
+            "received": self.received,
+            "deltas_sent": self.deltas_sent,
+            "encoded": self.encoded,
+            "snapshots": self.snapshots,
+            "snapshot_tours": self.snapshot_tours,
+            "replays": self.replays,
+        }
+
+
+dashboard_feed = DashboardFeed(
+    history=int(os.getenv("DASHBOARD_HISTORY", "10000")),
+    page_size=int(os.getenv("DASHBOARD_PAGE_SIZE", "200")),
+    block=float(os.getenv("DASHBOARD_BLOCK", "1.0")),
+)
@@ -0,0 +1,550 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+
+import orjson
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.spatial import haversine
+from app.matching import HospitalMatcher, hospital_matcher
+from app.fanout import fanout_hub, hospital_topic
+from app.dashboard import dashboard_feed
+from app.capacity import capacity_board
+from app.resume import frame_log
+from app.tourstore import tour_store
+from app.metrics import registry
+from app.protocol import JSONCodec
+from interface.emergency import EmergencyTourOPCode, EmergencyTourStatus
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+START_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 0 then
+    return 0
+end
+if redis.call('HGET', KEYS[1], 'state') == 'pending' then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+local count = tonumber(ARGV[2])
+if count > 0 then
+    redis.call('RPUSH', KEYS[2], unpack(ARGV, 3, 2 + count))
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3 + count))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 기다리던 차수가 그대로일 때만 다음 후보들에게 요청을 넓힌다. 이전 차수의 요청은 계속 유효하다
+ESCALATE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'id', 'state', 'wave', 'deadline')
+if state[1] ~= ARGV[1] or state[2] ~= 'pending' then
+    return {0}
+end
+if state[3] ~= ARGV[2] then
+    return {1, state[3], state[4]}
+end
+local wave = redis.call('LRANGE', KEYS[2], 0, tonumber(ARGV[3]) - 1)
+if #wave == 0 then
+    redis.call('HSET', KEYS[1], 'state', 'exhausted')
+    local offered = redis.call('SMEMBERS', KEYS[3])
+    redis.call('DEL', KEYS[2], KEYS[3])
+    return {3, state[3], state[4], unpack(offered)}
+end
+redis.call('LTRIM', KEYS[2], #wave, -1)
+redis.call('SADD', KEYS[3], unpack(wave))
+local ttl = redis.call('TTL', KEYS[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+local next_wave = tostring(tonumber(state[3]) + 1)
+redis.call('HSET', KEYS[1], 'wave', next_wave, 'deadline', ARGV[4])
+return {2, next_wave, ARGV[4], unpack(wave)}
+"""
+
+# 요청을 받은 병원 중 가장 먼저 수락한 한 곳만 배정된다
+ACCEPT_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'id', 'state', 'created_at', 'wave')
+if state[1] ~= ARGV[1] or state[2] ~= 'pending'
+    or redis.call('SREM', KEYS[3], ARGV[2]) == 0 then
+    return {0}
+end
+redis.call('HSET', KEYS[1], 'state', 'matched', 'hospital_id', ARGV[2],
+    'matched_at', ARGV[4])
+local others = redis.call('SMEMBERS', KEYS[3])
+redis.call('DEL', KEYS[2], KEYS[3])
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('HSET', KEYS[4], 'hospital', ARGV[3])
+    redis.call('HINCRBY', KEYS[4], 'version', 1)
+end
+return {1, state[3], state[4], unpack(others)}
+"""
+
+DECLINE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'id', 'state', 'wave')
+if state[1] ~= ARGV[1] or state[2] ~= 'pending'
+    or redis.call('SREM', KEYS[2], ARGV[2]) == 0 then
+    return {-1}
+end
+return {redis.call('SCARD', KEYS[2]), state[3]}
+"""
+
+CANCEL_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'id', 'state')
+if state[2] ~= 'pending' then
+    return {0}
+end
+redis.call('HSET', KEYS[1], 'state', 'cancelled')
+local offered = redis.call('SMEMBERS', KEYS[3])
+redis.call('DEL', KEYS[2], KEYS[3])
+return {1, state[1], unpack(offered)}
+"""
+
+dispatch_match_seconds = registry.histogram(
+    "aidnet_dispatch_match_seconds",
+    "Seconds from dispatch start until a hospital accepted",
+    ("wave",),
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0),
+)
+dispatch_finished = registry.counter(
+    "aidnet_dispatch_finished_total",
+    "Dispatches by outcome",
+    ("outcome",),
+)
+
+
+class HospitalDispatcher:
+    # user_id -> 기다리는 차수의 마감 시각, 모든 워커가 함께 본다
+    deadlines_key = "emergency:{dispatch}:deadlines"
+
+    def __init__(
+        self,
+        matcher: HospitalMatcher,
+        wave_size: int = 3,
+        max_waves: int = 3,
+        wave_timeouts: tuple[float, ...] = (10.0, 15.0, 20.0),
+        ttl: int = 3600,
+        recovery_delay: float = 5.0,
+    ):
+        self.matcher = matcher
+        self.wave_size = wave_size
+        self.max_waves = max_waves
+        # 초 단위, 차수별 대기 시간 (차수가 더 많으면 마지막 값을 쓴다)
+        self.wave_timeouts = wave_timeouts
+        self.ttl = ttl
+        # 마감이 이만큼 지나도 그대로면 타이머를 돌리던 워커가 죽은 것으로 보고 이어 받는다
+        self.recovery_delay = recovery_delay
+        self._redis: redis.Redis | None = None
+        self._start = None
+        self._escalate = None
+        self._accept = None
+        self._decline = None
+        self._cancel = None
+        self._timers: dict[str, asyncio.Task] = {}
+        self._recovery: asyncio.Task | None = None
+        self.started = 0
+        self.matched = 0
+        self.exhausted = 0
+        self.cancelled = 0
+        self.escalations = 0
+        self.offers_sent = 0
+        self.declined = 0
+        self.lost = 0
+        self.recovered = 0
+        self.match_total = 0.0
+        self.match_max = 0.0
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"emergency:{{{user_id}}}:dispatch"
+
+    def keys(self, user_id: str) -> list[str]:
+        key = self.key(user_id)
+        return [key, key + ":candidates", key + ":offers"]
+
+    def timeout(self, wave: int) -> float:
+        return self.wave_timeouts[min(wave, len(self.wave_timeouts) - 1)]
+
+    def hospital(self, hospital_id: int) -> dict | None:
+        info = self.matcher.index.info.get(hospital_id)
+        if info is None:
+            return None
+        return {
+            "name": info["name"],
+            "address": info["address"],
+            "latitude": info["latitude"],
+            "longitude": info["longitude"],
+        }
+
+    def _publish(self, pipe, topic: str, op: EmergencyTourOPCode, data: dict):
+        fanout_hub.queue(pipe, topic, JSONCodec.encode(op.value, data))
+
+    async def dispatch(
+        self,
+        user_id: str,
+        latitude: float,
+        longitude: float,
+        symptom: str,
+        patient_name: str,
+    ) -> dict | None:
+        matches = self.matcher.match(
+            latitude, longitude, symptom, k=self.wave_size * self.max_waves
+        )
+        dispatch_id = str(uuid.uuid4())
+        info = {
+            "id": dispatch_id,
+            "state": "pending",
+            "wave": "0",
+            "deadline": "0",
+            "created_at": repr(time.time()),
+            "patient_name": patient_name,
+            "symptom": symptom,
+            "latitude": repr(latitude),
+            "longitude": repr(longitude),
+        }
+        started = await self._start(
+            keys=[*self.keys(user_id), tour_store.key(user_id)],
+            args=[
+                self.ttl,
+                len(matches),
+                *(match.hospital_id for match in matches),
+                *(item for pair in info.items() for item in pair),
+            ],
+        )
+        if not started:
+            return None
+        self.started += 1
+
+        current = await self.escalate(user_id, dispatch_id, 0, info)
+        if current is None:
+            return {"dispatch_id": dispatch_id, "state": "exhausted", "wave": 0}
+        wave, deadline = current
+        self._schedule(user_id, dispatch_id, wave, deadline, info)
+        return {
+            "dispatch_id": dispatch_id,
+            "state": "pending",
+            "wave": wave,
+            "candidates": len(matches),
+            "expires_at": deadline,
+        }
+
+    async def escalate(
+        self, user_id: str, dispatch_id: str, expected: int, info: dict | None = None
+    ) -> tuple[int, float] | None:
+        deadline = time.time() + self.timeout(expected)
+        code, *rest = await self._escalate(
+            keys=self.keys(user_id),
+            args=[dispatch_id, expected, self.wave_size, repr(deadline)],
+        )
+        if code == 0:
+            return None
+        wave, deadline = int(rest[0]), float(rest[1])
+        hospital_ids = [int(hospital_id) for hospital_id in rest[2:]]
+        if code == 3:
+            await self._finish(user_id, dispatch_id, "exhausted", hospital_ids)
+            return None
+        if code == 1:
+            # 다른 쪽이 이미 넘긴 차수를 이어서 기다리므로 마감 시각도 다시 건다
+            await self._redis.zadd(self.deadlines_key, {user_id: deadline})
+        if code == 2:
+            if expected:
+                self.escalations += 1
+            if info is None:
+                info = {
+                    key.decode(): value.decode()
+                    for key, value in (
+                        await self._redis.hgetall(self.key(user_id))
+                    ).items()
+                }
+            await self._offer(user_id, dispatch_id, wave, deadline, hospital_ids, info)
+        return wave, deadline
+
+    async def _offer(
+        self,
+        user_id: str,
+        dispatch_id: str,
+        wave: int,
+        deadline: float,
+        hospital_ids: list[int],
+        info: dict,
+    ):
+        latitude, longitude = float(info["latitude"]), float(info["longitude"])
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for hospital_id in hospital_ids:
+                hospital = self.matcher.index.info.get(hospital_id)
+                self._publish(
+                    pipe,
+                    hospital_topic(hospital_id),
+                    EmergencyTourOPCode.OFFER,
+                    {
+                        "dispatch_id": dispatch_id,
+                        "user_id": user_id,
+                        "wave": wave,
+                        "expires_at": deadline,
+                        "patient_name": info["patient_name"],
+                        "symptom": info["symptom"],
+                        "distance": (
+                            round(
+                                float(
+                                    haversine(
+                                        latitude,
+                                        longitude,
+                                        hospital["latitude"],
+                                        hospital["longitude"],
+                                    )
+                                )
+                            )
+                            if hospital
+                            else None
+                        ),
+                    },
+                )
+            pipe.zadd(self.deadlines_key, {user_id: deadline})
+            await pipe.execute()
+        self.offers_sent += len(hospital_ids)
+
+    async def _run(
+        self,
+        user_id: str,
+        dispatch_id: str,
+        wave: int,
+        deadline: float,
+        info: dict | None,
+    ):
+        # 차수 상태는 Redis 에 있으므로 타이머는 마감 시각에 한 번씩 확인만 한다
+        try:
+            while True:
+                await asyncio.sleep(max(0.0, deadline - time.time()))
+                current = await self.escalate(user_id, dispatch_id, wave, info)
+                if current is None:
+                    return
+                wave, deadline = current
+        except Exception:
+            logger.exception("Failed to escalate dispatch %s", dispatch_id)
+        finally:
+            if self._timers.get(user_id) is asyncio.current_task():
+                del self._timers[user_id]
+
+    def _schedule(
+        self,
+        user_id: str,
+        dispatch_id: str,
+        wave: int,
+        deadline: float,
+        info: dict | None = None,
+    ):
+        self._timers[user_id] = asyncio.create_task(
+            self._run(user_id, dispatch_id, wave, deadline, info)
+        )
+
+    async def _recover_overdue(self):
+        overdue = await self._redis.zrangebyscore(
+            self.deadlines_key, "-inf", time.time() - self.recovery_delay
+        )
+        for member in overdue:
+            user_id = member.decode()
+            # 여러 워커가 같은 호출을 보더라도 지운 한 곳만 이어 받는다
+            if user_id in self._timers or not await self._redis.zrem(
+                self.deadlines_key, user_id
+            ):
+                continue
+            dispatch_id, wave = await self._redis.hmget(
+                self.key(user_id), ("id", "wave")
+            )
+            if dispatch_id is None:
+                continue  # 호출 기록이 이미 만료됐다
+            self.recovered += 1
+            logger.warning("Recovering overdue dispatch %s", dispatch_id.decode())
+            self._schedule(user_id, dispatch_id.decode(), int(wave), 0.0)
+
+    async def _recover(self):
+        while True:
+            await asyncio.sleep(self.recovery_delay / 2)
+            try:
+                await self._recover_overdue()
+            except Exception:
+                logger.exception("Failed to recover overdue dispatches")
+
+    def _stop_timer(self, user_id: str):
+        timer = self._timers.pop(user_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    async def _finish(
+        self, user_id: str, dispatch_id: str, outcome: str, hospital_ids: list[int]
+    ):
+        self._stop_timer(user_id)
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        dispatch_finished.inc(outcome)
+        data = {"dispatch_id": dispatch_id, "user_id": user_id, "reason": outcome}
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(self.deadlines_key, user_id)
+            for hospital_id in hospital_ids:
+                self._publish(
+                    pipe,
+                    hospital_topic(hospital_id),
+                    EmergencyTourOPCode.CANCEL_OFFER,
+                    data,
+                )
+            if outcome == "exhausted":
+                # 받아 준 병원이 없으면 관리자가 직접 배정하도록 알린다
+                changes = {"dispatch_id": dispatch_id, "dispatch": outcome}
+                await frame_log.publish(
+                    user_id,
+                    EmergencyTourOPCode.UPDATE_STATUS.value,
+                    {"user_id": user_id, **changes},
+                    client=pipe,
+                )
+                await dashboard_feed.record(
+                    EmergencyTourOPCode.UPDATE_STATUS.value,
+                    user_id,
+                    changes,
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def accept(self, user_id: str, dispatch_id: str, hospital_id: int) -> bool:
+        hospital = self.hospital(hospital_id)
+        if hospital is None:
+            return False
+        now = time.time()
+        accepted, *rest = await self._accept(
+            keys=[*self.keys(user_id), tour_store.key(user_id)],
+            args=[dispatch_id, hospital_id, orjson.dumps(hospital), repr(now)],
+        )
+        if not accepted:
+            self.lost += 1
+            return False
+        self._stop_timer(user_id)
+        elapsed = now - float(rest[0])
+        dispatch_match_seconds.observe(elapsed, rest[1].decode())
+        dispatch_finished.inc("matched")
+        self.matched += 1
+        self.match_total += elapsed
+        self.match_max = max(self.match_max, elapsed)
+
+        changes = {"dispatch_id": dispatch_id, "hospital": hospital}
+        # 병원이 정해지면 이송을 시작한다, 이미 다른 상태로 넘어간 투어는 그대로 둔다
+        if await tour_store.transition(
+            user_id, EmergencyTourStatus.READY, EmergencyTourStatus.RIDE
+        ):
+            changes["status"] = EmergencyTourStatus.RIDE.value
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(self.deadlines_key, user_id)
+            # 도착 전이라도 배정된 환자 몫의 병상을 바로 잡아 둔다
+            await capacity_board.update(
+                hospital_id, deltas={"occupied": 1}, client=pipe
+            )
+            # 나머지 병원의 요청은 바로 거둬들인다
+            for other in rest[2:]:
+                self._publish(
+                    pipe,
+                    hospital_topic(int(other)),
+                    EmergencyTourOPCode.CANCEL_OFFER,
+                    {
+                        "dispatch_id": dispatch_id,
+                        "user_id": user_id,
+                        "reason": "matched",
+                    },
+                )
+            await frame_log.publish(
+                user_id,
+                EmergencyTourOPCode.UPDATE_DATA.value,
+                {"user_id": user_id, **changes},
+                client=pipe,
+            )
+            await dashboard_feed.record(
+                EmergencyTourOPCode.UPDATE_DATA.value, user_id, changes, client=pipe
+            )
+            await pipe.execute()
+        return True
+
+    async def decline(self, user_id: str, dispatch_id: str, hospital_id: int) -> bool:
+        remaining, *rest = await self._decline(
+            keys=[self.key(user_id), self.keys(user_id)[2]],
+            args=[dispatch_id, hospital_id],
+        )
+        if remaining < 0:
+            return False
+        self.declined += 1
+        if remaining == 0:
+            # 요청받은 병원이 모두 거절하면 마감을 기다리지 않고 다음 차수로 넘어간다
+            await self.escalate(user_id, dispatch_id, int(rest[0]))
+        return True
+
+    async def cancel(self, user_id: str) -> bool:
+        cancelled, *rest = await self._cancel(keys=self.keys(user_id))
+        if not cancelled:
+            return False
+        await self._finish(
+            user_id,
+            rest[0].decode(),
+            "cancelled",
+            [int(hospital_id) for hospital_id in rest[1:]],
+        )
+        return True
+
+    async def origin(self, user_id: str) -> tuple[float, float] | None:
+        latitude, longitude = await self._redis.hmget(
+            self.key(user_id), ("latitude", "longitude")
+        )
+        if latitude is None or longitude is None:
+            return None
+        return float(latitude), float(longitude)
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._start = redis_connection.register_script(START_SCRIPT)
+        self._escalate = redis_connection.register_script(ESCALATE_SCRIPT)
+        self._accept = redis_connection.register_script(ACCEPT_SCRIPT)
+        self._decline = redis_connection.register_script(DECLINE_SCRIPT)
+        self._cancel = redis_connection.register_script(CANCEL_SCRIPT)
+        self._recovery = asyncio.create_task(self._recover())
+
+    async def stop(self):
+        if self._recovery is not None:
+            self._recovery.cancel()
+            await asyncio.gather(self._recovery, return_exceptions=True)
+            self._recovery = None
+        timers = list(self._timers.values())
+        self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._timers),
+            "started": self.started,
+            "matched": self.matched,
+            "exhausted": self.exhausted,
+            "cancelled": self.cancelled,
+            "escalations": self.escalations,
+            "offers_sent": self.offers_sent,
+            "declined": self.declined,
+            "lost": self.lost,
+            "recovered": self.recovered,
+            "match_avg_seconds": (
+                self.match_total / self.matched if self.matched else 0.0
+            ),
+            "match_max_seconds": self.match_max,
+        }
+
+
+hospital_dispatcher = HospitalDispatcher(
+    hospital_matcher,
+    wave_size=int(os.getenv("DISPATCH_WAVE_SIZE", "3")),
+    max_waves=int(os.getenv("DISPATCH_MAX_WAVES", "3")),
+    wave_timeouts=tuple(
+        float(value)
+        for value in os.getenv("DISPATCH_WAVE_TIMEOUTS", "10,15,20").split(",")
+    ),
+    ttl=int(os.getenv("DISPATCH_TTL", "3600")),
+    recovery_delay=float(os.getenv("DISPATCH_RECOVERY_DELAY", "5")),
+)
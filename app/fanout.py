@@ -0,0 +1,118 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+import orjson
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+def tour_topic(user_id: str) -> str:
+    return f"tour:{user_id}"
+
+
+def hospital_topic(hospital_id: int) -> str:
+    return f"hospital:{hospital_id}"
+
+
+class FanoutHub:
+    channel_prefix = "emergency:fanout:"
+
+    def __init__(self):
+        self._redis: redis.Redis | None = None
+        self._deliver: Callable[[str, str], Awaitable[int]] | None = None
+        self._listener: asyncio.Task | None = None
+        self.published = 0
+        self.received = 0
+        self.delivered = 0
+        self.resubscribes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    async def publish(self, topic: str, data: dict):
+        await self.publish_text(topic, orjson.dumps(data).decode())
+
+    def channel(self, topic: str) -> str:
+        return self.channel_prefix + topic
+
+    def message(self, topic: str, payload: str) -> tuple[str, str]:
+        # 수신 측 지연 시간 측정을 위해 발행 시각을 앞에 붙인다
+        return self.channel(topic), f"{time.time():.6f}|{payload}"
+
+    async def publish_text(self, topic: str, payload: str):
+        await self._redis.publish(*self.message(topic, payload))
+        self.published += 1
+
+    def queue(self, pipe, topic: str, payload: str):
+        # 파이프라인에 발행을 얹는다, 실행은 호출한 쪽이 한다
+        pipe.publish(*self.message(topic, payload))
+        self.published += 1
+
+    async def _subscribe(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.psubscribe(self.channel_prefix + "*")
+        return pubsub
+
+    async def _receive(self, message: dict):
+        self.received += 1
+        topic = message["channel"].decode()[len(self.channel_prefix) :]
+        sent_at, payload = message["data"].decode().split("|", 1)
+        latency = time.time() - float(sent_at)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        try:
+            self.delivered += await self._deliver(topic, payload)
+        except Exception:
+            logger.exception("Failed to deliver fan-out message to %s", topic)
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = await self._subscribe()
+                async for message in pubsub.listen():
+                    await self._receive(message)
+            except Exception:
+                logger.exception("Lost fan-out subscription")
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+            # 끊긴 동안 발행된 메시지는 되살릴 수 없다, 투어 프레임은 클라이언트가 seq 로 이어 받는다
+            await asyncio.sleep(1.0)
+            self.resubscribes += 1
+
+    def start(
+        self,
+        redis_connection: redis.Redis,
+        deliver: Callable[[str, str], Awaitable[int]],
+    ):
+        self._redis = redis_connection
+        self._deliver = deliver
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "received": self.received,
+            "delivered": self.delivered,
+            "resubscribes": self.resubscribes,
+            "latency_avg_ms": (
+                self.latency_total / self.received * 1000 if self.received else 0.0
+            ),
+            "latency_max_ms": self.latency_max * 1000,
+        }
+
+
+fanout_hub = FanoutHub()
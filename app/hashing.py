@@ -0,0 +1,83 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv(verbose=True)
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int = 2, max_pending: int = 256):
+        self.password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="password-hash"
+        )
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def stop(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            self._slots = None
+            # 진행 중인 해시가 끝날 때까지 기다리되 이벤트 루프는 막지 않는다
+            await asyncio.to_thread(executor.shutdown, wait=True)
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise OverflowError("Password hashing queue is full")
+
+        self.pending += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.pending)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.password_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(
+            self.password_context.verify, plain_password, hashed_password
+        )
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": self.pending,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256")),
+)
@@ -0,0 +1,148 @@
+import os
+import math
+import time
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+from app.connection import ConnectionManager
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatEntry:
+    __slots__ = ("key", "last_seen", "pinged", "deadline")
+
+    def __init__(self, key: str, now: float):
+        self.key = key
+        self.last_seen = now
+        self.pinged = False
+        self.deadline = 0  # 확인할 틱 번호
+
+
+class HeartbeatWheel:
+    def __init__(
+        self,
+        interval: float = 30.0,
+        timeout: float = 10.0,
+        tick: float = 1.0,
+        slots: int = 64,
+    ):
+        self.interval = interval  # 초 단위, 이만큼 조용하면 핑을 보낸다
+        self.timeout = timeout  # 초 단위, 핑 뒤 이만큼 응답이 없으면 끊는다
+        self.tick = tick
+        self.wheel: list[dict[str, HeartbeatEntry]] = [{} for _ in range(slots)]
+        self.entries: dict[str, HeartbeatEntry] = {}
+        self.started = time.monotonic()
+        # 프레임마다 시계를 읽지 않도록 틱마다 갱신한 시각을 쓴다
+        self.now = self.started
+        self.cursor = 0
+        self._manager: ConnectionManager | None = None
+        self._ticker: asyncio.Task | None = None
+        self.ticks = 0
+        self.pings = 0
+        self.reaped = 0
+        self.elapsed = 0.0
+        self.elapsed_max = 0.0
+
+    def _schedule(self, entry: HeartbeatEntry, at: float):
+        ticks = max(1, math.ceil((at - self.now) / self.tick))
+        entry.deadline = self.cursor + ticks
+        self.wheel[entry.deadline % len(self.wheel)][entry.key] = entry
+
+    def add(self, key: str):
+        self.remove(key)
+        entry = self.entries[key] = HeartbeatEntry(key, self.now)
+        self._schedule(entry, self.now + self.interval)
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.wheel[entry.deadline % len(self.wheel)].pop(key, None)
+
+    def touch(self, key: str):
+        # 다음 확인 때 마지막 수신 시각을 보고 다시 예약하므로 여기서는 기록만 한다
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.last_seen = self.now
+
+    def advance(self, now: float) -> tuple[list[str], list[str]]:
+        self.now = now
+        ping, reap = [], []
+        target = int((now - self.started) / self.tick)
+        # 이벤트 루프가 밀려 틱을 건너뛰었으면 밀린 칸을 모두 처리한다
+        while self.cursor < target:
+            self.cursor += 1
+            slot = self.wheel[self.cursor % len(self.wheel)]
+            due = [entry for entry in slot.values() if entry.deadline <= self.cursor]
+            for entry in due:
+                del slot[entry.key]
+                if now - entry.last_seen < self.interval:
+                    entry.pinged = False
+                    self._schedule(entry, entry.last_seen + self.interval)
+                elif not entry.pinged:
+                    entry.pinged = True
+                    ping.append(entry.key)
+                    self._schedule(entry, now + self.timeout)
+                else:
+                    del self.entries[entry.key]
+                    reap.append(entry.key)
+        return ping, reap
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            started = time.perf_counter()
+            ping, reap = [], []
+            try:
+                ping, reap = self.advance(time.monotonic())
+                if ping:
+                    self._manager.ping(ping)
+                if reap:
+                    self._manager.reap(reap)
+            except Exception:
+                logger.exception("Failed to run websocket heartbeat")
+            elapsed = time.perf_counter() - started
+            self.ticks += 1
+            self.pings += len(ping)
+            self.reaped += len(reap)
+            self.elapsed += elapsed
+            self.elapsed_max = max(self.elapsed_max, elapsed)
+
+    def start(self, manager: ConnectionManager):
+        self.started = self.now = time.monotonic()
+        self.cursor = 0
+        self._manager = manager
+        manager.heartbeat = self
+        for key in manager.active_connections:
+            self.add(key)
+        self._ticker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+        if self._manager is not None:
+            self._manager.heartbeat = None
+            self._manager = None
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self.entries),
+            "ticks": self.ticks,
+            "pings": self.pings,
+            "reaped": self.reaped,
+            "avg_tick_ms": self.elapsed / self.ticks * 1000 if self.ticks else 0.0,
+            "max_tick_ms": self.elapsed_max * 1000,
+        }
+
+
+heartbeat_wheel = HeartbeatWheel(
+    interval=float(os.getenv("HEARTBEAT_INTERVAL", "30")),
+    timeout=float(os.getenv("HEARTBEAT_TIMEOUT", "10")),
+    tick=float(os.getenv("HEARTBEAT_TICK", "1")),
+    slots=int(os.getenv("HEARTBEAT_SLOTS", "64")),
+)
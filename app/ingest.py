@@ -0,0 +1,276 @@
+import os
+import time
+import asyncio
+import logging
+
+import orjson
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.spatial import haversine
+from app.routing import road_router
+from app.dashboard import dashboard_feed
+from app.resume import frame_log
+from app.tourstore import tour_store
+from app.track import pack_point
+from interface.emergency import EmergencyTourOPCode, EmergencyTourStatus
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+
+class LocationIngestor:
+    def __init__(
+        self,
+        window: float = 0.5,
+        min_move: float = 20.0,
+        max_routes: int = 4,
+        arrive_distance: float = 50.0,
+    ):
+        self.window = window  # 초 단위 묶음 주기
+        self.min_move = min_move  # m 단위, 이보다 적게 움직이면 남은 거리 재계산 생략
+        self.arrive_distance = arrive_distance  # m 단위, 남은 거리가 이 안이면 도착
+        # 한 번 묶어 쓸 때 새로 찾을 경로 수, 나머지 투어는 이전 값을 두고 다음 묶음에서 찾는다
+        self.max_routes = max_routes
+        self._routes_left = max_routes
+        self._pending: dict[str, tuple[float, float]] = {}
+        self._computed_at: dict[str, tuple[float, float]] = {}
+        # 병원은 배정될 때만 바뀌므로 위치가 들어올 때마다 다시 파싱하지 않는다
+        self._hospitals: dict[str, tuple[bytes, dict]] = {}
+        self._redis: redis.Redis | None = None
+        self._flusher: asyncio.Task | None = None
+        self.received = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.tours_written = 0
+        self.distance_recomputed = 0
+        self.routes_deferred = 0
+        self.finished_skipped = 0
+        self.arrived = 0
+
+    def submit(self, user_id: str, location_x: float, location_y: float):
+        self.received += 1
+        if user_id in self._pending:
+            self.coalesced += 1
+        self._pending[user_id] = (location_x, location_y)
+
+    def forget(self, user_id: str):
+        self._pending.pop(user_id, None)
+        self._computed_at.pop(user_id, None)
+        self._hospitals.pop(user_id, None)
+        road_router.forget(user_id)
+
+    def _hospital(self, user_id: str, raw: bytes) -> dict | None:
+        if not raw:
+            return None
+        cached = self._hospitals.get(user_id)
+        if cached is None or cached[0] != raw:
+            cached = self._hospitals[user_id] = (raw, orjson.loads(raw))
+        return cached[1]
+
+    async def _remain_distance(
+        self,
+        user_id: str,
+        hospital: dict | None,
+        remain_distance: int | None,
+        eta: int | None,
+        location_x: float,
+        location_y: float,
+    ) -> tuple[int | None, int | None]:
+        if not hospital or hospital.get("latitude") is None:
+            return remain_distance, eta
+
+        computed_at = self._computed_at.get(user_id)
+        if computed_at is not None and remain_distance is not None:
+            moved = haversine(location_y, location_x, computed_at[1], computed_at[0])
+            if moved < self.min_move:
+                return remain_distance, eta
+
+        routed = None
+        if road_router.ready:
+            route = (
+                user_id,
+                location_y,
+                location_x,
+                hospital["latitude"],
+                hospital["longitude"],
+            )
+            routed = road_router.cached(*route)
+            if routed is None:
+                if not self._routes_left and remain_distance is not None:
+                    # 이번 묶음에서 찾을 만큼 찾았으면 이전 값을 두고 다음 묶음에서 다시 본다
+                    self.routes_deferred += 1
+                    return remain_distance, eta
+                self._routes_left = max(self._routes_left - 1, 0)
+                routed = await road_router.route(*route)
+        self._computed_at[user_id] = (location_x, location_y)
+        self.distance_recomputed += 1
+        if routed is not None:
+            return routed
+        # 도로 그래프가 없거나 경로를 못 찾으면 직선 거리로 대신한다
+        return (
+            round(
+                float(
+                    haversine(
+                        location_y,
+                        location_x,
+                        hospital["latitude"],
+                        hospital["longitude"],
+                    )
+                )
+            ),
+            None,
+        )
+
+    def _arriving(self, status: int, fields: dict) -> bool:
+        remain_distance = fields["remain_distance"]
+        return (
+            status == EmergencyTourStatus.RIDE.value
+            and remain_distance is not None
+            and remain_distance <= self.arrive_distance
+        )
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in pending:
+                pipe.hmget(
+                    tour_store.key(user_id),
+                    ("hospital", "remain_distance", "eta", "status"),
+                )
+            current = await pipe.execute()
+
+        self._routes_left = self.max_routes
+        updates = []
+        now = time.time()
+        for user_id, (hospital, remain_distance, eta, status) in zip(pending, current):
+            if hospital is None:
+                self.forget(user_id)
+                continue
+            location_x, location_y = pending[user_id]
+            remain_distance, eta = await self._remain_distance(
+                user_id,
+                self._hospital(user_id, hospital),
+                int(remain_distance) if remain_distance else None,
+                int(eta) if eta else None,
+                location_x,
+                location_y,
+            )
+            fields = {
+                "current_location": f"{location_x},{location_y}",
+                "remain_distance": remain_distance,
+                "eta": eta,
+            }
+            updates.append((user_id, pending[user_id], fields, int(status)))
+        if not updates:
+            return
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id, (location_x, location_y), fields, status in updates:
+                await tour_store.record(
+                    user_id,
+                    pack_point(now, location_y, location_x),
+                    client=pipe,
+                    **fields,
+                )
+                if self._arriving(status, fields):
+                    await tour_store.transition(
+                        user_id,
+                        EmergencyTourStatus.RIDE,
+                        EmergencyTourStatus.ARRIVE,
+                        client=pipe,
+                    )
+            results = iter(await pipe.execute())
+
+        # 그사이 끝난 투어(record 가 0)에는 위치 프레임을 보내지 않는다
+        written = 0
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id, _, fields, status in updates:
+                version = next(results)
+                arrived = next(results) if self._arriving(status, fields) else 0
+                if not version:
+                    self.finished_skipped += 1
+                    self.forget(user_id)
+                    continue
+                if arrived:
+                    self.arrived += 1
+                    status = EmergencyTourStatus.ARRIVE.value
+                    changes = {
+                        "status": status,
+                        "remain_distance": fields["remain_distance"],
+                    }
+                    await frame_log.publish(
+                        user_id,
+                        EmergencyTourOPCode.UPDATE_STATUS.value,
+                        {"user_id": user_id, **changes},
+                        client=pipe,
+                    )
+                    await dashboard_feed.record(
+                        EmergencyTourOPCode.UPDATE_STATUS.value,
+                        user_id,
+                        changes,
+                        client=pipe,
+                    )
+                await frame_log.publish(
+                    user_id,
+                    EmergencyTourOPCode.UPDATE_LOCATION.value,
+                    {"user_id": user_id, **fields},
+                    client=pipe,
+                )
+                await dashboard_feed.record(
+                    EmergencyTourOPCode.UPDATE_LOCATION.value,
+                    user_id,
+                    {**fields, "status": status},
+                    client=pipe,
+                )
+                written += 1
+            if written:
+                await pipe.execute()
+        if written:
+            self.flushes += 1
+            self.tours_written += written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush location updates")
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+            await self.flush()
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "tours_written": self.tours_written,
+            "distance_recomputed": self.distance_recomputed,
+            "routes_deferred": self.routes_deferred,
+            "finished_skipped": self.finished_skipped,
+            "arrived": self.arrived,
+        }
+
+
+location_ingestor = LocationIngestor(
+    window=float(os.getenv("LOCATION_FLUSH_INTERVAL", "0.5")),
+    min_move=float(os.getenv("LOCATION_MIN_MOVE", "20")),
+    max_routes=int(os.getenv("LOCATION_MAX_ROUTES", "4")),
+    arrive_distance=float(os.getenv("LOCATION_ARRIVE_DISTANCE", "50")),
+)
@@ -0,0 +1,118 @@
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.spatial import HospitalIndex, haversine, hospital_index
+from app.specialty import EMERGENCY, popcount, symptom_mask
+
+load_dotenv(verbose=True)
+
+
+class Match:
+    __slots__ = ("hospital_id", "distance", "coverage", "occupancy", "score")
+
+    def __init__(
+        self,
+        hospital_id: int,
+        distance: float,
+        coverage: float,
+        occupancy: float,
+        score: float,
+    ):
+        self.hospital_id = hospital_id
+        self.distance = distance
+        self.coverage = coverage
+        self.occupancy = occupancy
+        self.score = score
+
+
+class HospitalMatcher:
+    def __init__(
+        self,
+        index: HospitalIndex,
+        radius: float = 20000,
+        distance_weight: float = 0.5,
+        specialty_weight: float = 0.35,
+        load_weight: float = 0.15,
+    ):
+        self.index = index
+        self.radius = radius
+        self.distance_weight = distance_weight
+        self.specialty_weight = specialty_weight
+        self.load_weight = load_weight
+        self.matches = 0
+        self.empty = 0
+        self.candidates = 0
+        self.elapsed = 0.0
+
+    def score(
+        self, lat: float, lon: float, need: int, slots: np.ndarray
+    ) -> tuple[np.ndarray, ...]:
+        ids, lats, lons, specialties, beds, load = self.index.columns(slots)
+        distances = haversine(lat, lon, lats, lons)
+        coverage = popcount(specialties & need) / bin(need).count("1")
+        # 병상 수를 모르는 병원(UNKNOWN_BEDS)은 여유가 있는 것으로, 0개로 보고한 병원은 찬 것으로 본다
+        occupancy = np.divide(load, beds, out=np.zeros(len(slots)), where=beds > 0)
+        occupancy[beds == 0] = 1.0
+        # 응급의학과도, 필요한 진료과도 하나 없는 병원(산부인과 의원 등)은 가깝더라도 제외하고
+        # 진료과 점수는 이 조건을 통과한 병원끼리만 비교한다
+        eligible = (specialties & (need | EMERGENCY)) != 0
+        # 낮을수록 좋은 점수, 반경 밖이거나 병상이 찬 병원도 제외한다
+        scores = (
+            self.distance_weight * (distances / self.radius)
+            + self.specialty_weight * (1.0 - coverage)
+            + self.load_weight * np.minimum(occupancy, 1.0)
+        )
+        scores[(distances > self.radius) | (occupancy >= 1.0) | ~eligible] = np.inf
+        return ids, scores, distances, coverage, occupancy
+
+    def match(self, lat: float, lon: float, symptom: str, k: int = 5) -> list[Match]:
+        started = time.perf_counter()
+        slots = self.index.region(lat, lon, self.radius)
+        if not len(slots):
+            self.empty += 1
+            return []
+        ids, scores, distances, coverage, occupancy = self.score(
+            lat, lon, symptom_mask(symptom), slots
+        )
+        if k < len(slots):
+            top = np.argpartition(scores, k)[:k]
+        else:
+            top = np.arange(len(slots))
+        top = top[np.argsort(scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top])]
+
+        self.matches += 1
+        self.candidates += len(slots)
+        self.elapsed += time.perf_counter() - started
+        if not len(top):
+            self.empty += 1
+        return [
+            Match(*values)
+            for values in zip(
+                ids[top].tolist(),
+                distances[top].tolist(),
+                coverage[top].tolist(),
+                occupancy[top].tolist(),
+                scores[top].tolist(),
+            )
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "matches": self.matches,
+            "empty": self.empty,
+            "avg_candidates": self.candidates / self.matches if self.matches else 0.0,
+            "avg_ms": self.elapsed / self.matches * 1000 if self.matches else 0.0,
+        }
+
+
+hospital_matcher = HospitalMatcher(
+    hospital_index,
+    radius=float(os.getenv("MATCHING_RADIUS", "20000")),
+    distance_weight=float(os.getenv("MATCHING_DISTANCE_WEIGHT", "0.5")),
+    specialty_weight=float(os.getenv("MATCHING_SPECIALTY_WEIGHT", "0.35")),
+    load_weight=float(os.getenv("MATCHING_LOAD_WEIGHT", "0.15")),
+)
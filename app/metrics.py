@@ -0,0 +1,283 @@
+import time
+import asyncio
+import functools
+from bisect import bisect_left
+from typing import Callable
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    # 이벤트 루프 단일 스레드에서만 갱신하므로 잠금 없이 정수만 더한다
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+            for label_values, value in self.values.items()
+        ]
+
+
+class HistogramChild:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.children: dict[tuple, HistogramChild] = {}
+
+    def observe(self, value: float, *label_values):
+        child = self.children.get(label_values)
+        if child is None:
+            child = self.children[label_values] = HistogramChild(len(self.buckets) + 1)
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.total += value
+        child.count += 1
+
+    def render(self) -> list[str]:
+        lines = []
+        for label_values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), child.counts):
+                cumulative += count
+                labels = _format_labels((*self.labels, "le"), (*label_values, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {child.total}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, function: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.function = function
+
+    def render(self) -> list[str]:
+        return [f"{self.name} {self.function()}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram | Gauge] = []
+        self.collectors: list[tuple[str, Callable[[], dict]]] = []
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        metric = Counter(name, description, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        metric = Histogram(name, description, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, description: str, function: Callable[[], float]):
+        metric = Gauge(name, description, function)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, prefix: str, function: Callable[[], dict]):
+        # 각 모듈의 stats() 결과 중 숫자 값을 게이지로 노출한다
+        self.collectors.append((prefix, function))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for prefix, function in self.collectors:
+            try:
+                values = function()
+            except RuntimeError:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "aidnet_http_request_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status"),
+)
+websocket_frame_seconds = registry.histogram(
+    "aidnet_websocket_frame_seconds",
+    "Websocket frame handling latency by opcode",
+    ("op",),
+)
+websocket_sessions = registry.counter(
+    "aidnet_websocket_sessions_total", "Websocket sessions by route", ("route",)
+)
+redis_command_seconds = registry.histogram(
+    "aidnet_redis_command_seconds", "Redis command latency", ("command",)
+)
+database_query_seconds = registry.histogram(
+    "aidnet_database_query_seconds", "Tortoise query latency", ("method",)
+)
+event_loop_lag_seconds = registry.histogram(
+    "aidnet_event_loop_lag_seconds",
+    "Event loop scheduling lag",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            route = scope.get("path", "")
+            websocket_sessions.inc(route)
+            return await self.app(scope, receive, send)
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code,
+            )
+
+
+class EventLoopMonitor:
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - started - self.interval, 0.0)
+            event_loop_lag_seconds.observe(self.last_lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+event_loop_monitor = EventLoopMonitor()
+registry.gauge(
+    "aidnet_event_loop_lag_last_seconds",
+    "Most recent event loop lag sample",
+    lambda: event_loop_monitor.last_lag,
+)
+
+DATABASE_METHODS = (
+    "execute_query",
+    "execute_query_dict",
+    "execute_insert",
+    "execute_many",
+    "execute_script",
+)
+
+
+def _timed_query(method_name: str, function):
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            database_query_seconds.observe(time.perf_counter() - started, method_name)
+
+    wrapper.__aidnet_timed__ = True
+    return wrapper
+
+
+def instrument_database(connection):
+    # 트랜잭션 래퍼도 같은 클래스를 상속하므로 클래스 단위로 감싼다
+    client_class = type(connection)
+    for method_name in DATABASE_METHODS:
+        function = getattr(client_class, method_name, None)
+        if function is None or getattr(function, "__aidnet_timed__", False):
+            continue
+        setattr(client_class, method_name, _timed_query(method_name, function))
@@ -0,0 +1,235 @@
+import struct
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+
+from interface.emergency import EmergencyTourOPCode
+
+NO_DISTANCE = -1
+
+# 클라이언트가 보낸 프레임을 해석하거나 처리하다 나는 오류, 연결을 끊지 않고 오류 프레임으로 답한다
+INVALID_FRAME = (KeyError, TypeError, ValueError)
+
+
+class FrameError(ValueError):
+    pass
+
+
+OPCODES = frozenset(op.value for op in EmergencyTourOPCode)
+
+
+def op_label(op) -> int | str:
+    # 메트릭 라벨에는 알려진 opcode 만 쓴다, 클라이언트가 보낸 값을 그대로 쓰면 시리즈가 끝없이 늘어난다
+    return op if type(op) is int and op in OPCODES else "unknown"
+
+
+def error_frame(op: int | None, error: Exception) -> dict:
+    return {
+        "op": EmergencyTourOPCode.ERROR.value,
+        "data": {"op": op, "error": str(error) or type(error).__name__},
+    }
+
+
+class JSONCodec:
+    subprotocol = "aidnet.json"
+    binary = False
+
+    @staticmethod
+    def encode(op: int, data: dict | None) -> str:
+        return orjson.dumps({"op": op, "data": data}).decode()
+
+    @staticmethod
+    def decode(message: str | bytes) -> tuple[int, dict | None]:
+        frame = orjson.loads(message)
+        return frame["op"], frame.get("data")
+
+
+class BinaryCodec:
+    # 1바이트 opcode + 1바이트 형식 헤더 뒤에 opcode 별 고정 레이아웃을 붙인다.
+    # 고정 레이아웃이 없는 opcode 는 JSON 바이트로 보낸다.
+    subprotocol = "aidnet.binary"
+    binary = True
+
+    header = struct.Struct("!BB")
+    location = struct.Struct("!ddi")  # location_x, location_y, remain_distance
+    client_location = struct.Struct("!dd")  # location_x, location_y
+    status = struct.Struct("!Bi")  # status, remain_distance
+    # 두 번째 레이아웃은 JSON 프레임과 같은 내용을 담도록 eta 와 user_id 를 더한다.
+    # user_id 는 레이아웃 뒤에 1바이트 길이와 UTF-8 바이트로 붙는다
+    location_v2 = struct.Struct("!ddii")  # location_x, location_y, remain_distance, eta
+    text_length = struct.Struct("!B")
+
+    sequence = struct.Struct("!I")
+
+    FORMAT_STRUCT = 0
+    FORMAT_JSON = 1
+    FORMAT_STRUCT_V2 = 2
+    # 형식 바이트의 최상위 비트가 켜져 있으면 헤더 뒤에 seq 4바이트가 붙는다
+    SEQUENCED = 0x80
+
+    # 고정 레이아웃에 담을 수 있는 필드, 이 밖의 필드가 있으면 빠뜨리지 않도록 JSON 으로 보낸다
+    location_fields = frozenset(
+        ("user_id", "current_location", "remain_distance", "eta", "seq")
+    )
+    status_fields = frozenset(("user_id", "status", "remain_distance", "seq"))
+
+    @classmethod
+    def _struct_header(cls, op: int, data: dict, frame_format: int) -> bytes:
+        if "seq" not in data:
+            return cls.header.pack(op, frame_format)
+        return cls.header.pack(op, frame_format | cls.SEQUENCED) + cls.sequence.pack(
+            data["seq"]
+        )
+
+    @classmethod
+    def _text(cls, value: str | None) -> bytes:
+        encoded = (value or "").encode()
+        return cls.text_length.pack(len(encoded)) + encoded
+
+    @staticmethod
+    def _optional(value: int | None) -> int:
+        return NO_DISTANCE if value is None else value
+
+    @classmethod
+    def encode(cls, op: int, data: dict | None) -> bytes:
+        if op == EmergencyTourOPCode.HELLO.value and not data:
+            return cls.header.pack(op, cls.FORMAT_STRUCT)
+        if (
+            op == EmergencyTourOPCode.UPDATE_LOCATION.value
+            and data
+            and "current_location" in data
+            and data.keys() <= cls.location_fields
+        ):
+            location_x, location_y = data["current_location"].split(",")
+            return (
+                cls._struct_header(op, data, cls.FORMAT_STRUCT_V2)
+                + cls.location_v2.pack(
+                    float(location_x),
+                    float(location_y),
+                    cls._optional(data.get("remain_distance")),
+                    cls._optional(data.get("eta")),
+                )
+                + cls._text(data.get("user_id"))
+            )
+        if (
+            op == EmergencyTourOPCode.UPDATE_LOCATION.value
+            and data
+            and data.keys() == {"location_x", "location_y"}
+        ):
+            return cls.header.pack(op, cls.FORMAT_STRUCT) + cls.client_location.pack(
+                float(data["location_x"]), float(data["location_y"])
+            )
+        if (
+            op == EmergencyTourOPCode.UPDATE_STATUS.value
+            and data
+            and "status" in data
+            and data.keys() <= cls.status_fields
+        ):
+            return (
+                cls._struct_header(op, data, cls.FORMAT_STRUCT_V2)
+                + cls.status.pack(
+                    data["status"], cls._optional(data.get("remain_distance"))
+                )
+                + cls._text(data.get("user_id"))
+            )
+        return cls.header.pack(op, cls.FORMAT_JSON) + orjson.dumps(data)
+
+    @classmethod
+    def decode(cls, message: bytes) -> tuple[int, dict | None]:
+        op, frame_format = cls.header.unpack_from(message)
+        payload = memoryview(message)[cls.header.size :]
+        if frame_format & cls.SEQUENCED:
+            (seq,) = cls.sequence.unpack_from(payload)
+            op, data = cls._decode(op, frame_format & ~cls.SEQUENCED, payload[4:])
+            return op, {**(data or {}), "seq": seq}
+        return cls._decode(op, frame_format, payload)
+
+    @staticmethod
+    def _nullable(value: int) -> int | None:
+        return None if value == NO_DISTANCE else value
+
+    @classmethod
+    def _decode_v2(cls, op: int, payload: memoryview) -> tuple[int, dict | None]:
+        if op == EmergencyTourOPCode.UPDATE_LOCATION.value:
+            layout = cls.location_v2
+            location_x, location_y, remain_distance, eta = layout.unpack_from(payload)
+            data = {
+                "location_x": location_x,
+                "location_y": location_y,
+                "remain_distance": cls._nullable(remain_distance),
+                "eta": cls._nullable(eta),
+            }
+        elif op == EmergencyTourOPCode.UPDATE_STATUS.value:
+            layout = cls.status
+            status, remain_distance = layout.unpack_from(payload)
+            data = {"status": status, "remain_distance": cls._nullable(remain_distance)}
+        else:
+            raise ValueError(f"Unknown binary frame layout for op {op}")
+        (length,) = cls.text_length.unpack_from(payload, layout.size)
+        start = layout.size + cls.text_length.size
+        user_id = bytes(payload[start : start + length]).decode()
+        if user_id:
+            data["user_id"] = user_id
+        return op, data
+
+    @classmethod
+    def _decode(
+        cls, op: int, frame_format: int, payload: memoryview
+    ) -> tuple[int, dict | None]:
+        if frame_format == cls.FORMAT_JSON:
+            return op, orjson.loads(payload)
+        if frame_format == cls.FORMAT_STRUCT_V2:
+            return cls._decode_v2(op, payload)
+        if op == EmergencyTourOPCode.HELLO.value:
+            return op, None
+        if op == EmergencyTourOPCode.UPDATE_LOCATION.value:
+            if len(payload) == cls.client_location.size:
+                location_x, location_y = cls.client_location.unpack(payload)
+                return op, {"location_x": location_x, "location_y": location_y}
+            location_x, location_y, remain_distance = cls.location.unpack(payload)
+            return op, {
+                "location_x": location_x,
+                "location_y": location_y,
+                "remain_distance": (
+                    None if remain_distance == NO_DISTANCE else remain_distance
+                ),
+            }
+        if op == EmergencyTourOPCode.UPDATE_STATUS.value:
+            status, remain_distance = cls.status.unpack(payload)
+            return op, {
+                "status": status,
+                "remain_distance": (
+                    None if remain_distance == NO_DISTANCE else remain_distance
+                ),
+            }
+        raise ValueError(f"Unknown binary frame layout for op {op}")
+
+
+Codec = type[JSONCodec] | type[BinaryCodec]
+CODECS: dict[str, Codec] = {
+    codec.subprotocol: codec for codec in (JSONCodec, BinaryCodec)
+}
+
+
+def negotiate(websocket: WebSocket) -> tuple[Codec, str | None]:
+    requested = websocket.scope.get("subprotocols", [])
+    for subprotocol in (BinaryCodec.subprotocol, JSONCodec.subprotocol):
+        if subprotocol in requested:
+            return CODECS[subprotocol], subprotocol
+    return JSONCodec, None
+
+
+async def receive_frame(websocket: WebSocket, codec: Codec) -> tuple[int, dict | None]:
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    try:
+        if message.get("bytes") is not None:
+            op, data = codec.decode(message["bytes"])
+        else:
+            op, data = JSONCodec.decode(message["text"])
+    except (*INVALID_FRAME, struct.error) as error:
+        raise FrameError(f"Malformed frame: {error}") from error
+    if data is not None and not isinstance(data, dict):
+        raise FrameError("Frame data must be an object")
+    return op, data
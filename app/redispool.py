@@ -1,10 +1,121 @@
+import os
+import time
+
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError
+
+from app.metrics import redis_command_seconds
+
+
+class StatsBlockingConnectionPool(redis.BlockingConnectionPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.waits = 0
+        self.wait_timeouts = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        if not self.can_get_connection():
+            self.waits += 1
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except ConnectionError:
+            self.wait_timeouts += 1
+            raise
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            redis_command_seconds.observe(time.perf_counter() - started, "PIPELINE")
+
+
+class InstrumentedRedis(redis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            redis_command_seconds.observe(time.perf_counter() - started, args[0])
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
 
 
 class RedisPool:
-    def __init__(self, host: str, port: int, db: int):
-        self._pool = redis.ConnectionPool(host=host, port=port, db=db)
-        self.client = redis.Redis(connection_pool=self._pool)
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        db: int,
+        max_connections: int = 64,
+        timeout: float | None = 5.0,
+        health_check_interval: int = 30,
+        **connection_kwargs,
+    ):
+        self._pool = StatsBlockingConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=max_connections,
+            timeout=timeout,
+            health_check_interval=health_check_interval,
+            **connection_kwargs,
+        )
+        self.client = InstrumentedRedis(connection_pool=self._pool)
 
     async def get_connection(self):
-        return redis.Redis(connection_pool=self._pool)
+        return self.client
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self._pool.max_connections,
+            "in_use": len(self._pool._in_use_connections),
+            "idle": len(self._pool._available_connections),
+            "waits": self._pool.waits,
+            "wait_timeouts": self._pool.wait_timeouts,
+        }
+
+    async def close(self):
+        await self.client.aclose()
+        await self._pool.disconnect()
+
+
+_redis_pool: RedisPool | None = None
+
+
+def open_redis_pool(**connection_kwargs) -> RedisPool:
+    global _redis_pool
+    if _redis_pool is None:
+        _redis_pool = RedisPool(
+            host=os.environ["REDIS_HOST"],
+            port=int(os.environ["REDIS_PORT"]),
+            db=0,
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "64")),
+            timeout=float(os.getenv("REDIS_POOL_TIMEOUT", "5")),
+            health_check_interval=int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")),
+            **connection_kwargs,
+        )
+    return _redis_pool
+
+
+async def close_redis_pool():
+    global _redis_pool
+    if _redis_pool is not None:
+        await _redis_pool.close()
+        _redis_pool = None
+
+
+def current_redis_pool() -> RedisPool:
+    if _redis_pool is None:
+        raise RuntimeError("Redis pool is not opened")
+    return _redis_pool
+
+
+async def get_redis_pool() -> redis.Redis:
+    return await current_redis_pool().get_connection()
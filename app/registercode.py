@@ -0,0 +1,132 @@
+import os
+import uuid
+import asyncio
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+from tortoise.exceptions import IntegrityError
+
+from database.user import UserRegisterCode
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+
+class RegisterCodeAllocator:
+    pool_key = "register_code:pool"
+
+    def __init__(
+        self,
+        batch_size: int = 512,
+        low_watermark: int = 128,
+        sweep_interval: float = 600.0,
+        expires_in: timedelta = timedelta(days=2),
+    ):
+        self.batch_size = batch_size
+        self.low_watermark = low_watermark
+        self.sweep_interval = sweep_interval
+        self.expires_in = expires_in
+        self._redis: redis.Redis | None = None
+        self._refill: asyncio.Task | None = None
+        self._sweeper: asyncio.Task | None = None
+        self.allocated = 0
+        self.refills = 0
+        self.collisions = 0
+        self.swept = 0
+
+    async def refill(self):
+        candidates = {secrets.token_hex(3) for _ in range(self.batch_size)}
+        in_use = await UserRegisterCode.filter(code__in=candidates).values_list(
+            "code", flat=True
+        )
+        candidates.difference_update(in_use)
+        if candidates:
+            await self._redis.sadd(self.pool_key, *candidates)
+        self.refills += 1
+
+    async def _refill_in_background(self):
+        try:
+            await self.refill()
+        except Exception:
+            logger.exception("Failed to refill register code pool")
+
+    def _schedule_refill(self):
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self._refill_in_background())
+
+    async def _pop(self) -> str:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.spop(self.pool_key)
+            pipe.scard(self.pool_key)
+            code, remaining = await pipe.execute()
+        if remaining < self.low_watermark:
+            self._schedule_refill()
+        if code is None:
+            await self.refill()
+            code = await self._redis.spop(self.pool_key)
+        return code.decode()
+
+    async def allocate(self, email: str) -> str:
+        for _ in range(3):
+            code = await self._pop()
+            try:
+                await UserRegisterCode.create(
+                    id=uuid.uuid4(),
+                    email=email,
+                    code=code,
+                    expired_at=datetime.now(timezone.utc) + self.expires_in,
+                )
+            except IntegrityError:
+                # 다른 워커가 같은 코드를 다시 채워 넣은 드문 경우
+                self.collisions += 1
+                continue
+            self.allocated += 1
+            return code
+        raise RuntimeError("Could not allocate a unique register code")
+
+    async def sweep(self) -> int:
+        deleted = await UserRegisterCode.filter(
+            expired_at__lt=datetime.now(timezone.utc)
+        ).delete()
+        self.swept += deleted
+        return deleted
+
+    async def _sweep_periodically(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep expired register codes")
+            await asyncio.sleep(self.sweep_interval)
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._schedule_refill()
+        self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self):
+        for task in (self._refill, self._sweeper):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._refill = None
+        self._sweeper = None
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "allocated": self.allocated,
+            "refills": self.refills,
+            "collisions": self.collisions,
+            "swept": self.swept,
+        }
+
+
+register_code_allocator = RegisterCodeAllocator(
+    batch_size=int(os.getenv("REGISTER_CODE_BATCH_SIZE", "512")),
+    low_watermark=int(os.getenv("REGISTER_CODE_LOW_WATERMARK", "128")),
+    sweep_interval=float(os.getenv("REGISTER_CODE_SWEEP_INTERVAL", "600")),
+)
@@ -0,0 +1,176 @@
+import os
+import time
+
+import orjson
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from app.connection import Connection, ConnectionManager
+from app.fanout import fanout_hub, tour_topic
+from app.protocol import JSONCodec
+from app.tourstore import tour_store
+from interface.emergency import EmergencyTourOPCode
+
+load_dotenv(verbose=True)
+
+# seq 를 붙인 프레임을 투어별 스트림에 남기고 같은 내용을 그대로 발행한다
+PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+local data = ARGV[5]
+if data == '{}' then
+    data = '{"seq":' .. seq .. '}'
+else
+    data = '{"seq":' .. seq .. ',' .. string.sub(data, 2)
+end
+local frame = '{"op":' .. ARGV[4] .. ',"data":' .. data .. '}'
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '0-' .. seq, 'frame', frame)
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+redis.call('PUBLISH', ARGV[2], ARGV[3] .. '|' .. frame)
+return seq
+"""
+
+
+class FrameLog:
+    def __init__(self, history: int = 256, ttl: int = 3600):
+        self.history = history  # 투어별로 다시 보낼 수 있는 최근 프레임 수
+        self.ttl = ttl
+        self._redis: redis.Redis | None = None
+        self._manager: ConnectionManager | None = None
+        self._publish = None
+        self.published = 0
+        self.resumes = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.snapshots = 0
+        self.bytes_sent = 0
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"emergency:{{{user_id}}}:frames"
+
+    @staticmethod
+    def seq_key(user_id: str) -> str:
+        return f"emergency:{{{user_id}}}:frames:seq"
+
+    async def publish(self, user_id: str, op: int, data: dict, client=None) -> int:
+        self.published += 1
+        return await self._publish(
+            keys=[self.key(user_id), self.seq_key(user_id)],
+            args=[
+                self.history,
+                fanout_hub.channel(tour_topic(user_id)),
+                f"{time.time():.6f}",
+                op,
+                orjson.dumps(data),
+                self.ttl,
+            ],
+            client=client,
+        )
+
+    async def _missed(self, user_id: str, seq: int) -> tuple[int, list[str] | None]:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.get(self.seq_key(user_id))
+            pipe.xrange(self.key(user_id), min=f"0-{seq + 1}", count=self.history)
+            latest, entries = await pipe.execute()
+        latest = int(latest or 0)
+        # 기록이 잘려 나갔거나 만료됐으면 빠진 부분을 메울 수 없다
+        if seq > latest or len(entries) != latest - seq:
+            return latest, None
+        return latest, [fields[b"frame"].decode() for _, fields in entries]
+
+    async def _snapshot(self, user_id: str) -> tuple[int, dict | None]:
+        # seq 와 투어 상태를 한 번에 읽어야 이후 프레임이 스냅샷 위에 정확히 이어진다
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.get(self.seq_key(user_id))
+            pipe.hgetall(tour_store.key(user_id))
+            latest, data = await pipe.execute()
+        return int(latest or 0), tour_store.decode(data) if data else None
+
+    def _replay(self, connection: Connection, frames: list[str]) -> int:
+        decoded = [JSONCodec.decode(frame) for frame in frames]
+        # 위치는 마지막 것만 의미가 있으므로 중간 위치 프레임은 건너뛴다
+        last_location = max(
+            (
+                index
+                for index, (op, _) in enumerate(decoded)
+                if op == EmergencyTourOPCode.UPDATE_LOCATION.value
+            ),
+            default=-1,
+        )
+        replayed = 0
+        for index, (frame, (op, data)) in enumerate(zip(frames, decoded)):
+            if (
+                op == EmergencyTourOPCode.UPDATE_LOCATION.value
+                and index != last_location
+            ):
+                self.coalesced += 1
+                continue
+            payload = (
+                frame
+                if connection.codec is JSONCodec
+                else connection.codec.encode(op, data)
+            )
+            connection.enqueue(payload)
+            self.bytes_sent += len(payload)
+            replayed += 1
+        self.replayed += replayed
+        return replayed
+
+    async def resume(self, user_id: str, seq: int | None):
+        connection = self._manager.active_connections.get(user_id)
+        if connection is None:
+            return
+        codec = connection.codec
+        self.resumes += 1
+        # 다시 보내는 동안 새로 발행된 프레임은 잡아 두었다가 겹치는 것만 빼고 보낸다
+        connection.hold()
+        latest = seq or 0
+        try:
+            frames = None
+            if seq is not None:
+                latest, frames = await self._missed(user_id, seq)
+            if frames is None:
+                latest, tour = await self._snapshot(user_id)
+                payload = codec.encode(
+                    EmergencyTourOPCode.SNAPSHOT.value,
+                    {"seq": latest, "user_id": user_id, "tour": tour},
+                )
+                connection.enqueue(payload)
+                self.bytes_sent += len(payload)
+                self.snapshots += 1
+                replayed = 0
+            else:
+                replayed = self._replay(connection, frames)
+            connection.enqueue(
+                codec.encode(
+                    EmergencyTourOPCode.RESUME.value,
+                    {"seq": latest, "replayed": replayed, "snapshot": frames is None},
+                )
+            )
+        finally:
+            connection.release(latest)
+
+    def start(self, redis_connection: redis.Redis, manager: ConnectionManager):
+        self._redis = redis_connection
+        self._manager = manager
+        self._publish = redis_connection.register_script(PUBLISH_SCRIPT)
+
+    def stop(self):
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "resumes": self.resumes,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "snapshots": self.snapshots,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+frame_log = FrameLog(
+    history=int(os.getenv("LIVE_HISTORY", "256")),
+    ttl=int(os.getenv("LIVE_HISTORY_TTL", "3600")),
+)
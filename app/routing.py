@@ -0,0 +1,459 @@
+import os
+import csv
+import math
+import time
+import heapq
+import asyncio
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.spatial import haversine, EARTH_RADIUS_M
+from app.metrics import registry
+
+load_dotenv(verbose=True)
+logger = logging.getLogger(__name__)
+
+route_compute_seconds = registry.histogram(
+    "aidnet_route_compute_seconds", "Road graph shortest path computation time"
+)
+
+
+GRID_STRIDE = 1_000_003
+
+
+def _distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1 = math.radians(lat1)
+    lat2 = math.radians(lat2)
+    a = (
+        math.sin((lat2 - lat1) * 0.5) ** 2
+        + math.cos(lat1)
+        * math.cos(lat2)
+        * math.sin(math.radians(lon2 - lon1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class RoadGraph:
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        lengths: np.ndarray,
+        speeds: np.ndarray,
+        cell_size: float = 0.01,
+    ):
+        # CSR 인접 구조: 노드 i 의 간선은 targets[offsets[i]:offsets[i + 1]]
+        self.lat = lat
+        self.lon = lon
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.speeds = speeds
+        self.cell_size = cell_size
+        # A* 내부 반복에서는 NumPy 스칼라보다 리스트 인덱싱이 훨씬 빠르다
+        self._lat = lat.tolist()
+        self._lon = lon.tolist()
+        self._offsets = offsets.tolist()
+        self._targets = targets.tolist()
+        self._lengths = lengths.tolist()
+        self.mean_speed = float(speeds.mean()) if len(speeds) else 40.0
+        self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_ids: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        lengths: np.ndarray | None = None,
+        speeds: np.ndarray | None = None,
+        oneway: np.ndarray | None = None,
+        default_speed: float = 40.0,
+    ) -> "RoadGraph":
+        order = np.argsort(node_ids)
+        node_ids, lat, lon = node_ids[order], lat[order], lon[order]
+        sources = np.searchsorted(node_ids, sources)
+        targets = np.searchsorted(node_ids, targets)
+        if lengths is None:
+            lengths = cls._edge_lengths(lat, lon, sources, targets)
+        if speeds is None:
+            speeds = np.full(len(sources), default_speed)
+        if oneway is None:
+            oneway = np.zeros(len(sources), dtype=bool)
+
+        # 양방향 도로는 역방향 간선을 추가한다
+        twoway = ~oneway
+        sources, targets = (
+            np.concatenate([sources, targets[twoway]]),
+            np.concatenate([targets, sources[twoway]]),
+        )
+        lengths = np.concatenate([lengths, lengths[twoway]])
+        speeds = np.concatenate([speeds, speeds[twoway]])
+
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=offsets[1:])
+        return cls(
+            lat.astype(np.float64),
+            lon.astype(np.float64),
+            offsets,
+            targets[order].astype(np.int32),
+            lengths[order].astype(np.float32),
+            speeds[order].astype(np.float32),
+        )
+
+    @staticmethod
+    def _edge_lengths(lat, lon, sources, targets) -> np.ndarray:
+        lat1, lat2 = np.radians(lat[sources]), np.radians(lat[targets])
+        a = (
+            np.sin((lat2 - lat1) * 0.5) ** 2
+            + np.cos(lat1)
+            * np.cos(lat2)
+            * np.sin(np.radians(lon[targets] - lon[sources]) * 0.5) ** 2
+        )
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+    @classmethod
+    def from_csv(cls, directory: str, default_speed: float = 40.0) -> "RoadGraph":
+        # nodes.csv: id,latitude,longitude
+        # edges.csv: source,target[,length][,speed][,oneway]  (length m, speed km/h)
+        with open(os.path.join(directory, "nodes.csv"), newline="") as file:
+            rows = list(csv.DictReader(file))
+        node_ids = np.array([int(row["id"]) for row in rows], dtype=np.int64)
+        lat = np.array([float(row["latitude"]) for row in rows])
+        lon = np.array([float(row["longitude"]) for row in rows])
+
+        with open(os.path.join(directory, "edges.csv"), newline="") as file:
+            reader = csv.DictReader(file)
+            columns = set(reader.fieldnames or ())
+            rows = list(reader)
+        sources = np.array([int(row["source"]) for row in rows], dtype=np.int64)
+        targets = np.array([int(row["target"]) for row in rows], dtype=np.int64)
+        lengths = speeds = oneway = None
+        if "length" in columns:
+            lengths = np.array([float(row["length"]) for row in rows])
+        if "speed" in columns:
+            speeds = np.array([float(row["speed"] or default_speed) for row in rows])
+        if "oneway" in columns:
+            oneway = np.array([row["oneway"] in ("1", "true", "yes") for row in rows])
+        return cls.from_edges(
+            node_ids,
+            lat,
+            lon,
+            sources,
+            targets,
+            lengths,
+            speeds,
+            oneway,
+            default_speed,
+        )
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            lat=self.lat,
+            lon=self.lon,
+            offsets=self.offsets,
+            targets=self.targets,
+            lengths=self.lengths,
+            speeds=self.speeds,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        if os.path.isdir(path):
+            return cls.from_csv(path)
+        data = np.load(path)
+        return cls(
+            data["lat"],
+            data["lon"],
+            data["offsets"],
+            data["targets"],
+            data["lengths"],
+            data["speeds"],
+        )
+
+    def _cell_keys(self, lat, lon):
+        lat_cell = np.floor(np.asarray(lat) / self.cell_size).astype(np.int64)
+        lon_cell = np.floor(np.asarray(lon) / self.cell_size).astype(np.int64)
+        return lat_cell * GRID_STRIDE + lon_cell
+
+    def _build_grid(self):
+        # 격자 키로 정렬해 두고 searchsorted 로 주변 격자의 노드를 찾는다
+        keys = self._cell_keys(self.lat, self.lon)
+        self._grid_order = np.argsort(keys, kind="stable")
+        self._grid_keys = keys[self._grid_order]
+
+    def snap(self, lat: float, lon: float, max_rings: int = 3) -> int | None:
+        base_lat = math.floor(lat / self.cell_size)
+        base_lon = math.floor(lon / self.cell_size)
+        for ring in range(1, max_rings + 1):
+            keys = [
+                (base_lat + d_lat) * GRID_STRIDE + base_lon + d_lon
+                for d_lat in range(-ring, ring + 1)
+                for d_lon in range(-ring, ring + 1)
+            ]
+            starts = np.searchsorted(self._grid_keys, keys, side="left")
+            ends = np.searchsorted(self._grid_keys, keys, side="right")
+            nodes = np.concatenate(
+                [self._grid_order[start:end] for start, end in zip(starts, ends)]
+            )
+            if len(nodes):
+                distances = haversine(lat, lon, self.lat[nodes], self.lon[nodes])
+                return int(nodes[np.argmin(distances)])
+        return None
+
+    def shortest_path(
+        self, source: int, target: int
+    ) -> tuple[list[int], list[int]] | None:
+        lat, lon = self._lat, self._lon
+        offsets, targets, lengths = self._offsets, self._targets, self._lengths
+        target_lat, target_lon = lat[target], lon[target]
+
+        best = {source: 0.0}
+        previous = {source: (-1, -1)}
+        heap = [(_distance(lat[source], lon[source], target_lat, target_lon), source)]
+        closed = set()
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node == target:
+                nodes, edges = [], []
+                while node != -1:
+                    nodes.append(node)
+                    node, edge = previous[node]
+                    if edge != -1:
+                        edges.append(edge)
+                nodes.reverse()
+                edges.reverse()
+                return nodes, edges
+            if node in closed:
+                continue
+            closed.add(node)
+            cost = best[node]
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                candidate = cost + lengths[edge]
+                if candidate < best.get(neighbor, math.inf):
+                    best[neighbor] = candidate
+                    previous[neighbor] = (node, edge)
+                    heapq.heappush(
+                        heap,
+                        (
+                            candidate
+                            + _distance(
+                                lat[neighbor], lon[neighbor], target_lat, target_lon
+                            ),
+                            neighbor,
+                        ),
+                    )
+        return None
+
+
+class Route:
+    __slots__ = ("lat", "lon", "distance", "seconds", "cursor")
+
+    def __init__(self, graph: RoadGraph, nodes: list[int], edges: list[int]):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        edges = np.asarray(edges, dtype=np.int64)
+        self.lat = graph.lat[nodes]
+        self.lon = graph.lon[nodes]
+        # 경로 끝까지 남은 거리와 시간 (노드별 누적합을 뒤집어서 저장)
+        lengths = graph.lengths[edges].astype(np.float64)
+        seconds = lengths / (graph.speeds[edges].astype(np.float64) / 3.6)
+        self.distance = np.append(np.cumsum(lengths[::-1])[::-1], 0.0)
+        self.seconds = np.append(np.cumsum(seconds[::-1])[::-1], 0.0)
+        self.cursor = 0
+
+
+class RoadRouter:
+    def __init__(
+        self,
+        graph: RoadGraph | None = None,
+        cache_size: int = 4096,
+        window: int = 64,
+        off_route: float = 80.0,
+    ):
+        self.graph = graph
+        self.cache_size = cache_size
+        self.window = window  # 한 번에 앞쪽으로 찾아볼 경로 노드 수
+        self.off_route = off_route  # m 단위, 경로에서 이만큼 벗어나면 다시 계산
+        self._routes: OrderedDict[tuple[str, int], Route] = OrderedDict()
+        # 병원 좌표 -> 가장 가까운 도로 노드 (병원 수만큼만 쌓인다)
+        self._destinations: dict[tuple[float, float], int | None] = {}
+        self.routes_computed = 0
+        self.route_failures = 0
+        self.reroutes = 0
+        self.hits = 0
+        self.misses = 0
+        self.compute_seconds = 0.0
+        self.compute_max_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.graph is not None
+
+    def load(self, path: str):
+        started = time.perf_counter()
+        self.graph = RoadGraph.load(path)
+        self._routes.clear()
+        self._destinations.clear()
+        logger.info(
+            "Loaded road graph with %d nodes, %d edges in %.2fs",
+            len(self.graph),
+            len(self.graph.targets),
+            time.perf_counter() - started,
+        )
+
+    def _compute(self, lat: float, lon: float, destination: int) -> Route | None:
+        started = time.perf_counter()
+        source = self.graph.snap(lat, lon)
+        path = None
+        if source is not None:
+            path = self.graph.shortest_path(source, destination)
+        elapsed = time.perf_counter() - started
+        route_compute_seconds.observe(elapsed)
+        self.compute_seconds += elapsed
+        self.compute_max_seconds = max(self.compute_max_seconds, elapsed)
+        if path is None:
+            self.route_failures += 1
+            return None
+        self.routes_computed += 1
+        return Route(self.graph, *path)
+
+    def _advance(self, route: Route, lat: float, lon: float) -> float | None:
+        # 마지막 위치부터 앞쪽 window 개 노드 중 가장 가까운 곳으로 진행 위치를 옮긴다
+        end = min(route.cursor + self.window, len(route.lat))
+        distances = haversine(
+            lat, lon, route.lat[route.cursor : end], route.lon[route.cursor : end]
+        )
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.off_route:
+            return None
+        route.cursor += nearest
+        return float(distances[nearest])
+
+    def _destination(self, lat: float, lon: float) -> int | None:
+        destination = self._destinations.get((lat, lon))
+        if destination is None:
+            destination = self.graph.snap(lat, lon)
+            self._destinations[(lat, lon)] = destination
+        return destination
+
+    def _estimate(self, route: Route, offset: float) -> tuple[int, int]:
+        speed = self.graph.mean_speed / 3.6
+        return (
+            round(route.distance[route.cursor] + offset),
+            round(route.seconds[route.cursor] + offset / speed),
+        )
+
+    def cached(
+        self,
+        tour_id: str,
+        lat: float,
+        lon: float,
+        destination_lat: float,
+        destination_lon: float,
+    ) -> tuple[int, int] | None:
+        # 저장된 경로를 따라가는 중이면 탐색 없이 답한다. 없거나 벗어났으면 None
+        destination = self._destination(destination_lat, destination_lon)
+        if destination is None:
+            return None
+        key = (tour_id, destination)
+        route = self._routes.get(key)
+        if route is None:
+            self.misses += 1
+            return None
+        offset = self._advance(route, lat, lon)
+        if offset is None:
+            self.reroutes += 1
+            return None
+        self.hits += 1
+        self._routes.move_to_end(key)
+        return self._estimate(route, offset)
+
+    def _store(
+        self, key: tuple[str, int], route: Route | None, lat: float, lon: float
+    ) -> tuple[int, int] | None:
+        if route is None:
+            self._routes.pop(key, None)
+            return None
+        self._routes[key] = route
+        self._routes.move_to_end(key)
+        while len(self._routes) > self.cache_size:
+            self._routes.popitem(last=False)
+        return self._estimate(route, self._advance(route, lat, lon) or 0.0)
+
+    async def route(
+        self,
+        tour_id: str,
+        lat: float,
+        lon: float,
+        destination_lat: float,
+        destination_lon: float,
+    ) -> tuple[int, int] | None:
+        destination = self._destination(destination_lat, destination_lon)
+        if destination is None:
+            return None
+        # A* 는 수십 ms 가 걸릴 수 있어 이벤트 루프 밖에서 돌리고, 캐시는 루프에서만 고친다
+        route = await asyncio.to_thread(self._compute, lat, lon, destination)
+        return self._store((tour_id, destination), route, lat, lon)
+
+    def remaining(
+        self,
+        tour_id: str,
+        lat: float,
+        lon: float,
+        destination_lat: float,
+        destination_lon: float,
+    ) -> tuple[int, int] | None:
+        # 경로를 그 자리에서 계산하므로 이벤트 루프 밖(벤치마크, 오프라인 계산)에서만 쓴다
+        estimate = self.cached(tour_id, lat, lon, destination_lat, destination_lon)
+        if estimate is not None:
+            return estimate
+        destination = self._destination(destination_lat, destination_lon)
+        if destination is None:
+            return None
+        route = self._compute(lat, lon, destination)
+        return self._store((tour_id, destination), route, lat, lon)
+
+    def forget(self, tour_id: str):
+        for key in [key for key in self._routes if key[0] == tour_id]:
+            del self._routes[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.reroutes
+        return {
+            "loaded": self.ready,
+            "nodes": len(self.graph) if self.graph is not None else 0,
+            "cached_routes": len(self._routes),
+            "routes_computed": self.routes_computed,
+            "route_failures": self.route_failures,
+            "reroutes": self.reroutes,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "compute_avg_ms": (
+                self.compute_seconds
+                / (self.routes_computed + self.route_failures)
+                * 1000
+                if self.routes_computed + self.route_failures
+                else 0.0
+            ),
+            "compute_max_ms": self.compute_max_seconds * 1000,
+        }
+
+
+road_router = RoadRouter(
+    cache_size=int(os.getenv("ROUTE_CACHE_SIZE", "4096")),
+    off_route=float(os.getenv("ROUTE_OFF_ROUTE_DISTANCE", "80")),
+)
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv(verbose=True)
+logger = logging.getLogger("aidnet")
+
+STARTUP_FAILURE = 3  # uvicorn 이 lifespan 기동에 실패했을 때의 종료 코드
+RESPAWN_DELAY = 1.0  # 초 단위, 계속 죽는 워커가 CPU 를 태우지 않도록
+
+
+def bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(args: argparse.Namespace, sock: socket.socket | None, spawned_at: float):
+    # 워커 기동 시간을 프로세스 생성 시점부터 재기 위해 넘겨 준다
+    os.environ["WORKER_SPAWNED_AT"] = str(spawned_at)
+    # SO_REUSEPORT 모드에서는 워커마다 따로 소켓을 열어 커널이 연결을 나눠 주게 한다
+    if sock is None:
+        sock = bind_socket(args.host, args.port, reuse_port=True)
+    config = uvicorn.Config(
+        "app.server:create_app",
+        factory=True,
+        log_level=args.log_level,
+        backlog=args.backlog,
+        proxy_headers=True,
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    # Server.run 은 lifespan 기동에 실패해도 그냥 돌아오므로 감독 프로세스가 알 수 있게 종료 코드를 정한다
+    if not server.started:
+        sys.exit(STARTUP_FAILURE)
+
+
+def serve(args: argparse.Namespace):
+    from app.server import generate_schemas
+
+    if os.getenv("DATABASE_GENERATE_SCHEMAS", "1") == "1":
+        started = time.perf_counter()
+        asyncio.run(generate_schemas())
+        logger.info("Generated schemas in %.3fs", time.perf_counter() - started)
+    # 워커는 스키마 생성을 건너뛴다
+    os.environ["DATABASE_GENERATE_SCHEMAS"] = "0"
+
+    sock = None
+    if not args.reuse_port:
+        sock = bind_socket(args.host, args.port, reuse_port=False)
+    if args.workers == 1:
+        run_worker(args, sock, time.time())
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers: list[multiprocessing.Process] = []
+    stopping = False
+    failed = False
+
+    def spawn() -> multiprocessing.Process:
+        process = context.Process(target=run_worker, args=(args, sock, time.time()))
+        process.start()
+        return process
+
+    def shutdown(_signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers:
+            if process.is_alive():
+                # 터미널의 SIGINT 는 워커에도 직접 가므로 SIGTERM 으로 한 번 더 알린다
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    workers.extend(spawn() for _ in range(args.workers))
+    logger.info(
+        "Serving on %s:%d with %d workers (%s)",
+        args.host,
+        args.port,
+        args.workers,
+        "SO_REUSEPORT" if args.reuse_port else "shared socket",
+    )
+
+    while workers:
+        wait([process.sentinel for process in workers], timeout=1.0)
+        alive = []
+        for process in workers:
+            if process.is_alive():
+                alive.append(process)
+            elif process.exitcode == STARTUP_FAILURE:
+                # 기동 자체가 실패하면 다시 띄워도 같으므로 전체를 내린다
+                logger.error("Worker %d failed to start, shutting down", process.pid)
+                failed = True
+                shutdown(signal.SIGTERM, None)
+            elif process.exitcode == 0:
+                # 스스로 정상 종료한 워커는 다시 띄우지 않는다
+                logger.info("Worker %d exited", process.pid)
+            elif not stopping:
+                # 비정상 종료된 워커는 다시 띄운다
+                logger.warning(
+                    "Worker %d exited with %s, restarting",
+                    process.pid,
+                    process.exitcode,
+                )
+                time.sleep(RESPAWN_DELAY)
+                alive.append(spawn())
+        workers[:] = alive
+    if sock is not None:
+        sock.close()
+    if failed:
+        sys.exit(STARTUP_FAILURE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aidnet 서버 실행")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        default=os.getenv("SERVER_REUSE_PORT", "0") == "1",
+        help="워커마다 SO_REUSEPORT 소켓을 연다 (기본은 부모가 연 소켓을 공유)",
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args)
@@ -1,54 +1,256 @@
 import os
-import uvicorn
+import time
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 
+from tortoise import Tortoise, connections
 from tortoise.contrib.fastapi import RegisterTortoise
-from interface.response import JSONResponse
+from interface.response import JSONResponse, envelope
+
+from app.redispool import open_redis_pool, close_redis_pool, current_redis_pool
+from app.auth import token_authority
+from app.hashing import password_hasher
+from app.spatial import hospital_index
+from app.matching import hospital_matcher
+from app.dispatch import hospital_dispatcher
+from app.capacity import capacity_board
+from app.fanout import fanout_hub
+from app.connection import websocket_manager
+from app.heartbeat import heartbeat_wheel
+from app.ingest import location_ingestor
+from app.resume import frame_log
+from app.routing import road_router
+from app.tourstore import tour_store
+from app.registercode import register_code_allocator
+from app.archive import tour_archiver
+from app.dashboard import dashboard_feed
+from app.admission import admission_controller, AdmissionMiddleware
+from app.metrics import (
+    registry,
+    event_loop_monitor,
+    instrument_database,
+    MetricsMiddleware,
+)
 
 from router.user import router as user_router
 from router.emergency import router as emergency_router
 
 load_dotenv(verbose=True)
 logging.getLogger("passlib").setLevel(logging.ERROR)
+# uvicorn 이 설정해 두는 로거를 써야 워커 로그가 함께 출력된다
+logger = logging.getLogger("uvicorn.error")
+
+# 실행 진입점이 알려 준 프로세스 생성 시각, 없으면 모듈을 처음 불러온 시각
+PROCESS_STARTED = float(os.getenv("WORKER_SPAWNED_AT") or time.time())
+MODELS = {
+    "models": [
+        "database.user",
+        "database.hospital",
+        "database.ambulance",
+        "database.tour",
+    ]
+}
+
+
+class WorkerState:
+    def __init__(self):
+        self.ready = False
+        self.startup_seconds: float | None = None
+        self.lifespan_seconds: float | None = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "ready": self.ready,
+            "startup_seconds": self.startup_seconds,
+            "lifespan_seconds": self.lifespan_seconds,
+        }
+
+
+worker_state = WorkerState()
+
+
+async def generate_schemas():
+    # 여러 워커가 동시에 스키마를 만들지 않도록 실행 진입점에서 한 번만 호출한다
+    await Tortoise.init(db_url=os.environ["DATABASE_URI"], modules=MODELS)
+    try:
+        await Tortoise.generate_schemas(safe=True)
+    finally:
+        await Tortoise.close_connections()
 
 
 @asynccontextmanager
 async def lifespan(server: FastAPI):
+    lifespan_started = time.time()
     async with RegisterTortoise(
         server,
         db_url=os.environ["DATABASE_URI"],
-        modules={"models": ["database.user"]},
-        generate_schemas=True,
+        modules=MODELS,
+        generate_schemas=os.getenv("DATABASE_GENERATE_SCHEMAS", "1") == "1",
         add_exception_handlers=True,
     ):
-        yield
+        instrument_database(connections.get("default"))
+        event_loop_monitor.start()
+        redis_pool = open_redis_pool()
+        admission_controller.start(redis_pool.client)
+        await token_authority.start(redis_pool.client)
+        password_hasher.start()
+        await hospital_index.start(redis_pool.client)
+        if os.getenv("ROAD_GRAPH_PATH") and not road_router.ready:
+            await asyncio.to_thread(road_router.load, os.environ["ROAD_GRAPH_PATH"])
+        tour_store.start(redis_pool.client)
+        await tour_store.migrate_legacy()
+        fanout_hub.start(redis_pool.client, websocket_manager.deliver)
+        frame_log.start(redis_pool.client, websocket_manager)
+        dashboard_feed.start(redis_pool.client, websocket_manager)
+        await capacity_board.start(redis_pool.client, websocket_manager)
+        hospital_dispatcher.start(redis_pool.client)
+        location_ingestor.start(redis_pool.client)
+        heartbeat_wheel.start(websocket_manager)
+        register_code_allocator.start(redis_pool.client)
+        tour_archiver.start(redis_pool.client)
+
+        now = time.time()
+        worker_state.lifespan_seconds = now - lifespan_started
+        worker_state.startup_seconds = now - PROCESS_STARTED
+        worker_state.ready = True
+        logger.info(
+            "Worker %d ready in %.3fs (lifespan %.3fs)",
+            os.getpid(),
+            worker_state.startup_seconds,
+            worker_state.lifespan_seconds,
+        )
+        try:
+            yield
+        finally:
+            # 종료가 시작되면 로드밸런서가 먼저 트래픽을 빼도록 준비 상태를 내린다
+            worker_state.ready = False
+            await tour_archiver.stop()
+            await register_code_allocator.stop()
+            await heartbeat_wheel.stop()
+            await location_ingestor.stop()
+            await hospital_dispatcher.stop()
+            await capacity_board.stop()
+            await dashboard_feed.stop()
+            frame_log.stop()
+            await fanout_hub.stop()
+            await password_hasher.stop()
+            await hospital_index.stop()
+            await token_authority.stop()
+            tour_store.stop()
+            admission_controller.stop()
+            await close_redis_pool()
+            await event_loop_monitor.stop()
+
 
+router = APIRouter()
 
-app = FastAPI(
-    lifespan=lifespan,
-    title="UltraMedic Backend",
-    description="Backend for UltraMedic",
-    version="0.1",
-    redoc_url="/redoc",
-    docs_url="/docs",
+registry.gauge(
+    "aidnet_websocket_active_connections",
+    "Websocket connections held by this worker",
+    lambda: len(websocket_manager.active_connections),
 )
+registry.gauge(
+    "aidnet_worker_startup_seconds",
+    "Seconds from process start until this worker was ready",
+    lambda: worker_state.startup_seconds or 0.0,
+)
+registry.collector("aidnet_redis_pool", lambda: current_redis_pool().stats())
+registry.collector("aidnet_auth", token_authority.stats)
+registry.collector("aidnet_hospital_index", hospital_index.stats)
+registry.collector("aidnet_matching", hospital_matcher.stats)
+registry.collector("aidnet_password_hasher", password_hasher.stats)
+registry.collector("aidnet_fanout", fanout_hub.stats)
+registry.collector("aidnet_heartbeat", heartbeat_wheel.stats)
+registry.collector("aidnet_resume", frame_log.stats)
+registry.collector("aidnet_dispatch", hospital_dispatcher.stats)
+registry.collector("aidnet_capacity", capacity_board.stats)
+registry.collector("aidnet_location_ingest", location_ingestor.stats)
+registry.collector("aidnet_routing", road_router.stats)
+registry.collector("aidnet_register_code", register_code_allocator.stats)
+registry.collector("aidnet_tour_archive", tour_archiver.stats)
+registry.collector("aidnet_dashboard", dashboard_feed.stats)
+registry.collector("aidnet_admission", admission_controller.stats)
+
+
+@router.get("/", response_model=JSONResponse)
+async def root() -> ORJSONResponse:
+    return envelope({}, message="Hello World!")
 
-app.include_router(user_router)
-app.include_router(emergency_router)
 
+@router.get("/health/live", include_in_schema=False)
+async def health_live() -> ORJSONResponse:
+    return envelope(message="Alive")
 
-@app.get("/")
-async def root() -> JSONResponse:
-    return JSONResponse(
-        code=200,
-        message="Hello World!",
-        data={},
-        errors=[],
+
+@router.get("/health/ready", include_in_schema=False)
+async def health_ready() -> ORJSONResponse:
+    if worker_state.ready:
+        try:
+            await asyncio.wait_for(current_redis_pool().client.ping(), timeout=1.0)
+        except Exception:
+            pass
+        else:
+            return envelope(worker_state.stats(), message="Ready")
+    return envelope(
+        worker_state.stats(),
+        message="Not ready",
+        code=status.HTTP_503_SERVICE_UNAVAILABLE,
     )
 
 
-uvicorn.run(app, host="0.0.0.0", port=8001)
+@router.get("/stats", response_model=JSONResponse)
+async def stats() -> ORJSONResponse:
+    return envelope(
+        {
+            "worker": worker_state.stats(),
+            "redis_pool": current_redis_pool().stats(),
+            "auth": token_authority.stats(),
+            "password_hasher": password_hasher.stats(),
+            "hospital_index": hospital_index.stats(),
+            "matching": hospital_matcher.stats(),
+            "fanout": fanout_hub.stats(),
+            "resume": frame_log.stats(),
+            "dispatch": hospital_dispatcher.stats(),
+            "capacity": capacity_board.stats(),
+            "websocket": websocket_manager.stats(),
+            "heartbeat": heartbeat_wheel.stats(),
+            "location_ingest": location_ingestor.stats(),
+            "routing": road_router.stats(),
+            "register_code": register_code_allocator.stats(),
+            "tour_archive": tour_archiver.stats(),
+            "dashboard": dashboard_feed.stats(),
+            "admission": admission_controller.stats(),
+        }
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+        title="UltraMedic Backend",
+        description="Backend for UltraMedic",
+        version="0.1",
+        redoc_url="/redoc",
+        docs_url="/docs",
+    )
+    # 나중에 추가한 미들웨어가 바깥쪽이므로 거절된 요청도 지표에 남는다
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    app.include_router(user_router)
+    app.include_router(emergency_router)
+    return app
@@ -0,0 +1,368 @@
+import math
+import uuid
+import asyncio
+import logging
+from itertools import chain
+
+import numpy as np
+import orjson
+import redis.asyncio as redis
+from tortoise.signals import post_save, post_delete
+
+from app.specialty import staff_mask
+from database.hospital import Hospital as DatabaseHospital
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE = 111_320.0
+# 병상 수를 보고받은 적이 없는 병원, 0 은 병상이 없다고(응급실 폐쇄 등) 보고한 병원이다
+UNKNOWN_BEDS = -1
+
+logger = logging.getLogger(__name__)
+
+
+def haversine(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat1 = math.radians(lat)
+    lon1 = math.radians(lon)
+    lat2 = np.radians(lats)
+    lon2 = np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) * 0.5) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class HospitalIndex:
+    channel = "hospital:index:changed"
+
+    def __init__(self, cell_size: float = 0.05, capacity: int = 1024):
+        self.cell_size = cell_size  # 위경도 단위 격자 크기 (약 5km)
+        self._lat = np.zeros(capacity, dtype=np.float64)
+        self._lon = np.zeros(capacity, dtype=np.float64)
+        self._ids = np.full(capacity, -1, dtype=np.int64)
+        # 매칭 엔진이 쓰는 열 (진료과 비트마스크, 병상 수, 현재 배정된 환자 수)
+        self._specialties = np.zeros(capacity, dtype=np.uint32)
+        self._beds = np.zeros(capacity, dtype=np.int32)
+        self._load = np.zeros(capacity, dtype=np.int32)
+        self._slot_of: dict[int, int] = {}
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        self._cell_of: dict[int, tuple[int, int]] = {}
+        self._bounds: list[int] | None = None
+        self.info: dict[int, dict] = {}
+        self.capacity = None  # CapacityBoard 가 시작되면 병원 정보가 바뀔 때 실시간 값을 다시 얹는다
+        # 다른 워커에서 바뀐 병원 정보를 받아 반영한다, 자기가 보낸 것은 origin 으로 거른다
+        self.origin = uuid.uuid4().hex
+        self._redis: redis.Redis | None = None
+        self._listener: asyncio.Task | None = None
+        self.broadcasts = 0
+        self.received = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def _grow(self):
+        capacity = len(self._ids)
+        self._lat = np.concatenate([self._lat, np.zeros(capacity)])
+        self._lon = np.concatenate([self._lon, np.zeros(capacity)])
+        self._ids = np.concatenate([self._ids, np.full(capacity, -1, dtype=np.int64)])
+        self._specialties = np.concatenate(
+            [self._specialties, np.zeros(capacity, dtype=np.uint32)]
+        )
+        self._beds = np.concatenate([self._beds, np.zeros(capacity, dtype=np.int32)])
+        self._load = np.concatenate([self._load, np.zeros(capacity, dtype=np.int32)])
+        self._free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def upsert(
+        self,
+        hospital_id: int,
+        lat: float,
+        lon: float,
+        specialties: int = 0,
+        beds: int = UNKNOWN_BEDS,
+        **info,
+    ):
+        slot = self._slot_of.get(hospital_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slot_of[hospital_id] = slot
+            self._load[slot] = 0
+        else:
+            self._discard(slot)
+
+        self._lat[slot] = lat
+        self._lon[slot] = lon
+        self._ids[slot] = hospital_id
+        self._specialties[slot] = specialties
+        self._beds[slot] = beds
+        cell = self._cell(lat, lon)
+        self._cell_of[slot] = cell
+        self._cells.setdefault(cell, set()).add(slot)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            self._bounds[0] = min(self._bounds[0], cell[0])
+            self._bounds[1] = max(self._bounds[1], cell[0])
+            self._bounds[2] = min(self._bounds[2], cell[1])
+            self._bounds[3] = max(self._bounds[3], cell[1])
+        self.info[hospital_id] = {
+            "latitude": lat,
+            "longitude": lon,
+            "specialties": specialties,
+            "beds": beds,
+            **info,
+        }
+
+    def _discard(self, slot: int):
+        cell = self._cell_of.pop(slot)
+        self._cells[cell].discard(slot)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def remove(self, hospital_id: int):
+        slot = self._slot_of.pop(hospital_id, None)
+        if slot is None:
+            return
+        self._discard(slot)
+        self._ids[slot] = -1
+        self._free.append(slot)
+        del self.info[hospital_id]
+
+    def set_load(self, hospital_id: int, load: int):
+        slot = self._slot_of.get(hospital_id)
+        if slot is not None:
+            self._load[slot] = load
+
+    def set_capacity(self, hospital_id: int, beds: int, load: int, specialties: int):
+        slot = self._slot_of.get(hospital_id)
+        if slot is not None:
+            self._beds[slot] = beds
+            self._load[slot] = load
+            self._specialties[slot] = specialties
+
+    def columns(self, slots: np.ndarray) -> tuple[np.ndarray, ...]:
+        return (
+            self._ids[slots],
+            self._lat[slots],
+            self._lon[slots],
+            self._specialties[slots],
+            self._beds[slots],
+            self._load[slots],
+        )
+
+    def _slots_in(self, cells) -> np.ndarray:
+        return np.fromiter(
+            chain.from_iterable(self._cells.get(cell, ()) for cell in cells),
+            dtype=np.int64,
+        )
+
+    def _ring(self, center: tuple[int, int], ring: int):
+        lat_cell, lon_cell = center
+        if ring == 0:
+            yield center
+            return
+        for d in range(-ring, ring + 1):
+            yield lat_cell - ring, lon_cell + d
+            yield lat_cell + ring, lon_cell + d
+        for d in range(-ring + 1, ring):
+            yield lat_cell + d, lon_cell - ring
+            yield lat_cell + d, lon_cell + ring
+
+    def _ranked(self, lat: float, lon: float, slots: np.ndarray):
+        distances = haversine(lat, lon, self._lat[slots], self._lon[slots])
+        order = np.argsort(distances, kind="stable")
+        return self._ids[slots][order], distances[order]
+
+    def region(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        lat_span = radius_m / METERS_PER_DEGREE
+        lon_span = radius_m / (
+            METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+        )
+        lat_min, lon_min = self._cell(lat - lat_span, lon - lon_span)
+        lat_max, lon_max = self._cell(lat + lat_span, lon + lon_span)
+        return self._slots_in(
+            (lat_cell, lon_cell)
+            for lat_cell in range(lat_min, lat_max + 1)
+            for lon_cell in range(lon_min, lon_max + 1)
+        )
+
+    def radius(
+        self, lat: float, lon: float, radius_m: float
+    ) -> list[tuple[int, float]]:
+        slots = self.region(lat, lon, radius_m)
+        if not len(slots):
+            return []
+        ids, distances = self._ranked(lat, lon, slots)
+        within = distances <= radius_m
+        return list(zip(ids[within].tolist(), distances[within].tolist()))
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 1, max_distance: float | None = None
+    ) -> list[tuple[int, float]]:
+        if not self._slot_of:
+            return []
+        center = self._cell(lat, lon)
+        lat_min, lat_max, lon_min, lon_max = self._bounds
+        max_ring = max(
+            center[0] - lat_min,
+            lat_max - center[0],
+            center[1] - lon_min,
+            lon_max - center[1],
+        )
+        collected: list[np.ndarray] = []
+        count = 0
+        ring = 0
+        while ring <= max_ring:
+            slots = self._slots_in(self._ring(center, ring))
+            if len(slots):
+                collected.append(slots)
+                count += len(slots)
+            # 탐색한 격자 밖의 병원까지 보장되는 최소 거리 (경도 방향이 더 좁다)
+            edge_lat = min(abs(lat) + (ring + 1) * self.cell_size, 89.9)
+            covered = (
+                ring
+                * self.cell_size
+                * METERS_PER_DEGREE
+                * math.cos(math.radians(edge_lat))
+            )
+            if max_distance is not None and covered >= max_distance:
+                break
+            if count >= k:
+                ids, distances = self._ranked(lat, lon, np.concatenate(collected))
+                if distances[k - 1] <= covered:
+                    break
+            ring += 1
+
+        if not collected:
+            return []
+        ids, distances = self._ranked(lat, lon, np.concatenate(collected))
+        ids, distances = ids[:k], distances[:k]
+        if max_distance is not None:
+            within = distances <= max_distance
+            ids, distances = ids[within], distances[within]
+        return list(zip(ids.tolist(), distances.tolist()))
+
+    @staticmethod
+    def _info_of(hospital: DatabaseHospital) -> dict:
+        return {
+            "name": hospital.name,
+            "address": hospital.address,
+            "specialties": staff_mask(hospital.medical_staff),
+            "beds": hospital.bed_capacity,
+        }
+
+    async def load(self):
+        hospitals = await DatabaseHospital.filter(
+            latitude__isnull=False, longitude__isnull=False
+        )
+        loaded = set()
+        for hospital in hospitals:
+            self.sync(hospital)
+            loaded.add(hospital.login_id)
+        for hospital_id in [key for key in self._slot_of if key not in loaded]:
+            self.remove(hospital_id)
+        self.reloads += 1
+
+    def _apply(self, hospital_id: int, data: dict | None):
+        if data is None:
+            self.remove(hospital_id)
+            return
+        self.upsert(hospital_id, **data)
+        if self.capacity is not None:
+            self.capacity.apply(hospital_id)
+
+    def sync(self, hospital: DatabaseHospital) -> dict | None:
+        if hospital.latitude is None or hospital.longitude is None:
+            data = None
+        else:
+            data = {
+                "lat": hospital.latitude,
+                "lon": hospital.longitude,
+                **self._info_of(hospital),
+            }
+        self._apply(hospital.login_id, data)
+        return data
+
+    async def broadcast(self, hospital_id: int, data: dict | None):
+        if self._redis is None:
+            return
+        self.broadcasts += 1
+        await self._redis.publish(
+            self.channel,
+            orjson.dumps(
+                {"origin": self.origin, "hospital_id": hospital_id, "hospital": data}
+            ),
+        )
+
+    def _receive(self, payload: bytes):
+        message = orjson.loads(payload)
+        if message["origin"] == self.origin:
+            return
+        self.received += 1
+        self._apply(message["hospital_id"], message["hospital"])
+
+    async def _subscribe(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        # 구독하기 전에 놓친 변경이 있을 수 있으므로 구독한 뒤 전체를 다시 읽는다
+        await self.load()
+        return pubsub
+
+    async def _listen(self, pubsub):
+        while True:
+            if pubsub is not None:
+                try:
+                    async for message in pubsub.listen():
+                        try:
+                            self._receive(message["data"])
+                        except Exception:
+                            logger.exception("Failed to apply hospital index change")
+                except Exception:
+                    logger.exception("Lost hospital index change subscription")
+                finally:
+                    await pubsub.aclose()
+            await asyncio.sleep(1.0)
+            try:
+                pubsub = await self._subscribe()
+            except Exception:
+                logger.exception("Failed to resubscribe to hospital index changes")
+                pubsub = None
+
+    async def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._listener = asyncio.create_task(self._listen(await self._subscribe()))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "broadcasts": self.broadcasts,
+            "received": self.received,
+            "reloads": self.reloads,
+        }
+
+
+hospital_index = HospitalIndex()
+
+
+@post_save(DatabaseHospital)
+async def _sync_saved_hospital(sender, instance, created, using_db, update_fields):
+    await hospital_index.broadcast(instance.login_id, hospital_index.sync(instance))
+
+
+@post_delete(DatabaseHospital)
+async def _remove_deleted_hospital(sender, instance, using_db):
+    hospital_index.remove(instance.login_id)
+    await hospital_index.broadcast(instance.login_id, None)
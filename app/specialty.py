@@ -0,0 +1,111 @@
+import functools
+
+import numpy as np
+
+# 진료과 -> 직책 문자열에서 찾을 별칭 (구체적인 과가 먼저 오도록 정렬, 비트 순서도 이 순서)
+SPECIALTY_ALIASES: dict[str, tuple[str, ...]] = {
+    "순환기내과": ("순환기", "심장"),
+    "호흡기내과": ("호흡기",),
+    "소화기내과": ("소화기",),
+    "신경외과": ("신경외과",),
+    "흉부외과": ("흉부",),
+    "정형외과": ("정형",),
+    "성형외과": ("성형", "화상"),
+    "신경과": ("신경과",),
+    "정신건강의학과": ("정신",),
+    "소아청소년과": ("소아",),
+    "산부인과": ("산부인", "산과"),
+    "비뇨의학과": ("비뇨",),
+    "이비인후과": ("이비인후",),
+    "마취통증의학과": ("마취",),
+    "영상의학과": ("영상",),
+    "응급의학과": ("응급",),
+    "안과": ("안과",),
+    "피부과": ("피부",),
+    "내과": ("내과",),
+    "외과": ("외과",),
+}
+SPECIALTIES = tuple(SPECIALTY_ALIASES)
+SPECIALTY_BITS = {name: 1 << bit for bit, name in enumerate(SPECIALTIES)}
+EMERGENCY = SPECIALTY_BITS["응급의학과"]
+
+# 증상 키워드 -> 필요한 진료과
+SYMPTOM_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "흉통": ("순환기내과", "흉부외과"),
+    "가슴": ("순환기내과", "흉부외과"),
+    "심장": ("순환기내과",),
+    "심정지": ("순환기내과", "응급의학과"),
+    "호흡": ("호흡기내과",),
+    "숨": ("호흡기내과",),
+    "천식": ("호흡기내과",),
+    "복통": ("소화기내과", "외과"),
+    "구토": ("소화기내과",),
+    "토혈": ("소화기내과",),
+    "혈변": ("소화기내과", "외과"),
+    "의식": ("신경과", "신경외과"),
+    "마비": ("신경과", "신경외과"),
+    "뇌졸중": ("신경과", "신경외과"),
+    "경련": ("신경과",),
+    "두통": ("신경과",),
+    "어지": ("신경과",),
+    "머리": ("신경외과",),
+    "골절": ("정형외과",),
+    "탈구": ("정형외과",),
+    "낙상": ("정형외과", "신경외과"),
+    "허리": ("정형외과",),
+    "출혈": ("외과",),
+    "자상": ("외과",),
+    "외상": ("외과", "정형외과"),
+    "교통사고": ("외과", "정형외과", "신경외과"),
+    "화상": ("성형외과",),
+    "임신": ("산부인과",),
+    "출산": ("산부인과",),
+    "분만": ("산부인과",),
+    "하혈": ("산부인과",),
+    "소아": ("소아청소년과",),
+    "영아": ("소아청소년과",),
+    "유아": ("소아청소년과",),
+    "자살": ("정신건강의학과",),
+    "자해": ("정신건강의학과",),
+    "환청": ("정신건강의학과",),
+    "공황": ("정신건강의학과",),
+}
+SYMPTOM_MASKS = {
+    keyword: functools.reduce(int.__or__, (SPECIALTY_BITS[name] for name in names))
+    for keyword, names in SYMPTOM_KEYWORDS.items()
+}
+
+# uint32 마스크의 비트 수를 16비트씩 나눠 표에서 찾는다 (np.bitwise_count 는 NumPy 2 부터)
+_POPCOUNT16 = np.array([bin(value).count("1") for value in range(1 << 16)], np.uint8)
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    return _POPCOUNT16[masks & 0xFFFF] + _POPCOUNT16[masks >> 16]
+
+
+def position_mask(position: str) -> int:
+    for name, aliases in SPECIALTY_ALIASES.items():
+        if any(alias in position for alias in aliases):
+            return SPECIALTY_BITS[name]
+    return 0
+
+
+def staff_mask(medical_staff) -> int:
+    mask = 0
+    for staff in medical_staff or ():
+        if isinstance(staff, dict):
+            mask |= position_mask(str(staff.get("position", "")))
+    return mask
+
+
+@functools.lru_cache(maxsize=4096)
+def symptom_mask(symptom: str) -> int:
+    mask = 0
+    for keyword, keyword_mask in SYMPTOM_MASKS.items():
+        if keyword in symptom:
+            mask |= keyword_mask
+    return mask or EMERGENCY
+
+
+def names_of(mask: int) -> list[str]:
+    return [name for name, bit in SPECIALTY_BITS.items() if mask & bit]
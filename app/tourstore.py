@@ -0,0 +1,284 @@
+import time
+import zlib
+import logging
+
+import orjson
+import redis.asyncio as redis
+
+from interface.emergency import EmergencyTour, EmergencyTourStatus
+
+logger = logging.getLogger(__name__)
+
+# 스크립트는 같은 해시 태그를 쓰는 투어 자신의 키만 건드려 클러스터에서도 한 슬롯 안에서 실행된다.
+# 다른 슬롯에 있는 투어 목록과 보관 스트림은 스크립트가 끝난 뒤 따로 갱신한다
+CREATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+redis.call('HSET', KEYS[1], unpack(ARGV))
+return 1
+"""
+
+# ARGV[1] 이 비어 있지 않으면 지금 상태가 그 값일 때만 바꾼다 (상태 전이)
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[1] ~= '' and redis.call('HGET', KEYS[1], 'status') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+return redis.call('HINCRBY', KEYS[1], 'version', 1)
+"""
+
+RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+return redis.call('HINCRBY', KEYS[1], 'version', 1)
+"""
+
+# 끝난 투어와 위치 기록을 보관용 키로 옮긴다
+FINISH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'finished_at', ARGV[1])
+redis.call('RENAME', KEYS[1], KEYS[3])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[4])
+end
+return 1
+"""
+
+
+class TourStore:
+    legacy_key = "emergency"
+    migrate_lock_key = "emergency:migrate:lock"
+    archive_stream = "emergency:archive"
+    index_buckets = 16
+
+    def __init__(self):
+        self._redis: redis.Redis | None = None
+        self._create = None
+        self._update = None
+        self._record = None
+        self._finish = None
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        # 해시 태그로 투어별 키를 묶어 클러스터 슬롯에 고르게 분산시킨다
+        return f"emergency:{{{user_id}}}"
+
+    @staticmethod
+    def track_key(user_id: str) -> str:
+        return f"emergency:{{{user_id}}}:track"
+
+    @staticmethod
+    def archive_key(user_id: str, archive_id: str) -> str:
+        return f"emergency:{{{user_id}}}:archive:{archive_id}"
+
+    def index_key(self, user_id: str) -> str:
+        bucket = zlib.crc32(user_id.encode()) % self.index_buckets
+        return f"emergency:tours:{bucket}"
+
+    @staticmethod
+    def encode(tour: EmergencyTour) -> dict[str, str | bytes]:
+        data = tour.to_json()
+        return {
+            "patient_name": data["patient_name"],
+            "symptom": data["symptom"],
+            "license_number": data["license_number"],
+            "status": str(data["status"]),
+            "hospital": orjson.dumps(data["hospital"]) if data["hospital"] else "",
+            "remain_distance": (
+                "" if data["remain_distance"] is None else str(data["remain_distance"])
+            ),
+            "current_location": data["current_location"] or "",
+            "eta": "" if data["eta"] is None else str(data["eta"]),
+        }
+
+    @staticmethod
+    def encode_fields(**fields) -> dict[str, str | bytes]:
+        encoded = {}
+        for name, value in fields.items():
+            if value is None:
+                encoded[name] = ""
+            elif name == "hospital":
+                encoded[name] = orjson.dumps(value)
+            elif name == "status":
+                encoded[name] = str(EmergencyTourStatus(value).value)
+            else:
+                encoded[name] = str(value)
+        return encoded
+
+    @staticmethod
+    def decode(data: dict[bytes, bytes]) -> dict:
+        fields = {key.decode(): value.decode() for key, value in data.items()}
+        return {
+            "patient_name": fields["patient_name"],
+            "symptom": fields["symptom"],
+            "license_number": fields["license_number"],
+            "status": int(fields["status"]),
+            "hospital": (
+                orjson.loads(fields["hospital"]) if fields["hospital"] else None
+            ),
+            "remain_distance": (
+                int(fields["remain_distance"]) if fields["remain_distance"] else None
+            ),
+            "current_location": fields["current_location"] or None,
+            "eta": int(fields["eta"]) if fields.get("eta") else None,
+            "version": int(fields.get("version", 0)),
+        }
+
+    def start(self, redis_connection: redis.Redis):
+        self._redis = redis_connection
+        self._create = redis_connection.register_script(CREATE_SCRIPT)
+        self._update = redis_connection.register_script(UPDATE_SCRIPT)
+        self._record = redis_connection.register_script(RECORD_SCRIPT)
+        self._finish = redis_connection.register_script(FINISH_SCRIPT)
+
+    def stop(self):
+        self._redis = None
+
+    @staticmethod
+    def _flatten(mapping: dict[str, str | bytes]) -> list[str | bytes]:
+        return [item for pair in mapping.items() for item in pair]
+
+    async def create(self, user_id: str, tour: EmergencyTour) -> bool:
+        mapping = {**self.encode(tour), "version": "1", "created_at": str(time.time())}
+        # 목록에 먼저 넣어 두면 중간에 끊겨도 없는 투어가 목록에 남을 뿐 목록에서 빠지지는 않는다
+        await self._redis.sadd(self.index_key(user_id), user_id)
+        return bool(
+            await self._create(
+                keys=[self.key(user_id), self.track_key(user_id)],
+                args=self._flatten(mapping),
+            )
+        )
+
+    async def exists(self, user_id: str) -> bool:
+        return bool(await self._redis.exists(self.key(user_id)))
+
+    async def get(self, user_id: str) -> dict | None:
+        data = await self._redis.hgetall(self.key(user_id))
+        return self.decode(data) if data else None
+
+    async def get_many(self, user_ids: list[str]) -> dict[str, dict]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(self.key(user_id))
+            results = await pipe.execute()
+        return {
+            user_id: self.decode(data)
+            for user_id, data in zip(user_ids, results)
+            if data
+        }
+
+    async def get_fields(self, user_id: str, *names: str) -> list[bytes | None]:
+        return await self._redis.hmget(self.key(user_id), names)
+
+    async def update(
+        self,
+        user_id: str,
+        client=None,
+        expected_status: EmergencyTourStatus | None = None,
+        **fields,
+    ) -> int:
+        return await self._update(
+            keys=[self.key(user_id)],
+            args=[
+                "" if expected_status is None else str(expected_status.value),
+                *self._flatten(self.encode_fields(**fields)),
+            ],
+            client=client,
+        )
+
+    async def transition(
+        self,
+        user_id: str,
+        current: EmergencyTourStatus,
+        status: EmergencyTourStatus,
+        client=None,
+        **fields,
+    ) -> int:
+        # 다른 요청이 먼저 상태를 바꿨거나 끝난 투어면 0
+        return await self.update(
+            user_id, client=client, expected_status=current, status=status, **fields
+        )
+
+    async def record(self, user_id: str, point: bytes, client=None, **fields) -> int:
+        # 위치 기록 추가와 필드 갱신을 한 번에 처리해 끝난 투어에 점이 남지 않게 한다
+        return await self._record(
+            keys=[self.key(user_id), self.track_key(user_id)],
+            args=[point, *self._flatten(self.encode_fields(**fields))],
+            client=client,
+        )
+
+    async def finish(self, user_id: str, archive_id: str) -> bool:
+        finished = await self._finish(
+            keys=[
+                self.key(user_id),
+                self.track_key(user_id),
+                self.archive_key(user_id, archive_id),
+                self.archive_key(user_id, archive_id) + ":track",
+            ],
+            args=[str(time.time())],
+        )
+        if not finished:
+            return False
+        # 보관용 키로 옮긴 뒤에 스트림에 남겨야 아카이버가 빈 키를 읽지 않는다
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.srem(self.index_key(user_id), user_id)
+            pipe.xadd(
+                self.archive_stream, {"user_id": user_id, "archive_id": archive_id}
+            )
+            await pipe.execute()
+        return True
+
+    async def user_ids(self, count: int = 500):
+        for bucket in range(self.index_buckets):
+            async for user_id in self._redis.sscan_iter(
+                f"emergency:tours:{bucket}", count=count
+            ):
+                yield user_id.decode()
+
+    async def migrate_legacy(self, count: int = 500) -> int:
+        if not await self._redis.exists(self.legacy_key):
+            return 0
+        # 워커가 동시에 떠도 한 곳에서만 옮긴다
+        lock = self._redis.lock(self.migrate_lock_key, timeout=300)
+        if not await lock.acquire(blocking=False):
+            return 0
+        migrated = 0
+        skipped = 0
+        cursor = 0
+        try:
+            while True:
+                cursor, entries = await self._redis.hscan(
+                    self.legacy_key, cursor, count=count
+                )
+                for user_id, data in entries.items():
+                    user_id = user_id.decode()
+                    if not await self.create(
+                        user_id, EmergencyTour(**orjson.loads(data))
+                    ):
+                        skipped += 1
+                        continue
+                    await self._redis.hdel(self.legacy_key, user_id)
+                    migrated += 1
+                if cursor == 0:
+                    break
+        finally:
+            await lock.release()
+        if skipped:
+            logger.warning(
+                "Kept %d legacy tours whose user already has a tour in progress",
+                skipped,
+            )
+        return migrated
+
+
+tour_store = TourStore()
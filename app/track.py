@@ -0,0 +1,131 @@
+import struct
+
+import numpy as np
+
+TRACK_VERSION = 1
+# 위경도는 1e-6 도(약 10cm) 단위 정수, 시각은 ms 단위 정수로 저장한다
+COORDINATE_SCALE = 1_000_000
+HEADER = struct.Struct("<BI")
+POINT = np.dtype([("t", "<i8"), ("lat", "<i4"), ("lon", "<i4")])
+
+
+def pack_point(timestamp: float, latitude: float, longitude: float) -> bytes:
+    # Redis 리스트에 쌓아 두는 원본 위치 한 점 (16바이트)
+    return struct.pack(
+        "<qii",
+        round(timestamp * 1000),
+        round(latitude * COORDINATE_SCALE),
+        round(longitude * COORDINATE_SCALE),
+    )
+
+
+def unpack_points(items: list[bytes]) -> np.ndarray:
+    return np.frombuffer(b"".join(items), dtype=POINT)
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(
+        np.int64
+    )
+
+
+def _varint_encode(values: np.ndarray) -> bytes:
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    offsets = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for position in range(int(lengths.max(initial=0))):
+        mask = lengths > position
+        chunk = (values[mask] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (lengths[mask] > position + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[mask] + position] = chunk | more
+    return out.tobytes()
+
+
+def _varint_decode(data: bytes) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = raw < 0x80
+    # 각 바이트가 몇 번째 값에 속하는지, 그 값 안에서 몇 번째 바이트인지 구한다
+    group = np.zeros(len(raw), dtype=np.int64)
+    group[1:] = np.cumsum(ends[:-1])
+    starts = np.flatnonzero(np.r_[True, ends[:-1]])
+    shift = ((np.arange(len(raw)) - starts[group]) * 7).astype(np.uint64)
+    values = np.zeros(int(ends.sum()), dtype=np.uint64)
+    np.bitwise_or.at(values, group, (raw & 0x7F).astype(np.uint64) << shift)
+    return values
+
+
+def encode_track(points: np.ndarray) -> bytes:
+    # 첫 점은 그대로, 이후는 직전 점과의 차이를 zigzag varint 로 줄여 담는다
+    columns = np.stack(
+        [points["t"], points["lat"].astype(np.int64), points["lon"].astype(np.int64)],
+        axis=1,
+    )
+    deltas = np.diff(columns, axis=0, prepend=np.zeros((1, 3), dtype=np.int64))
+    return HEADER.pack(TRACK_VERSION, len(points)) + _varint_encode(
+        _zigzag(deltas.ravel())
+    )
+
+
+def decode_track(data: bytes) -> np.ndarray:
+    version, count = HEADER.unpack_from(data)
+    if version != TRACK_VERSION:
+        raise ValueError(f"Unsupported track version: {version}")
+    columns = np.cumsum(
+        _unzigzag(_varint_decode(data[HEADER.size :])).reshape(count, 3), axis=0
+    )
+    points = np.empty(count, dtype=POINT)
+    points["t"], points["lat"], points["lon"] = columns.T
+    return points
+
+
+def downsample(points: np.ndarray, max_points: int) -> np.ndarray:
+    # 시작과 끝 점을 유지하면서 고르게 골라낸다
+    if max_points <= 0 or len(points) <= max_points:
+        return points
+    if max_points == 1:
+        return points[-1:]
+    return points[
+        np.unique(np.linspace(0, len(points) - 1, max_points).round().astype(np.int64))
+    ]
+
+
+class Track:
+    __slots__ = ("data", "count", "_points")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.count = HEADER.unpack_from(data)[1] if data else 0
+        self._points: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def points(self) -> np.ndarray:
+        # 실제로 경로를 요청할 때만 디코딩한다
+        if self._points is None:
+            self._points = (
+                decode_track(self.data) if self.data else np.empty(0, dtype=POINT)
+            )
+        return self._points
+
+    def to_list(self, max_points: int = 0) -> list[list]:
+        points = downsample(self.points, max_points)
+        return [
+            [
+                timestamp / 1000,
+                latitude / COORDINATE_SCALE,
+                longitude / COORDINATE_SCALE,
+            ]
+            for timestamp, latitude, longitude in zip(
+                points["t"].tolist(), points["lat"].tolist(), points["lon"].tolist()
+            )
+        ]
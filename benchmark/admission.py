@@ -0,0 +1,231 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmark.load import summarize
+from benchmark.serve import BENCH_PASSWORD, bench_email, free_port
+
+CALL = {
+    "name": "벤치마크 환자",
+    "symptom": "흉통",
+    "location_x": "127.0276",
+    "location_y": "37.4979",
+}
+
+
+def start_server(users: int, admission: bool) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "benchmark.serve",
+        "--port",
+        str(port),
+        "--users",
+        str(users),
+    ]
+    if admission:
+        command.append("--admission")
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    if server.stdout.readline().strip() != "READY":
+        server.terminate()
+        raise SystemExit("benchmark server failed to start")
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def emergency_probe(
+    client: httpx.AsyncClient, token: str, duration: float, interval: float
+) -> tuple[list[float], int]:
+    # 구급차 한 대가 일정한 간격으로 병원 매칭을 요청한다
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                "/emergency/call",
+                headers={"Authorization": f"Bearer {token}"},
+                json=CALL,
+            )
+            # 주변 병원이 없으면 404 이므로 정상 처리로 본다
+            if response.status_code not in (200, 404):
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError:
+            errors += 1
+        await asyncio.sleep(interval)
+    return latencies, errors
+
+
+def flood_request(host: str, index: int) -> bytes:
+    # 연결 네 개 중 하나는 로그인(bcrypt), 나머지는 가벼운 요청을 보낸다
+    if index % 4:
+        return f"GET / HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    body = json.dumps({"email": bench_email(index), "password": BENCH_PASSWORD})
+    return (
+        f"POST /user/login HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n{body}"
+    ).encode()
+
+
+async def flood_connection(
+    host: str,
+    port: int,
+    request: bytes,
+    rate: float,
+    duration: float,
+    statuses: dict,
+):
+    # 응답을 기다리지 않고 정해진 속도로 요청을 밀어 넣는다 (개방형 부하)
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def read_responses():
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            status, length = line.split()[1].decode(), 0
+            while (header := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = header.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    reading = asyncio.create_task(read_responses())
+    next_at = time.perf_counter()
+    deadline = next_at + duration
+    while next_at < deadline:
+        writer.write(request)
+        statuses["sent"] = statuses.get("sent", 0) + 1
+        next_at += 1 / rate
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+    reading.cancel()
+    await asyncio.gather(reading, return_exceptions=True)
+    writer.close()
+
+
+def flood_process(
+    base_url: str, users: int, rate: float, duration: float, connections: int
+) -> dict:
+    # 부하를 보내는 쪽이 서버와 같은 이벤트 루프를 쓰지 않도록 별도 프로세스에서 돌린다
+    host, port = base_url.removeprefix("http://").split(":")
+    statuses: dict = {}
+
+    async def run():
+        await asyncio.gather(
+            *(
+                flood_connection(
+                    host,
+                    int(port),
+                    # 연결마다 한 종류만 보내 느린 로그인 뒤에 다른 요청이 묶이지 않게 한다
+                    flood_request(host, index % users),
+                    rate / connections,
+                    duration,
+                    statuses,
+                )
+                for index in range(connections)
+            )
+        )
+
+    asyncio.run(run())
+    return statuses
+
+
+async def scenario(args, admission: bool) -> dict:
+    server, base_url = start_server(args.users, admission)
+    try:
+        limits = httpx.Limits(max_connections=args.ambulances)
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=60
+        ) as client:
+            tokens = []
+            for index in range(args.ambulances):
+                response = await client.post(
+                    "/user/login",
+                    json={"email": bench_email(index), "password": BENCH_PASSWORD},
+                )
+                tokens.append(response.json()["data"]["token"])
+                # 로그인 버킷을 다 쓰지 않도록 천천히 받는다
+                await asyncio.sleep(0.3 if admission else 0)
+
+            baseline = await asyncio.gather(
+                *(
+                    emergency_probe(client, token, args.duration / 2, args.interval)
+                    for token in tokens
+                )
+            )
+
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(1) as executor:
+                flooding = loop.run_in_executor(
+                    executor,
+                    flood_process,
+                    base_url,
+                    args.users,
+                    args.flood_rate,
+                    args.duration,
+                    args.flood_connections,
+                )
+                # 부하가 걸리기 시작한 뒤부터 잰다
+                await asyncio.sleep(1.0)
+                loaded = await asyncio.gather(
+                    *(
+                        emergency_probe(
+                            client, token, args.duration - 2.0, args.interval
+                        )
+                        for token in tokens
+                    )
+                )
+                statuses = await flooding
+            stats = (await client.get("/stats")).json()["data"]
+    finally:
+        server.terminate()
+        server.wait()
+
+    def merge(results):
+        latencies = [value for values, _ in results for value in values]
+        return latencies, sum(errors for _, errors in results)
+
+    return {
+        "emergency_baseline": summarize(*merge(baseline), args.duration / 2),
+        "emergency_saturated": summarize(*merge(loaded), args.duration - 2.0),
+        "flood_responses": statuses,
+        "admission": stats["admission"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="낮은 우선순위 요청으로 포화시킨 상태에서 응급 경로 지연 측정"
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ambulances", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument(
+        "--flood-rate", type=float, default=600, help="초당 낮은 우선순위 요청 수"
+    )
+    parser.add_argument("--flood-connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = {
+        "without_admission": await scenario(args, admission=False),
+        "with_admission": await scenario(args, admission=True),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
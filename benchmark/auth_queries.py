@@ -0,0 +1,189 @@
+import os
+import time
+import json
+import uuid
+import asyncio
+import argparse
+import functools
+from datetime import datetime, timedelta, timezone
+
+from tortoise import Tortoise
+from tortoise.backends.sqlite.client import TransactionWrapper
+
+from app.hashing import password_hasher
+from app.metrics import DATABASE_METHODS
+from database.user import User, UserRegisterCode
+from interface.user import RegisterUserRequest, LoginUserRequest
+from router.user import User as UserRouter
+
+TRANSACTION_METHODS = ("start", "commit", "rollback")
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+    def _wrap(self, owner: type, method_name: str):
+        function = getattr(owner, method_name)
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            self.count += 1
+            return await function(*args, **kwargs)
+
+        setattr(owner, method_name, wrapper)
+
+    def install(self, connection):
+        for method_name in DATABASE_METHODS:
+            self._wrap(type(connection), method_name)
+        # BEGIN / COMMIT 도 DB 왕복이므로 같이 센다
+        for method_name in TRANSACTION_METHODS:
+            self._wrap(TransactionWrapper, method_name)
+
+    def reset(self) -> int:
+        count, self.count = self.count, 0
+        return count
+
+
+# 기존 구현의 조회 순서를 그대로 재현한다 (비교 기준)
+async def legacy_register(user_data: RegisterUserRequest, hashed_password: str):
+    if await User.exists(username=user_data.username):
+        raise ValueError("Username already exists")
+    if await User.exists(email=user_data.email):
+        raise ValueError("Email already exists")
+    if not await UserRegisterCode.exists(code=user_data.register_code):
+        raise ValueError("Invalid register code")
+    register_code_data = await UserRegisterCode.filter(
+        code=user_data.register_code
+    ).first()
+    if register_code_data.email != user_data.email:
+        raise ValueError("Invalid register code")
+    new_user_id = uuid.uuid4()
+    while await User.exists(id=str(uuid.uuid4())):
+        new_user_id = uuid.uuid4()
+    await User.create(
+        id=new_user_id,
+        username=user_data.username,
+        email=user_data.email,
+        hashed_password=hashed_password,
+    )
+    await register_code_data.delete()
+
+
+async def legacy_login(login_data: LoginUserRequest):
+    if not await User.exists(email=login_data.email):
+        raise ValueError("User not found")
+    await User.get(email=login_data.email)
+
+
+async def issue_code(email: str, index: int) -> str:
+    code = f"{index:06x}"
+    await UserRegisterCode.create(
+        id=uuid.uuid4(),
+        email=email,
+        code=code,
+        expired_at=datetime.now(timezone.utc) + timedelta(days=2),
+    )
+    return code
+
+
+async def measure(counter: RoundTripCounter, name: str, requests: int, func) -> dict:
+    round_trips = []
+    elapsed = 0.0
+    for index in range(requests):
+        await func(index, prepare=True)
+        counter.reset()
+        started = time.perf_counter()
+        await func(index, prepare=False)
+        elapsed += time.perf_counter() - started
+        round_trips.append(counter.reset())
+    return {
+        "path": name,
+        "requests": requests,
+        "round_trips_per_request": sum(round_trips) / requests,
+        "avg_ms": round(elapsed / requests * 1000, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="회원가입/로그인 DB 왕복 횟수 비교")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["database.user"]}
+    )
+    await Tortoise.generate_schemas()
+    counter = RoundTripCounter()
+    counter.install(Tortoise.get_connection("default"))
+
+    # bcrypt 비용은 왕복 횟수와 무관하므로 미리 한 번만 계산해 둔다
+    hashed_password = password_hasher.password_context.hash("password")
+    router = UserRouter()
+
+    async def hash_once(_password):
+        return hashed_password
+
+    router.get_password_hash = hash_once
+    router.verify_password = lambda *_args: asyncio.sleep(0, True)
+
+    def register_data(prefix: str, index: int, code: str = "") -> RegisterUserRequest:
+        return RegisterUserRequest(
+            username=f"{prefix}{index}",
+            password="password",
+            email=f"{prefix}{index}@aidnet.test",
+            register_code=code,
+        )
+
+    codes: dict[str, str] = {}
+
+    def register_path(prefix: str, register):
+        async def run(index: int, prepare: bool):
+            email = f"{prefix}{index}@aidnet.test"
+            if prepare:
+                codes[email] = await issue_code(email, len(codes))
+                return
+            await register(register_data(prefix, index, codes[email]))
+
+        return run
+
+    def login_path(prefix: str, login):
+        async def run(index: int, prepare: bool):
+            if not prepare:
+                await login(
+                    LoginUserRequest(
+                        email=f"{prefix}{index}@aidnet.test", password="password"
+                    )
+                )
+
+        return run
+
+    results = [
+        await measure(
+            counter,
+            "register (legacy)",
+            args.requests,
+            register_path(
+                "legacy", lambda data: legacy_register(data, hashed_password)
+            ),
+        ),
+        await measure(
+            counter,
+            "register",
+            args.requests,
+            register_path("current", router.register),
+        ),
+        await measure(
+            counter, "login (legacy)", args.requests, login_path("legacy", legacy_login)
+        ),
+        await measure(
+            counter, "login", args.requests, login_path("current", router.login)
+        ),
+    ]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+import time
+import json
+import random
+import asyncio
+import argparse
+
+from starlette.websockets import WebSocketState
+
+from app.capacity import CapacityBoard
+from app.connection import ConnectionManager
+from app.matching import HospitalMatcher
+from app.spatial import HospitalIndex
+from app.specialty import SPECIALTY_BITS, SYMPTOM_KEYWORDS
+from benchmark.redis_client import connect
+
+
+class CountingWebSocket:
+    client_state = WebSocketState.DISCONNECTED
+
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, payload: str):
+        self.frames += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def random_point(rng: random.Random) -> tuple[float, float]:
+    return 37.5665 + rng.uniform(-0.15, 0.15), 126.978 + rng.uniform(-0.15, 0.15)
+
+
+async def per_hospital_match(
+    client, board: CapacityBoard, matcher: HospitalMatcher, lat, lon, symptom
+):
+    # 매칭할 때마다 후보 병원의 현황을 Redis 에서 하나씩 읽어 오는 방식
+    slots = matcher.index.region(lat, lon, matcher.radius)
+    ids = matcher.index.columns(slots)[0].tolist()
+    async with client.pipeline(transaction=False) as pipe:
+        for hospital_id in ids:
+            pipe.hgetall(board.key(hospital_id))
+        await pipe.execute()
+    return matcher.match(lat, lon, symptom)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="병원 가용 현황 갱신과 조회 처리량")
+    parser.add_argument("--hospitals", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument(
+        "--batch", type=int, default=100, help="파이프라인 한 번에 보낼 갱신 수"
+    )
+    parser.add_argument("--watchers", type=int, default=200, help="구급차 연결 수")
+    parser.add_argument(
+        "--dashboards", type=int, default=10, help="전체 병원을 받는 대시보드 연결 수"
+    )
+    parser.add_argument("--matches", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    client = connect()
+    await client.flushdb()
+    index = HospitalIndex()
+    specialties = list(SPECIALTY_BITS)
+    for hospital_id in range(1, args.hospitals + 1):
+        index.upsert(
+            hospital_id,
+            *random_point(rng),
+            specialties=sum(rng.sample(list(SPECIALTY_BITS.values()), 6)),
+            beds=rng.randint(10, 40),
+            name=f"병원{hospital_id}",
+            address="서울특별시",
+        )
+    manager = ConnectionManager(max_queue=100000)
+    board = CapacityBoard(index, block=0.01)
+    await board.start(client, manager)
+    matcher = HospitalMatcher(index)
+    # 구급차는 매칭 반경 안의 병원만, 대시보드는 capacity=all 로 전체를 받는다
+    sockets = {
+        **{
+            f"ambulance:{number}": CountingWebSocket()
+            for number in range(args.watchers)
+        },
+        **{
+            f"dashboard:{number}": CountingWebSocket()
+            for number in range(args.dashboards)
+        },
+    }
+    followed = 0
+    for key, websocket in sockets.items():
+        await manager.connect(key, websocket)
+        if key.startswith("dashboard:"):
+            board.watch(key)
+            continue
+        nearby = [
+            hospital_id
+            for hospital_id, _ in index.radius(*random_point(rng), matcher.radius)
+        ]
+        followed += len(nearby)
+        board.watch(key, nearby)
+    await asyncio.sleep(0.1)
+    initial = {key: websocket.frames for key, websocket in sockets.items()}
+
+    # 입퇴원과 당직 변경이 섞인 갱신, 빈 병원의 퇴원처럼 바뀌지 않는 보고도 섞인다
+    started = time.perf_counter()
+    unchanged = 0
+    for offset in range(0, args.updates, args.batch):
+        async with client.pipeline(transaction=False) as pipe:
+            for _ in range(min(args.batch, args.updates - offset)):
+                hospital_id = rng.randint(1, args.hospitals)
+                if rng.random() < 0.8:
+                    deltas = {"occupied": rng.choice((1, -1))}
+                else:
+                    deltas = {rng.choice(specialties): rng.choice((1, -1))}
+                await board.update(hospital_id, deltas=deltas, client=pipe)
+            unchanged += sum(1 for seq in await pipe.execute() if not seq)
+        await asyncio.sleep(0)
+    update_elapsed = time.perf_counter() - started
+    latest = int(await client.get(board.seq_key) or 0)
+    while board.seq < latest:
+        await asyncio.sleep(0.005)
+    mirror_elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.1)
+    pushed = {"ambulance": 0, "dashboard": 0}
+    for key, websocket in sockets.items():
+        pushed[key.split(":")[0]] += websocket.frames - initial[key]
+
+    symptoms = list(SYMPTOM_KEYWORDS)
+    calls = [(*random_point(rng), rng.choice(symptoms)) for _ in range(args.matches)]
+    started = time.perf_counter()
+    for lat, lon, symptom in calls:
+        await per_hospital_match(client, board, matcher, lat, lon, symptom)
+    per_hospital_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    for lat, lon, symptom in calls:
+        matcher.match(lat, lon, symptom)
+    mirrored_elapsed = time.perf_counter() - started
+
+    print(
+        json.dumps(
+            {
+                "hospitals": args.hospitals,
+                "watchers": args.watchers,
+                "dashboards": args.dashboards,
+                "hospitals_per_watcher": round(followed / max(args.watchers, 1), 1),
+                "updates": args.updates,
+                "updates_per_second": round(args.updates / update_elapsed),
+                "unchanged": unchanged,
+                "mirror_caught_up_ms": round(mirror_elapsed * 1000, 1),
+                "frames_per_watcher": round(
+                    pushed["ambulance"] / max(args.watchers, 1), 1
+                ),
+                "frames_per_dashboard": round(
+                    pushed["dashboard"] / max(args.dashboards, 1), 1
+                ),
+                "matches": args.matches,
+                "per_hospital_read_matches_per_second": round(
+                    args.matches / per_hospital_elapsed
+                ),
+                "mirrored_matches_per_second": round(args.matches / mirrored_elapsed),
+                "stats": board.stats(),
+            },
+            indent=2,
+        )
+    )
+    for key, websocket in sockets.items():
+        board.unwatch(key)
+        await manager.disconnect(key, websocket)
+    await board.stop()
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+import json
+import argparse
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="두 부하 테스트 결과 비교")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)["results"]
+    with open(args.after) as file:
+        after = json.load(file)["results"]
+
+    for scenario, result in after.items():
+        if scenario not in before or "p50_ms" not in result:
+            continue
+        print(scenario)
+        for metric in METRICS:
+            old, new = before[scenario].get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {metric:<16}{old:>12}{new:>12}{change:>10}")
+        old_lag = before[scenario].get("event_loop_lag", {}).get("p99_ms")
+        new_lag = result.get("event_loop_lag", {}).get("p99_ms")
+        if old_lag is not None and new_lag is not None:
+            print(f"  {'loop_lag_p99_ms':<16}{old_lag:>12.3f}{new_lag:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
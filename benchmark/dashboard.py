@@ -0,0 +1,132 @@
+import time
+import json
+import uuid
+import random
+import asyncio
+import argparse
+
+from app.connection import ConnectionManager
+from app.dashboard import DashboardFeed, DashboardFilter
+from app.protocol import JSONCodec
+from app.tourstore import tour_store
+from benchmark.redis_client import connect
+from benchmark.tour_store import sample_tour
+from interface.emergency import EmergencyTourOPCode
+
+
+class CountingWebSocket:
+    # 실제 전송 대신 보낸 바이트 수만 센다
+    def __init__(self):
+        self.bytes = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, payload: str):
+        self.bytes += len(payload)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def drain(manager: ConnectionManager):
+    while any(connection.queue for connection in manager.active_connections.values()):
+        await asyncio.sleep(0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="대시보드 전체 갱신과 증분 전송 비교")
+    parser.add_argument("--tours", type=int, default=1000)
+    parser.add_argument("--dashboards", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=100, help="틱당 변경 수")
+    parser.add_argument("--ticks", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(0)
+    client = connect()
+    await client.flushdb()
+    tour_store.start(client)
+    user_ids = [str(uuid.uuid4()) for _ in range(args.tours)]
+    for index, user_id in enumerate(user_ids):
+        await tour_store.create(user_id, sample_tour(index))
+
+    # 대시보드마다 매 틱 전체 목록을 다시 읽어 보내는 방식
+    sockets = [CountingWebSocket() for _ in range(args.dashboards)]
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        for websocket in sockets:
+            tours = await tour_store.get_many(user_ids)
+            await websocket.send_text(
+                JSONCodec.encode(
+                    EmergencyTourOPCode.SNAPSHOT.value,
+                    {"tours": [{"user_id": k, **v} for k, v in tours.items()]},
+                )
+            )
+    full_elapsed = time.perf_counter() - started
+    full_bytes = sum(websocket.bytes for websocket in sockets)
+
+    # 스냅샷 한 번 뒤 변경만 보내는 방식
+    manager = ConnectionManager(max_queue=100000)
+    feed = DashboardFeed(page_size=200, block=0.001)
+    feed.start(client, manager)
+    sockets = [CountingWebSocket() for _ in range(args.dashboards)]
+    for index, websocket in enumerate(sockets):
+        await manager.connect(f"dashboard:{index}", websocket)
+        await feed.attach(f"dashboard:{index}", DashboardFilter())
+    await drain(manager)
+    snapshot_bytes = sum(websocket.bytes for websocket in sockets)
+    snapshot_encodes = feed.encoded
+
+    started = time.perf_counter()
+    for tick in range(args.ticks):
+        for user_id in random.sample(user_ids, args.changes):
+            await feed.record(
+                EmergencyTourOPCode.UPDATE_LOCATION.value,
+                user_id,
+                {
+                    "current_location": f"127.{tick:04d},37.5665",
+                    "remain_distance": 4200 - tick,
+                    "eta": None,
+                    "status": 1,
+                },
+            )
+        while feed.received < feed.recorded:
+            await asyncio.sleep(0)
+        await drain(manager)
+    delta_elapsed = time.perf_counter() - started
+    delta_bytes = sum(websocket.bytes for websocket in sockets) - snapshot_bytes
+
+    await feed.stop()
+    for index in range(args.dashboards):
+        manager.active_connections[f"dashboard:{index}"].stop()
+    print(
+        json.dumps(
+            {
+                "tours": args.tours,
+                "dashboards": args.dashboards,
+                "changes_per_tick": args.changes,
+                "full_ms_per_tick": round(full_elapsed / args.ticks * 1000, 2),
+                "full_kb_per_dashboard_tick": round(
+                    full_bytes / args.ticks / args.dashboards / 1024, 2
+                ),
+                "snapshot_kb_per_dashboard": round(
+                    snapshot_bytes / args.dashboards / 1024, 2
+                ),
+                "delta_ms_per_tick": round(delta_elapsed / args.ticks * 1000, 2),
+                "delta_kb_per_dashboard_tick": round(
+                    delta_bytes / args.ticks / args.dashboards / 1024, 2
+                ),
+                "encodes_per_change": round(
+                    (feed.encoded - snapshot_encodes) / (args.ticks * args.changes),
+                    2,
+                ),
+            },
+            indent=2,
+        )
+    )
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
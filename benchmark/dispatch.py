@@ -0,0 +1,197 @@
+import time
+import json
+import uuid
+import random
+import asyncio
+import argparse
+from json import loads
+
+import numpy as np
+
+from app.capacity import capacity_board
+from app.connection import ConnectionManager
+from app.dashboard import dashboard_feed
+from app.dispatch import HospitalDispatcher
+from app.fanout import fanout_hub
+from app.matching import HospitalMatcher
+from app.resume import frame_log
+from app.spatial import HospitalIndex
+from app.specialty import EMERGENCY
+from app.tourstore import tour_store
+from benchmark.redis_client import connect
+from benchmark.tour_store import sample_tour
+from interface.emergency import EmergencyTourOPCode
+
+
+class FakeHospitals:
+    # 요청을 받은 병원이 잠시 뒤 수락하거나 거절하고, 일부는 끝까지 답하지 않는다
+    def __init__(self, dispatcher: HospitalDispatcher, args):
+        self.dispatcher = dispatcher
+        self.args = args
+        self.started: dict[str, float] = {}
+        self.matched: dict[str, float] = {}
+        self.pending: dict[tuple[str, int], asyncio.Task] = {}
+        self.offers = 0
+        self.cancelled = 0
+
+    def decision(self, user_id: str, hospital_id: int) -> tuple[bool, bool, float]:
+        # 두 방식이 같은 병원 반응을 겪도록 투어와 병원 쌍마다 고정한다
+        rng = random.Random(f"{user_id}:{hospital_id}")
+        responds = rng.random() < self.args.respond
+        accepts = rng.random() < self.args.accept
+        delay = rng.lognormvariate(np.log(self.args.response_median), 0.6)
+        return responds, accepts, delay
+
+    async def respond(self, user_id: str, dispatch_id: str, hospital_id: int):
+        responds, accepts, delay = self.decision(user_id, hospital_id)
+        if not responds:
+            return
+        await asyncio.sleep(delay * self.args.scale)
+        self.pending.pop((user_id, hospital_id), None)
+        if not accepts:
+            await self.dispatcher.decline(user_id, dispatch_id, hospital_id)
+        elif await self.dispatcher.accept(user_id, dispatch_id, hospital_id):
+            self.matched[user_id] = time.monotonic() - self.started[user_id]
+
+    async def deliver(self, topic: str, payload: str) -> int:
+        kind, _, hospital_id = topic.partition(":")
+        if kind != "hospital":
+            return 0
+        hospital_id = int(hospital_id)
+        message = loads(payload)
+        data = message["data"]
+        key = (data["user_id"], hospital_id)
+        if message["op"] == EmergencyTourOPCode.OFFER.value:
+            self.offers += 1
+            self.pending[key] = asyncio.create_task(
+                self.respond(data["user_id"], data["dispatch_id"], hospital_id)
+            )
+        elif message["op"] == EmergencyTourOPCode.CANCEL_OFFER.value:
+            task = self.pending.pop(key, None)
+            if task is not None:
+                task.cancel()
+                self.cancelled += 1
+        return 1
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+async def run(
+    client, index: HospitalIndex, user_ids: list[str], args, wave_size, timeouts
+):
+    await client.flushdb()
+    for number, user_id in enumerate(user_ids):
+        await tour_store.create(user_id, sample_tour(number))
+
+    dispatcher = HospitalDispatcher(
+        HospitalMatcher(index),
+        wave_size=wave_size,
+        max_waves=args.candidates // wave_size,
+        wave_timeouts=tuple(timeout * args.scale for timeout in timeouts),
+    )
+    dispatcher.start(client)
+    hospitals = FakeHospitals(dispatcher, args)
+    fanout_hub.start(client, hospitals.deliver)
+    await asyncio.sleep(0.05)
+
+    rng = random.Random(0)
+    for user_id in user_ids:
+        hospitals.started[user_id] = time.monotonic()
+        await dispatcher.dispatch(
+            user_id,
+            37.5665 + rng.uniform(-0.05, 0.05),
+            126.978 + rng.uniform(-0.05, 0.05),
+            "흉통",
+            "환자",
+        )
+        await asyncio.sleep(args.interval * args.scale)
+    while dispatcher.matched + dispatcher.exhausted < dispatcher.started:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(args.response_median * args.scale * 3)
+
+    await fanout_hub.stop()
+    await dispatcher.stop()
+    for task in hospitals.pending.values():
+        task.cancel()
+    seconds = [elapsed / args.scale for elapsed in hospitals.matched.values()]
+    return {
+        "wave_size": wave_size,
+        "wave_timeouts": list(timeouts),
+        "matched": dispatcher.matched,
+        "exhausted": dispatcher.exhausted,
+        "match_p50_s": percentile(seconds, 50),
+        "match_p90_s": percentile(seconds, 90),
+        "match_p99_s": percentile(seconds, 99),
+        "offers_per_tour": round(hospitals.offers / len(user_ids), 2),
+        "late_accepts": dispatcher.lost,
+        "cancelled_offers": hospitals.cancelled,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="병원 순차 요청과 동시 요청의 배정 시간 비교"
+    )
+    parser.add_argument("--tours", type=int, default=200)
+    parser.add_argument("--hospitals", type=int, default=60)
+    parser.add_argument("--candidates", type=int, default=9)
+    parser.add_argument("--wave-size", type=int, default=3)
+    parser.add_argument(
+        "--timeouts", default="10,15,20", help="초 단위, 차수별 대기 시간"
+    )
+    parser.add_argument("--respond", type=float, default=0.7, help="응답하는 병원 비율")
+    parser.add_argument("--accept", type=float, default=0.4, help="응답 중 수락 비율")
+    parser.add_argument("--response-median", type=float, default=6.0, help="초 단위")
+    parser.add_argument("--interval", type=float, default=1.0, help="초 단위 호출 간격")
+    parser.add_argument(
+        "--scale", type=float, default=0.01, help="모의 1초를 실제로 몇 초로 줄일지"
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    index = HospitalIndex()
+    for hospital_id in range(1, args.hospitals + 1):
+        index.upsert(
+            hospital_id,
+            37.5665 + random.uniform(-0.1, 0.1),
+            126.978 + random.uniform(-0.1, 0.1),
+            # 의료진 정보가 없는 병원은 응급의학과만 있는 것으로 본다 (staff_mask 와 같다)
+            specialties=EMERGENCY,
+            name=f"병원{hospital_id}",
+            address="서울특별시",
+        )
+    timeouts = tuple(float(value) for value in args.timeouts.split(","))
+    user_ids = [str(uuid.uuid4()) for _ in range(args.tours)]
+
+    client = connect()
+    tour_store.start(client)
+    dashboard_feed.start(client, ConnectionManager())
+    frame_log.start(client, ConnectionManager())
+    await capacity_board.start(client, ConnectionManager())
+    # 한 곳씩 묻고 답이 없으면 마감까지 기다리는 방식과 여러 곳에 한꺼번에 묻는 방식
+    sequential = await run(client, index, user_ids, args, 1, timeouts[:1])
+    concurrent = await run(client, index, user_ids, args, args.wave_size, timeouts)
+    print(
+        json.dumps(
+            {
+                "tours": args.tours,
+                "candidates": args.candidates,
+                "respond": args.respond,
+                "accept": args.accept,
+                "sequential": sequential,
+                "concurrent": concurrent,
+            },
+            indent=2,
+        )
+    )
+    await capacity_board.stop()
+    await dashboard_feed.stop()
+    frame_log.stop()
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import gc
+import time
+import json
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+from starlette.websockets import WebSocketState
+
+from app.connection import ConnectionManager
+from app.heartbeat import HeartbeatWheel
+from interface.emergency import EmergencyTourOPCode
+
+
+class IdleWebSocket:
+    client_state = WebSocketState.DISCONNECTED
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, payload: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def traced(function) -> tuple[object, int]:
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+async def per_connection_tasks(count: int, interval: float) -> int:
+    # 연결마다 잠들었다 깨는 태스크를 두는 방식의 메모리 사용량
+    last_seen = {index: 0.0 for index in range(count)}
+
+    async def watch(index: int):
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - last_seen[index] > interval:
+                pass
+
+    tasks, allocated = traced(
+        lambda: [asyncio.create_task(watch(index)) for index in range(count)]
+    )
+    await asyncio.sleep(0)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return allocated
+
+
+def broadcast_us(manager: ConnectionManager, rounds: int = 20) -> float:
+    data = {"op": EmergencyTourOPCode.HELLO.value, "data": None}
+    started = time.perf_counter()
+    for _ in range(rounds):
+        manager.broadcast(data)
+    elapsed = time.perf_counter() - started
+    for connection in manager.active_connections.values():
+        connection.queue.clear()
+    return elapsed / rounds * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="유휴 웹소켓 하트비트 비용 측정")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--dead", type=float, default=0.3, help="응답 없는 연결 비율")
+    parser.add_argument("--interval", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seconds", type=int, default=90, help="모의 경과 시간")
+    args = parser.parse_args()
+
+    random.seed(0)
+    tracemalloc.start()
+    manager = ConnectionManager(max_queue=1024)
+    wheel = HeartbeatWheel(interval=args.interval, timeout=args.timeout, tick=1.0)
+    wheel.started = wheel.now = 0.0
+    manager.heartbeat = wheel
+    keys = [f"pi:{index}" for index in range(args.connections)]
+
+    async def connect_all():
+        for key in keys:
+            await manager.connect(key, IdleWebSocket())
+
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    await connect_all()
+    gc.collect()
+    connection_bytes = (tracemalloc.get_traced_memory()[0] - before) / len(keys)
+    entry_bytes = traced(
+        lambda: [wheel.entries[key].__class__(key, 0.0) for key in keys]
+    )[1] / len(keys)
+    task_bytes = await per_connection_tasks(args.connections, args.interval) / len(keys)
+    tracemalloc.stop()
+
+    # 살아 있는 연결은 초마다 10%씩 프레임을 보내고, 죽은 연결은 아무것도 보내지 않는다
+    dead = set(random.sample(keys, int(len(keys) * args.dead)))
+    alive = [key for key in keys if key not in dead]
+    before_reap = broadcast_us(manager)
+    tick_times = []
+    for second in range(1, args.seconds + 1):
+        for key in random.sample(alive, len(alive) // 10):
+            wheel.touch(key)
+        started = time.perf_counter()
+        ping, reap = wheel.advance(float(second))
+        manager.ping(ping)
+        manager.reap(reap)
+        tick_times.append(time.perf_counter() - started)
+        wheel.pings += len(ping)
+        wheel.reaped += len(reap)
+        for key in ping:
+            manager.active_connections[key].queue.clear()
+            if key not in dead:
+                wheel.touch(key)  # 살아 있는 연결은 핑에 바로 답한다
+        await asyncio.sleep(0)
+    after_reap = broadcast_us(manager)
+
+    tick_times.sort()
+    print(
+        json.dumps(
+            {
+                "connections": args.connections,
+                "dead": len(dead),
+                "bytes_per_connection": round(connection_bytes),
+                "heartbeat_entry_bytes": round(entry_bytes),
+                "per_connection_task_bytes": round(task_bytes),
+                "tick_avg_us": round(sum(tick_times) / len(tick_times) * 1e6, 1),
+                "tick_max_us": round(tick_times[-1] * 1e6, 1),
+                "pings": wheel.pings,
+                "reaped": wheel.reaped,
+                "remaining": len(manager.active_connections),
+                "broadcast_before_reap_us": round(before_reap, 1),
+                "broadcast_after_reap_us": round(after_reap, 1),
+            },
+            indent=2,
+        )
+    )
+    for connection in manager.active_connections.values():
+        connection.stop()
+    await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import time
+import json
+import random
+import argparse
+
+import numpy as np
+
+from app.spatial import HospitalIndex, haversine
+
+
+def timed(func, queries) -> float:
+    started = time.perf_counter()
+    for lat, lon in queries:
+        func(lat, lon)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="병원 공간 인덱스 조회 시간 측정")
+    parser.add_argument("--hospitals", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    index = HospitalIndex()
+    lats = np.empty(args.hospitals)
+    lons = np.empty(args.hospitals)
+    for hospital_id in range(args.hospitals):
+        lats[hospital_id] = random.uniform(33.0, 38.5)
+        lons[hospital_id] = random.uniform(125.0, 130.0)
+        index.upsert(hospital_id, lats[hospital_id], lons[hospital_id])
+
+    queries = [
+        (random.uniform(33.0, 38.5), random.uniform(125.0, 130.0))
+        for _ in range(args.queries)
+    ]
+
+    def full_scan(lat, lon):
+        return np.argsort(haversine(lat, lon, lats, lons))[:5]
+
+    print(
+        json.dumps(
+            {
+                "hospitals": args.hospitals,
+                "nearest_k5_us": round(
+                    timed(lambda a, b: index.nearest(a, b, k=5), queries), 2
+                ),
+                "radius_20km_us": round(
+                    timed(lambda a, b: index.radius(a, b, 20000), queries), 2
+                ),
+                "full_scan_k5_us": round(timed(full_scan, queries), 2),
+                "upsert_us": round(
+                    timed(lambda a, b: index.upsert(0, a, b), queries), 2
+                ),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+import websockets
+
+from benchmark.serve import BENCH_PASSWORD, bench_email, free_port
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def percentile(ratio: float) -> float | None:
+        if not count:
+            return None
+        return round(latencies[min(count - 1, int(count * ratio))] * 1000, 3)
+
+    return {
+        "requests": count + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+async def run_concurrently(jobs, concurrency: int) -> tuple[list[float], int, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def run(job):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await job()
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(job) for job in jobs))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def login_storm(client: httpx.AsyncClient, users: int, concurrency: int):
+    tokens: dict[int, str] = {}
+
+    def login(index: int):
+        async def job():
+            response = await client.post(
+                "/user/login",
+                json={"email": bench_email(index), "password": BENCH_PASSWORD},
+            )
+            response.raise_for_status()
+            tokens[index] = response.json()["data"]["token"]
+
+        return job
+
+    result = await run_concurrently([login(i) for i in range(users)], concurrency)
+    return tokens, result
+
+
+async def new_tour_burst(
+    client: httpx.AsyncClient, tokens: dict[int, str], concurrency: int
+):
+    def new_tour(token: str):
+        async def job():
+            response = await client.post(
+                "/emergency/new",
+                headers={"Authorization": f"Bearer {token}"},
+                json={
+                    "name": "벤치마크 환자",
+                    "symptom": "흉통",
+                    "location_x": "127.0276",
+                    "location_y": "37.4979",
+                },
+            )
+            response.raise_for_status()
+
+        return job
+
+    return await run_concurrently(
+        [new_tour(token) for token in tokens.values()], concurrency
+    )
+
+
+async def live_sockets(
+    base_url: str, tokens: dict[int, str], location_frames: int, interval: float
+):
+    hello_latencies: list[float] = []
+    errors = 0
+    frames_sent = 0
+
+    async def ambulance(token: str, index: int):
+        nonlocal errors, frames_sent
+        try:
+            async with websockets.connect(
+                f"{base_url}/emergency/live?token={token}", open_timeout=60
+            ) as websocket:
+                started = time.perf_counter()
+                await websocket.send(json.dumps({"op": 1, "data": None}))
+                while json.loads(await websocket.recv())["op"] != 1:
+                    pass
+                hello_latencies.append(time.perf_counter() - started)
+                for step in range(location_frames):
+                    await websocket.send(
+                        json.dumps(
+                            {
+                                "op": 3,
+                                "data": {
+                                    "location_x": 127.0276 + step * 1e-4,
+                                    "location_y": 37.4979 + index * 1e-5,
+                                },
+                            }
+                        )
+                    )
+                    frames_sent += 1
+                    await asyncio.sleep(interval)
+        except Exception:
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(ambulance(token, index) for index, token in enumerate(tokens.values()))
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        **summarize(hello_latencies, errors, elapsed),
+        "location_frames": frames_sent,
+        "frames_per_s": round(frames_sent / elapsed, 1),
+    }
+
+
+async def server_lag(client: httpx.AsyncClient) -> dict:
+    return (await client.post("/bench/lag")).json()
+
+
+async def run_suite(args, base_url: str) -> dict:
+    results: dict = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120
+    ) as client:
+        await server_lag(client)
+
+        tokens, login_result = await login_storm(client, args.users, args.concurrency)
+        results["login_storm"] = {
+            **summarize(*login_result),
+            "event_loop_lag": await server_lag(client),
+        }
+
+        results["emergency_new_burst"] = {
+            **summarize(*await new_tour_burst(client, tokens, args.concurrency)),
+            "event_loop_lag": await server_lag(client),
+        }
+
+        ws_url = base_url.replace("http://", "ws://")
+        results["live_websockets"] = {
+            **await live_sockets(ws_url, tokens, args.location_frames, args.interval),
+            "event_loop_lag": await server_lag(client),
+        }
+        results["server_stats"] = (await client.get("/stats")).json()["data"]
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Aidnet 부하 테스트")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--location-frames", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--output", default=None)
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="이미 실행 중인 서버 주소 (지정하지 않으면 직접 띄운다)",
+    )
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmark.serve",
+                "--port",
+                str(port),
+                "--users",
+                str(args.users),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        if server.stdout.readline().strip() != "READY":
+            server.terminate()
+            raise SystemExit("benchmark server failed to start")
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        results = await run_suite(args, base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "benchmark",
+        "results",
+        datetime.now().strftime("%Y%m%d-%H%M%S") + ".json",
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(json.dumps(report["results"], indent=2, ensure_ascii=False))
+    print(f"saved to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
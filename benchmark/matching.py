@@ -0,0 +1,107 @@
+import math
+import time
+import json
+import random
+import argparse
+
+from app.matching import HospitalMatcher
+from app.spatial import HospitalIndex, EARTH_RADIUS_M
+from app.specialty import EMERGENCY, SPECIALTY_BITS, SYMPTOM_KEYWORDS, symptom_mask
+
+
+def naive_match(hospitals: list[dict], lat: float, lon: float, symptom: str, k: int):
+    # 병원마다 파이썬 반복으로 거리/진료과/병상 점수를 계산하는 기준 구현
+    need = symptom_mask(symptom)
+    need_count = bin(need).count("1")
+    lat1 = math.radians(lat)
+    scored = []
+    for hospital in hospitals:
+        lat2 = math.radians(hospital["lat"])
+        a = (
+            math.sin((lat2 - lat1) / 2) ** 2
+            + math.cos(lat1)
+            * math.cos(lat2)
+            * math.sin(math.radians(hospital["lon"] - lon) / 2) ** 2
+        )
+        distance = 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+        occupancy = hospital["load"] / hospital["beds"]
+        if distance > 20000 or occupancy >= 1.0:
+            continue
+        if not hospital["specialties"] & (need | EMERGENCY):
+            continue
+        coverage = bin(hospital["specialties"] & need).count("1") / need_count
+        score = 0.5 * distance / 20000 + 0.35 * (1 - coverage) + 0.15 * occupancy
+        scored.append((score, hospital["id"]))
+    scored.sort()
+    return [hospital_id for _, hospital_id in scored[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="병원 매칭 엔진 처리량 비교")
+    parser.add_argument("--hospitals", type=int, default=5000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    bits = list(SPECIALTY_BITS.values())
+    hospitals = []
+    index = HospitalIndex()
+    for hospital_id in range(args.hospitals):
+        hospital = {
+            "id": hospital_id,
+            # 수도권에 몰려 있는 실제 분포를 흉내 낸다
+            "lat": random.gauss(37.5, 0.3),
+            "lon": random.gauss(127.0, 0.3),
+            "specialties": sum(random.sample(bits, random.randint(1, 8))),
+            "beds": random.randint(5, 40),
+        }
+        hospital["load"] = random.randint(0, hospital["beds"])
+        hospitals.append(hospital)
+        index.upsert(
+            hospital_id,
+            hospital["lat"],
+            hospital["lon"],
+            specialties=hospital["specialties"],
+            beds=hospital["beds"],
+        )
+        index.set_load(hospital_id, hospital["load"])
+    matcher = HospitalMatcher(index)
+
+    symptoms = list(SYMPTOM_KEYWORDS) + ["원인 불명"]
+    calls = [
+        (random.gauss(37.5, 0.3), random.gauss(127.0, 0.3), random.choice(symptoms))
+        for _ in range(args.calls)
+    ]
+
+    started = time.perf_counter()
+    naive = [
+        naive_match(hospitals, lat, lon, symptom, 5) for lat, lon, symptom in calls
+    ]
+    naive_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = [
+        [match.hospital_id for match in matcher.match(lat, lon, symptom, 5)]
+        for lat, lon, symptom in calls
+    ]
+    vectorized_elapsed = time.perf_counter() - started
+
+    agree = sum(a[:1] == b[:1] for a, b in zip(naive, vectorized)) / len(calls)
+    print(
+        json.dumps(
+            {
+                "hospitals": args.hospitals,
+                "calls": args.calls,
+                "naive_us": round(naive_elapsed / len(calls) * 1e6, 2),
+                "vectorized_us": round(vectorized_elapsed / len(calls) * 1e6, 2),
+                "vectorized_calls_per_s": round(len(calls) / vectorized_elapsed),
+                "avg_candidates": round(matcher.stats()["avg_candidates"], 1),
+                "top1_agreement": round(agree, 4),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
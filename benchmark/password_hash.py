@@ -0,0 +1,60 @@
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+from app.hashing import PasswordHasher
+
+
+async def probe_lag(stop: asyncio.Event, interval: float, samples: list[float]):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - started - interval) * 1000)
+
+
+async def run(use_executor: bool, logins: int, workers: int) -> dict:
+    hasher = PasswordHasher(max_workers=workers, max_pending=logins)
+    hashed = hasher.password_context.hash("password")
+    if use_executor:
+        hasher.start()
+
+    stop = asyncio.Event()
+    samples: list[float] = []
+    probe = asyncio.create_task(probe_lag(stop, 0.005, samples))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    await hasher.stop()
+    samples.sort()
+    return {
+        "executor": use_executor,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(samples), 2),
+        "lag_p99_ms": round(samples[int(len(samples) * 0.99) - 1], 2),
+        "lag_max_ms": round(samples[-1], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="bcrypt 이벤트 루프 지연 측정")
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    results = [
+        await run(False, args.logins, args.workers),
+        await run(True, args.logins, args.workers),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+import json
+import timeit
+import argparse
+
+from app.protocol import JSONCodec, BinaryCodec
+from interface.emergency import EmergencyTourOPCode
+
+FRAMES = {
+    "client_location": (
+        EmergencyTourOPCode.UPDATE_LOCATION.value,
+        {"location_x": 127.0276368, "location_y": 37.4979502},
+    ),
+    "server_location": (
+        EmergencyTourOPCode.UPDATE_LOCATION.value,
+        {
+            "user_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+            "current_location": "127.0276368,37.4979502",
+            "remain_distance": 4213,
+            "eta": 512,
+        },
+    ),
+    "status": (
+        EmergencyTourOPCode.UPDATE_STATUS.value,
+        {"status": 1, "remain_distance": 4213},
+    ),
+    "hello": (EmergencyTourOPCode.HELLO.value, None),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="JSON / 바이너리 프레임 크기와 속도 비교"
+    )
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, (op, data) in FRAMES.items():
+        for codec in (JSONCodec, BinaryCodec):
+            encoded = codec.encode(op, data)
+            encode_time = timeit.timeit(
+                lambda: codec.encode(op, data), number=args.number
+            )
+            decode_time = timeit.timeit(
+                lambda: codec.decode(encoded), number=args.number
+            )
+            results[f"{name}/{codec.subprotocol}"] = {
+                "bytes": len(encoded),
+                "encode_ns": round(encode_time / args.number * 1e9),
+                "decode_ns": round(decode_time / args.number * 1e9),
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
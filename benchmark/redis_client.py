@@ -0,0 +1,14 @@
+import os
+
+import redis.asyncio as redis
+
+
+def connect() -> redis.Redis:
+    # REDIS_HOST 가 없으면 fakeredis 로 대신 측정한다 (절대값보다 상대 비교용)
+    if os.getenv("REDIS_HOST"):
+        return redis.Redis(
+            host=os.environ["REDIS_HOST"], port=int(os.getenv("REDIS_PORT", "6379"))
+        )
+    from fakeredis.aioredis import FakeRedis
+
+    return FakeRedis()
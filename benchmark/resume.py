@@ -0,0 +1,146 @@
+import time
+import json
+import uuid
+import asyncio
+import argparse
+
+from starlette.websockets import WebSocketState
+
+from app.connection import ConnectionManager
+from app.protocol import BinaryCodec, JSONCodec
+from app.resume import frame_log
+from app.tourstore import tour_store
+from benchmark.redis_client import connect
+from benchmark.tour_store import sample_tour
+from interface.emergency import EmergencyTourOPCode
+
+
+class CountingWebSocket:
+    # 실제 전송 대신 보낸 바이트 수만 센다
+    client_state = WebSocketState.DISCONNECTED
+
+    def __init__(self):
+        self.bytes = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, payload: str):
+        self.bytes += len(payload.encode())
+
+    async def send_bytes(self, payload: bytes):
+        self.bytes += len(payload)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def drain(manager: ConnectionManager):
+    while any(connection.queue for connection in manager.active_connections.values()):
+        await asyncio.sleep(0)
+
+
+async def publish_gap(client, user_ids: list[str], frames: int, tick: int):
+    # 끊겨 있는 동안 구급차 위치가 계속 갱신되고, 일부 투어는 병원이 배정된다
+    async with client.pipeline(transaction=False) as pipe:
+        for index, user_id in enumerate(user_ids):
+            for frame in range(frames):
+                await frame_log.publish(
+                    user_id,
+                    EmergencyTourOPCode.UPDATE_LOCATION.value,
+                    {
+                        "user_id": user_id,
+                        "current_location": f"127.{tick:02d}{frame:02d},37.5665",
+                        "remain_distance": 4200 - frame * 10,
+                        "eta": 600 - frame,
+                    },
+                    client=pipe,
+                )
+            if index % 10 == 0:
+                await frame_log.publish(
+                    user_id,
+                    EmergencyTourOPCode.UPDATE_DATA.value,
+                    {
+                        "user_id": user_id,
+                        "hospital": sample_tour(index).hospital.model_dump(),
+                    },
+                    client=pipe,
+                )
+        await pipe.execute()
+
+
+async def reconnect_storm(
+    manager: ConnectionManager, user_ids: list[str], codec, seqs: dict | None
+) -> dict:
+    sockets = {user_id: CountingWebSocket() for user_id in user_ids}
+    for user_id, websocket in sockets.items():
+        await manager.connect(user_id, websocket, codec=codec)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            frame_log.resume(user_id, None if seqs is None else seqs[user_id])
+            for user_id in user_ids
+        )
+    )
+    await drain(manager)
+    elapsed = time.perf_counter() - started
+    for user_id, websocket in sockets.items():
+        await manager.disconnect(user_id, websocket)
+    total = sum(websocket.bytes for websocket in sockets.values())
+    return {
+        "total_kb": round(total / 1024, 1),
+        "bytes_per_client": round(total / len(user_ids), 1),
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="재접속 폭주 시 스냅샷과 이어 받기 비교"
+    )
+    parser.add_argument("--tours", type=int, default=1000)
+    parser.add_argument(
+        "--gap-frames", type=int, default=10, help="끊긴 동안 쌓인 위치 프레임 수"
+    )
+    args = parser.parse_args()
+
+    client = connect()
+    await client.flushdb()
+    tour_store.start(client)
+    manager = ConnectionManager(max_queue=100000)
+    frame_log.start(client, manager)
+    user_ids = [str(uuid.uuid4()) for _ in range(args.tours)]
+    for index, user_id in enumerate(user_ids):
+        await tour_store.create(user_id, sample_tour(index))
+
+    results = {}
+    for tick, codec in enumerate((JSONCodec, BinaryCodec)):
+        await publish_gap(client, user_ids, 1, tick)
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.get(frame_log.seq_key(user_id))
+            seqs = dict(zip(user_ids, map(int, await pipe.execute())))
+        await publish_gap(client, user_ids, args.gap_frames, tick)
+        results[codec.subprotocol] = {
+            "snapshot": await reconnect_storm(manager, user_ids, codec, None),
+            "resume": await reconnect_storm(manager, user_ids, codec, seqs),
+        }
+
+    print(
+        json.dumps(
+            {
+                "tours": args.tours,
+                "gap_frames": args.gap_frames,
+                **results,
+                "stats": frame_log.stats(),
+            },
+            indent=2,
+        )
+    )
+    frame_log.stop()
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
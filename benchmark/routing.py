@@ -0,0 +1,115 @@
+import os
+import csv
+import time
+import json
+import random
+import argparse
+import tempfile
+
+from app.routing import RoadGraph, RoadRouter
+
+
+def write_grid(directory: str, size: int, spacing: float = 0.002):
+    # 격자 도로망에 약간의 흔들림을 주고 일부 도로를 끊어 실제 도로처럼 만든다
+    with open(os.path.join(directory, "nodes.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("id", "latitude", "longitude"))
+        for row in range(size):
+            for column in range(size):
+                writer.writerow(
+                    (
+                        row * size + column,
+                        37.4 + row * spacing + random.uniform(-3e-4, 3e-4),
+                        126.9 + column * spacing + random.uniform(-3e-4, 3e-4),
+                    )
+                )
+    with open(os.path.join(directory, "edges.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("source", "target", "speed", "oneway"))
+        for row in range(size):
+            for column in range(size):
+                node = row * size + column
+                for neighbor in (
+                    node + 1 if column + 1 < size else None,
+                    node + size if row + 1 < size else None,
+                ):
+                    if neighbor is not None and random.random() > 0.05:
+                        writer.writerow(
+                            (node, neighbor, random.choice((30, 50, 60)), 0)
+                        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="도로 그래프 경로 탐색 성능 측정")
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--routes", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    result: dict = {"nodes": args.size * args.size}
+    with tempfile.TemporaryDirectory() as directory:
+        write_grid(directory, args.size)
+        started = time.perf_counter()
+        graph = RoadGraph.load(directory)
+        result["load_csv_s"] = round(time.perf_counter() - started, 3)
+
+        path = os.path.join(directory, "graph.npz")
+        graph.save(path)
+        started = time.perf_counter()
+        graph = RoadGraph.load(path)
+        result["load_npz_s"] = round(time.perf_counter() - started, 3)
+    result["edges"] = len(graph.targets)
+
+    router = RoadRouter(graph)
+    tours = []
+    for tour in range(args.routes):
+        source, target = random.sample(range(len(graph)), 2)
+        found = graph.shortest_path(source, target)
+        if found is not None:
+            nodes = found[0]
+            tours.append(
+                (str(tour), target, nodes[:: max(1, len(nodes) // args.ticks)])
+            )
+
+    # 매 위치마다 새로 경로를 찾는 방식
+    started = time.perf_counter()
+    recomputed = 0
+    for _, target, positions in tours[: max(1, len(tours) // 10)]:
+        for node in positions:
+            graph.shortest_path(node, target)
+            recomputed += 1
+    naive_tick = (time.perf_counter() - started) / max(recomputed, 1)
+
+    # 경로 캐시를 따라 남은 거리만 갱신하는 방식
+    started = time.perf_counter()
+    ticks = 0
+    for tour_id, target, positions in tours:
+        for node in positions:
+            router.remaining(
+                tour_id,
+                float(graph.lat[node]) + random.uniform(-1e-4, 1e-4),
+                float(graph.lon[node]) + random.uniform(-1e-4, 1e-4),
+                float(graph.lat[target]),
+                float(graph.lon[target]),
+            )
+            ticks += 1
+    cached_elapsed = time.perf_counter() - started
+
+    stats = router.stats()
+    result.update(
+        {
+            "astar_avg_ms": round(stats["compute_avg_ms"], 3),
+            "astar_max_ms": round(stats["compute_max_ms"], 3),
+            "recompute_per_tick_us": round(naive_tick * 1e6, 1),
+            "cached_per_tick_us": round(cached_elapsed / ticks * 1e6, 1),
+            "ticks": ticks,
+            "cache_hit_ratio": round(stats["hit_ratio"], 4),
+            "reroutes": stats["reroutes"],
+        }
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
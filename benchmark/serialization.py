@@ -0,0 +1,135 @@
+import json
+import timeit
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+from app.protocol import JSONCodec
+from app.tourstore import TourStore
+from benchmark.tour_store import sample_tour
+from interface.emergency import EmergencyTour, EmergencyTourOPCode
+from interface.response import JSONResponse, envelope
+
+FIELDS = sample_tour(0).model_dump()
+DISPATCH = {"dispatch_id": "0f8fad5b-d9cb-469f-a165-70867728950e", "wave": 1}
+STATS = {
+    name: {"requests": 1200, "hits": 1100, "misses": 100, "avg_ms": 0.42, "max_ms": 7.1}
+    for name in (
+        "worker",
+        "redis_pool",
+        "hospital_index",
+        "auth",
+        "password_hasher",
+        "matching",
+        "fanout",
+        "resume",
+        "dispatch",
+        "websocket",
+        "heartbeat",
+        "location_ingest",
+        "routing",
+        "register_code",
+        "tour_archive",
+        "dashboard",
+        "admission",
+    )
+}
+FINISHED_AT = datetime(2024, 7, 1, tzinfo=timezone.utc)
+HISTORY = {
+    "tours": [
+        {
+            **sample_tour(index).model_dump(mode="json"),
+            "id": f"0f8fad5b-d9cb-469f-a165-{index:012d}",
+            "user_id": f"ambulance{index}",
+            "started_at": (FINISHED_AT - timedelta(minutes=20)).isoformat(),
+            "finished_at": FINISHED_AT.isoformat(),
+            "duration": 1200.0,
+            "point_count": 2400,
+        }
+        for index in range(50)
+    ]
+}
+LOCATION = {
+    "user_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+    "current_location": "127.0276368,37.4979502",
+    "remain_distance": 4213,
+    "eta": 512,
+}
+
+
+def legacy_response(data: dict | None, message: str = "Success") -> bytes:
+    # 모델을 만들고 FastAPI 가 jsonable_encoder 와 표준 json 으로 다시 직렬화하던 경로
+    model = JSONResponse(code=200, message=message, data=data, errors=[])
+    return StarletteJSONResponse(jsonable_encoder(model)).body
+
+
+def legacy_tour_fields(tour: EmergencyTour) -> dict[str, str]:
+    return {
+        "patient_name": tour.patient_name,
+        "symptom": tour.symptom,
+        "license_number": tour.license_number,
+        "status": str(tour.status.value),
+        "hospital": tour.hospital.model_dump_json() if tour.hospital else "",
+        "remain_distance": (
+            "" if tour.remain_distance is None else str(tour.remain_distance)
+        ),
+        "current_location": tour.current_location or "",
+        "eta": "" if tour.eta is None else str(tour.eta),
+    }
+
+
+def legacy_new_tour() -> bytes:
+    # Redis 저장, 대시보드 기록, 응답에서 투어를 각각 직렬화했다
+    tour = EmergencyTour(**FIELDS)
+    legacy_tour_fields(tour)
+    json.dumps(tour.model_dump(mode="json"))
+    return legacy_response({**tour.model_dump(mode="json"), "dispatch": DISPATCH})
+
+
+def new_tour() -> bytes:
+    tour = EmergencyTour(**FIELDS)
+    TourStore.encode(tour)
+    JSONCodec.encode(EmergencyTourOPCode.UPDATE_DATA.value, tour.to_json())
+    return envelope({**tour.to_json(), "dispatch": DISPATCH}).body
+
+
+CASES = {
+    "new_tour": (legacy_new_tour, new_tour),
+    "stats": (lambda: legacy_response(STATS), lambda: envelope(STATS).body),
+    "history_50": (lambda: legacy_response(HISTORY), lambda: envelope(HISTORY).body),
+    "login": (
+        lambda: legacy_response({"token": "x" * 180}, "Login successful"),
+        lambda: envelope({"token": "x" * 180}, message="Login successful").body,
+    ),
+    "location_frame": (
+        lambda: json.dumps(
+            {"op": EmergencyTourOPCode.UPDATE_LOCATION.value, "data": LOCATION}
+        ),
+        lambda: JSONCodec.encode(EmergencyTourOPCode.UPDATE_LOCATION.value, LOCATION),
+    ),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="응답과 투어 직렬화 비용 비교")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, (before, after) in CASES.items():
+        before_time = timeit.timeit(before, number=args.number) / args.number
+        after_time = timeit.timeit(after, number=args.number) / args.number
+        results[name] = {
+            "before_us": round(before_time * 1e6, 2),
+            "after_us": round(after_time * 1e6, 2),
+            "speedup": round(before_time / after_time, 1),
+            "before_bytes": len(before()),
+            "after_bytes": len(after()),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import sys
+import uuid
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import functools
+import subprocess
+
+import uvicorn
+
+BENCH_PASSWORD = "benchmark-password"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_email(index: int) -> str:
+    return f"ambulance{index}@aidnet.test"
+
+
+def spawn_redis() -> subprocess.Popen | None:
+    if os.getenv("REDIS_HOST"):
+        return None
+    binary = shutil.which("redis-server")
+    if binary is None:
+        return None
+    port = free_port()
+    process = subprocess.Popen(
+        [binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+    )
+    os.environ["REDIS_HOST"] = "127.0.0.1"
+    os.environ["REDIS_PORT"] = str(port)
+    time.sleep(0.3)
+    return process
+
+
+class LagSampler:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - started - self.interval) * 1000)
+
+    def drain(self) -> list[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+
+async def seed(users: int):
+    from database.user import User
+    from database.ambulance import Ambulance
+    from app.bitflag import UserBitflag, UserFlag
+    from app.hashing import password_hasher
+
+    flags = UserBitflag()
+    flags.add(UserFlag.USE_EMERGENCY_CALL)
+    hashed_password = await password_hasher.hash(BENCH_PASSWORD)
+    user_rows = [
+        User(
+            id=uuid.uuid4(),
+            username=f"ambulance{index}",
+            email=bench_email(index),
+            hashed_password=hashed_password,
+            flags=flags.zip(),
+        )
+        for index in range(users)
+    ]
+    await User.bulk_create(user_rows, batch_size=500)
+    await Ambulance.bulk_create(
+        [
+            Ambulance(
+                login_id=user.id,
+                license_number=f"{index % 100:02d}가{index:04d}"[:10],
+                driver=f"driver{index}",
+            )
+            for index, user in enumerate(user_rows)
+        ],
+        batch_size=500,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="벤치마크용 서버 (SQLite + 로컬 Redis)"
+    )
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument(
+        "--admission",
+        action="store_true",
+        help="입장 제어를 켠다 (한 주소에서 몰아 보내는 부하 테스트는 기본으로 끈다)",
+    )
+    args = parser.parse_args()
+
+    os.environ["ADMISSION_ENABLED"] = "1" if args.admission else "0"
+    workdir = tempfile.mkdtemp(prefix="aidnet-bench-")
+    os.environ["DATABASE_URI"] = f"sqlite://{workdir}/bench.db"
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    redis_process = spawn_redis()
+
+    import app.server as server_module
+
+    if not os.getenv("REDIS_HOST"):
+        # redis-server 가 없으면 같은 프로세스의 fakeredis 로 대체한다
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeConnection
+
+        os.environ.update(
+            REDIS_HOST="fakeredis", REDIS_PORT="0", REDIS_HEALTH_CHECK_INTERVAL="0"
+        )
+        server_module.open_redis_pool = functools.partial(
+            server_module.open_redis_pool,
+            connection_class=FakeConnection,
+            server=FakeServer(),
+        )
+
+    app = server_module.create_app()
+    lag_sampler = LagSampler()
+
+    @app.post("/bench/lag")
+    async def bench_lag():
+        samples = sorted(lag_sampler.drain())
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "p50_ms": samples[len(samples) // 2],
+            "p99_ms": samples[int(len(samples) * 0.99) - 1],
+            "max_ms": samples[-1],
+        }
+
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096
+        )
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    await seed(args.users)
+    sampler = asyncio.create_task(lag_sampler.run())
+    print("READY", flush=True)
+    try:
+        await serving
+    finally:
+        sampler.cancel()
+        if redis_process is not None:
+            redis_process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
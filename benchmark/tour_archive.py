@@ -0,0 +1,104 @@
+import time
+import json
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+
+from app.track import Track, encode_track, pack_point, unpack_points
+from database.tour import TourArchive
+
+
+def sample_track(length: int) -> list[bytes]:
+    # 0.5초마다 보고되는 구급차 위치를 흉내 낸다
+    timestamp, latitude, longitude = time.time(), 37.5, 127.0
+    points = []
+    for _ in range(length):
+        timestamp += 0.5 + random.uniform(0, 0.05)
+        latitude += random.uniform(-2e-5, 8e-5)
+        longitude += random.uniform(-2e-5, 8e-5)
+        points.append(pack_point(timestamp, latitude, longitude))
+    return points
+
+
+def archive_row(points) -> TourArchive:
+    return TourArchive(
+        id=uuid.uuid4(),
+        user_id=str(uuid.uuid4()),
+        patient_name="환자",
+        symptom="흉통 및 호흡곤란",
+        license_number="12가3456",
+        status=2,
+        hospital=None,
+        started_at=datetime.now(timezone.utc),
+        finished_at=datetime.now(timezone.utc),
+        point_count=len(points),
+        track=encode_track(points),
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="투어 보관 형식과 일괄 저장 성능 측정")
+    parser.add_argument("--tours", type=int, default=500)
+    parser.add_argument("--points", type=int, default=3600)
+    args = parser.parse_args()
+
+    random.seed(0)
+    points = unpack_points(sample_track(args.points))
+    as_json = json.dumps(
+        [[int(t), int(lat), int(lon)] for t, lat, lon in points.tolist()]
+    ).encode()
+
+    started = time.perf_counter()
+    encoded = encode_track(points)
+    encode_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    Track(encoded).to_list()
+    decode_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    Track(encoded).to_list(500)
+    downsample_ms = (time.perf_counter() - started) * 1000
+
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["database.tour"]}
+    )
+    await Tortoise.generate_schemas()
+    tracks = [unpack_points(sample_track(120)) for _ in range(args.tours)]
+
+    started = time.perf_counter()
+    for track in tracks:
+        await archive_row(track).save()
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for offset in range(0, len(tracks), 200):
+        await TourArchive.bulk_create(
+            [archive_row(track) for track in tracks[offset : offset + 200]]
+        )
+    bulk = time.perf_counter() - started
+    await Tortoise.close_connections()
+
+    print(
+        json.dumps(
+            {
+                "points": args.points,
+                "json_bytes_per_point": round(len(as_json) / len(points), 2),
+                "raw_bytes_per_point": points.itemsize,
+                "encoded_bytes_per_point": round(len(encoded) / len(points), 2),
+                "encode_ms": round(encode_ms, 3),
+                "decode_ms": round(decode_ms, 3),
+                "decode_downsample_500_ms": round(downsample_ms, 3),
+                "tours": args.tours,
+                "single_insert_tours_per_s": round(args.tours / single),
+                "bulk_insert_tours_per_s": round(args.tours / bulk),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import time
+import json
+import uuid
+import asyncio
+import argparse
+from json import dumps, loads
+
+from app.tourstore import TourStore
+from benchmark.redis_client import connect
+from interface.emergency import EmergencyTour, EmergencyTourStatus
+
+
+def sample_tour(index: int) -> EmergencyTour:
+    return EmergencyTour(
+        patient_name=f"환자{index}",
+        symptom="흉통 및 호흡곤란",
+        license_number="12가3456",
+        status=EmergencyTourStatus.RIDE,
+        hospital={
+            "name": "서울대학교병원",
+            "address": "서울특별시 종로구 대학로 101",
+            "latitude": 37.5796,
+            "longitude": 126.9990,
+        },
+        remain_distance=4200,
+        current_location="127.0012,37.5665",
+    )
+
+
+async def legacy_update(client, user_id: str, index: int):
+    tour = loads(await client.hget("emergency", user_id))
+    tour["current_location"] = f"127.{index:04d},37.5665"
+    tour["remain_distance"] = 4200 - index
+    await client.hset("emergency", user_id, dumps(tour))
+
+
+async def field_update(store: TourStore, user_id: str, index: int):
+    await store.update(
+        user_id,
+        current_location=f"127.{index:04d},37.5665",
+        remain_distance=4200 - index,
+    )
+
+
+async def measure(func, user_ids: list[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for index in range(rounds):
+        await asyncio.gather(*(func(user_id, index) for user_id in user_ids))
+    return (time.perf_counter() - started) / (rounds * len(user_ids)) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="투어 저장 방식별 갱신 비용 비교")
+    parser.add_argument("--tours", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    client = connect()
+    await client.flushdb()
+    store = TourStore()
+    store.start(client)
+    user_ids = [str(uuid.uuid4()) for _ in range(args.tours)]
+    for index, user_id in enumerate(user_ids):
+        tour = sample_tour(index)
+        await client.hset("emergency", user_id, tour.model_dump_json())
+        await store.create(user_id, tour)
+
+    legacy = await measure(
+        lambda user_id, index: legacy_update(client, user_id, index),
+        user_ids,
+        args.rounds,
+    )
+    field = await measure(
+        lambda user_id, index: field_update(store, user_id, index),
+        user_ids,
+        args.rounds,
+    )
+    print(
+        json.dumps(
+            {
+                "tours": args.tours,
+                "legacy_json_update_us": round(legacy, 2),
+                "field_update_us": round(field, 2),
+                "legacy_round_trips_per_update": 2,
+                "field_round_trips_per_update": 1,
+                "legacy_bytes_per_update": len(sample_tour(0).model_dump_json()) * 2,
+                "field_bytes_per_update": len("127.0000,37.5665") + len("4200"),
+            },
+            indent=2,
+        )
+    )
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,8 +4,13 @@ from tortoise import fields
 
 class Hospital(Model):
     login_id = fields.IntField(pk=True)
+    # 병원 계정, 구급차의 login_id 처럼 User.id 를 그대로 담는다
+    user_id = fields.UUIDField(null=True, unique=True)
     name = fields.CharField(null=False, max_length=100)
     address = fields.CharField(null=False, max_length=100)
+    latitude = fields.FloatField(null=True)
+    longitude = fields.FloatField(null=True)
+    bed_capacity = fields.IntField(default=10)
     medical_staff = fields.JSONField(
         default=[
             {"name": "정신병좌", "position": "정신의학과"},
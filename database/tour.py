@@ -0,0 +1,17 @@
+from tortoise.models import Model
+from tortoise import fields
+
+
+class TourArchive(Model):
+    id = fields.UUIDField(pk=True)
+    user_id = fields.CharField(null=False, max_length=36, index=True)
+    patient_name = fields.CharField(null=False, max_length=100)
+    symptom = fields.TextField(null=False)
+    license_number = fields.CharField(null=False, max_length=10)
+    status = fields.IntField(null=False)
+    hospital = fields.JSONField(null=True)
+    started_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=False, index=True)
+    point_count = fields.IntField(default=0)
+    # app.track 의 델타 인코딩 형식 (시각, 위도, 경도)
+    track = fields.BinaryField(null=True)
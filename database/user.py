@@ -6,10 +6,11 @@ from tortoise import fields, validators
 
 class User(Model):
     id = fields.UUIDField(pk=True)
-    username = fields.CharField(null=False, max_length=100)
+    username = fields.CharField(null=False, max_length=100, unique=True)
     email = fields.CharField(
         null=False,
         max_length=100,
+        unique=True,
         validators=[
             validators.RegexValidator(
                 "^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", re.I
@@ -31,6 +32,6 @@ class UserRegisterCode(Model):
             ),
         ],
     )
-    code = fields.CharField(null=False, max_length=6)
+    code = fields.CharField(null=False, max_length=6, unique=True)
     created_at = fields.DatetimeField(auto_now_add=True)
-    expired_at = fields.DatetimeField(null=False)
+    expired_at = fields.DatetimeField(null=False, index=True)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from enum import Enum
 
 
@@ -7,6 +7,16 @@ class EmergencyTourOPCode(Enum):
     UPDATE_DATA = 2  # 데이터 업데이트 (클라이언트, 서버)
     UPDATE_LOCATION = 3  # 위치 업데이트 (클라이언트)
     UPDATE_STATUS = 4  # 상태 업데이트 (서버)
+    SNAPSHOT = 5  # 대시보드 전체 목록 한 페이지 (서버)
+    DELTA = 6  # 대시보드 변경 사항, seq 순서 (서버)
+    RESYNC = 7  # 놓친 seq 이후부터 다시 받기 (클라이언트)
+    OFFER = 8  # 병원에 호출 수락 요청 (서버)
+    ACCEPT = 9  # 호출 수락 (병원 클라이언트), 결과 (서버)
+    DECLINE = 10  # 호출 거절 (병원 클라이언트)
+    CANCEL_OFFER = 11  # 다른 병원이 먼저 수락했거나 호출이 끝나 요청 취소 (서버)
+    RESUME = 12  # 마지막으로 받은 seq 이후부터 이어 받기 (클라이언트), 완료 (서버)
+    CAPACITY = 13  # 병상, 당직 진료과 보고 (병원 클라이언트), 바뀐 병원의 현황 (서버)
+    ERROR = 14  # 해석하거나 처리할 수 없는 프레임 (서버)
 
 
 class EmergencyTourStatus(Enum):
@@ -15,19 +25,25 @@ class EmergencyTourStatus(Enum):
     ARRIVE = 2
 
 
-class Hospital(Enum):
+class Hospital(BaseModel):
     name: str
     address: str
+    latitude: float | None = None
+    longitude: float | None = None
 
 
 class AmbulanceCallRequest(BaseModel):
     name: str
     symptom: str
-    location_x: str
-    location_y: str
+    # 경도, 위도. 숫자 문자열도 받고, 숫자가 아니거나 범위를 벗어나면 422 로 거절한다
+    location_x: float = Field(ge=-180, le=180)
+    location_y: float = Field(ge=-90, le=90)
 
 
 class EmergencyTour(BaseModel):
+    # 바뀐 상태는 새 객체로 만들므로 직렬화 결과를 객체에 붙여 두고 다시 쓴다
+    model_config = ConfigDict(frozen=True)
+
     patient_name: str
     symptom: str
     license_number: str
@@ -35,3 +51,12 @@ class EmergencyTour(BaseModel):
     hospital: Hospital | None
     remain_distance: int | None  # m 단위
     current_location: str | None
+    eta: int | None = None  # 초 단위 도착 예정 시간
+
+    _json: dict | None = PrivateAttr(default=None)
+
+    def to_json(self) -> dict:
+        # Redis 저장, 대시보드, 응답이 같은 dict 를 공유하므로 고치지 말고 복사해서 쓴다
+        if self._json is None:
+            self._json = self.model_dump(mode="json")
+        return self._json
@@ -1,3 +1,4 @@
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
 
@@ -9,5 +10,23 @@ class JSONResponse(BaseModel):
 
 
 class WebsocketResponse(BaseModel):
-    op: str
+    op: int
     data: dict | None
+
+
+def envelope(
+    data: dict | None = None,
+    message: str = "Success",
+    code: int = 200,
+    errors: list[dict] | None = None,
+) -> ORJSONResponse:
+    # JSONResponse 와 같은 모양이지만 모델 검증과 jsonable_encoder 를 거치지 않고 바로 직렬화한다
+    return ORJSONResponse(
+        {
+            "code": code,
+            "message": message,
+            "data": data,
+            "errors": [] if errors is None else errors,
+        },
+        status_code=code,
+    )
@@ -1,136 +1,106 @@
-import os
-import jwt
-import aiohttp
-from json import dumps, loads
+import time
+import uuid
+from datetime import datetime
+
 from dotenv import load_dotenv
-import redis.asyncio as redis
 
-from app.redispool import RedisPool
+from app.auth import AuthenticationError, Principal, token_authority, require
+from app.spatial import hospital_index
+from app.matching import hospital_matcher
+from app.dispatch import hospital_dispatcher
+from app.capacity import capacity_board
+from app.fanout import tour_topic, hospital_topic
+from app.dashboard import DashboardFilter, dashboard_feed
+from app.connection import SlowConsumerPolicy, websocket_manager
+from app.ingest import location_ingestor
+from app.resume import frame_log
+from app.tourstore import tour_store
+from app.track import Track
+from app.protocol import (
+    INVALID_FRAME,
+    error_frame,
+    negotiate,
+    op_label,
+    receive_frame,
+)
+from app.metrics import websocket_frame_seconds
 
 from fastapi import (
     APIRouter,
     HTTPException,
     Depends,
+    Query,
     status,
     WebSocket,
     WebSocketException,
+    WebSocketDisconnect,
 )
 from fastapi_utils.cbv import cbv
-from jwt.exceptions import InvalidTokenError
 
-from fastapi.security import OAuth2PasswordBearer
-from database.user import User as DatabaseUser
 from database.ambulance import Ambulance
+from database.hospital import Hospital
+from database.tour import TourArchive
 
-from app.bitflag import UserFlag, UserBitflag
+from app.bitflag import UserFlag
 from interface.emergency import (
     AmbulanceCallRequest,
     EmergencyTour,
     EmergencyTourStatus,
     EmergencyTourOPCode,
 )
-from interface.response import JSONResponse, WebsocketResponse
+from interface.response import envelope
 
 load_dotenv(verbose=True)
 
 router = APIRouter(tags=["call", "emergency"], prefix="/emergency")
 
 
-async def get_redis_pool() -> redis.Redis:
-    redis_pool = RedisPool(
-        host=os.environ["REDIS_HOST"], port=int(os.environ["REDIS_PORT"]), db=0
-    )
-    redis_connection = await redis_pool.get_connection()
-    return redis_connection
-
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+def get_websocket_token(websocket: WebSocket) -> str:
+    authorization = websocket.headers.get("Authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization.split(" ", 1)[1]
+    token = websocket.query_params.get("token")
+    if token is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    return token
 
-    async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.update({user_id: websocket})
 
-    def disconnect(self, user_id: str):
-        self.active_connections[user_id].close()
-        del self.active_connections[user_id]
+ARCHIVE_SUMMARY_FIELDS = (
+    "id",
+    "user_id",
+    "patient_name",
+    "symptom",
+    "license_number",
+    "status",
+    "hospital",
+    "started_at",
+    "finished_at",
+    "point_count",
+)
 
-    async def send_each(self, user_id: str, data: dict):
-        connection = self.active_connections[user_id]
-        await connection.send_json(data)
 
-    async def broadcast(self, data: dict):
-        for connection in self.active_connections.values():
-            await connection.send_json(data)
+def archive_summary(tour: dict) -> dict:
+    started_at, finished_at = tour["started_at"], tour["finished_at"]
+    return {
+        **tour,
+        "id": str(tour["id"]),
+        "started_at": started_at.isoformat() if started_at else None,
+        "finished_at": finished_at.isoformat(),
+        "duration": (
+            (finished_at - started_at).total_seconds() if started_at else None
+        ),
+    }
 
 
 @cbv(router)
 class Emergency:
-    oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-    redis_pool: redis.Redis = Depends(get_redis_pool)
-    websocket_manager: ConnectionManager = ConnectionManager()
-
-    @staticmethod
-    async def update_tour(redis_pool: redis.Redis, user_id: str, data: dict):
-        await redis_pool.hset("emergency", user_id, dumps(data))
-
-    @staticmethod
-    async def delete_tour(redis_pool: redis.Redis, user_id: str):
-        await redis_pool.hdel("emergency", user_id)
-
-    @staticmethod
-    async def get_tour(redis_pool: redis.Redis, user_id: str):
-        data = await redis_pool.hget("emergency", user_id)
-        return loads(data)
-
-    @staticmethod
-    def get_user_id_from(token: str) -> str:
-        return jwt.decode(
-            token, os.environ["JWT_SECRET_KEY"], algorithms=["HS256"]
-        ).get("sub")
-
-    @staticmethod
-    async def get_current_user(token: str = Depends(oauth2_scheme)) -> DatabaseUser:
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        try:
-            payload = jwt.decode(
-                token, os.environ["JWT_SECRET_KEY"], algorithms=["HS256"]
-            )
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                raise credentials_exception
-        except InvalidTokenError:
-            raise credentials_exception
-        user = await DatabaseUser.get(id=user_id)
-        if user is None:
-            raise credentials_exception
-        user_flag = UserBitflag.unzip(user.flags)
-        if not user_flag.has(UserFlag.USE_EMERGENCY_CALL):
-            raise HTTPException(
-                status_code=401,
-                detail="FLAG: USE_EMERGENCY_CALL, insufficient permissions",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user
-
     @router.post("/new")
     async def new_tour(
         self,
         patient_data: AmbulanceCallRequest,
-        current_user: "DatabaseUser" = Depends(get_current_user),
+        principal: Principal = Depends(require(UserFlag.USE_EMERGENCY_CALL)),
     ):
-        current_user = await current_user
-        if await self.redis_pool.hexists("emergency", current_user.id):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="This user's tour is already in progress.",
-            )
-        ambulance = await Ambulance.get(login_id=current_user.id)
+        ambulance = await Ambulance.get(login_id=principal.user_id)
         tour = EmergencyTour(
             patient_name=patient_data.name,
             symptom=patient_data.symptom,
@@ -140,61 +110,356 @@ class Emergency:
             remain_distance=None,
             current_location=None,
         )
-        await self.update_tour(self.redis_pool, current_user.id, tour.model_dump())
-        return JSONResponse(
-            code=200,
-            message="Success",
-            data=tour.model_dump(),
-            errors=[],
+        if not await tour_store.create(principal.user_id, tour):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This user's tour is already in progress.",
+            )
+        await dashboard_feed.record(
+            EmergencyTourOPCode.UPDATE_DATA.value,
+            principal.user_id,
+            tour.to_json(),
+        )
+        # 후보 병원들에 동시에 수락 요청을 보내고, 응답을 기다리지 않고 바로 돌려준다
+        dispatch = await hospital_dispatcher.dispatch(
+            principal.user_id,
+            patient_data.location_y,
+            patient_data.location_x,
+            patient_data.symptom,
+            patient_data.name,
+        )
+        return envelope({**tour.to_json(), "dispatch": dispatch})
+
+    @router.post("/call")
+    async def emergency(
+        self,
+        patient_data: AmbulanceCallRequest,
+        _principal: Principal = Depends(require(UserFlag.USE_EMERGENCY_CALL)),
+    ):
+        matches = hospital_matcher.match(
+            patient_data.location_y,
+            patient_data.location_x,
+            patient_data.symptom,
+            k=5,
+        )
+        if not matches:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No emergency center found nearby.",
+            )
+        candidates = [
+            {
+                "hospital_id": match.hospital_id,
+                "name": hospital_index.info[match.hospital_id]["name"],
+                "address": hospital_index.info[match.hospital_id]["address"],
+                "distance": round(match.distance),
+                "score": round(match.score, 4),
+            }
+            for match in matches
+        ]
+        return envelope(
+            {
+                "name": candidates[0]["name"],
+                "address": candidates[0]["address"],
+                "distance": candidates[0]["distance"],
+                "candidates": candidates,
+            }
+        )
+
+    @router.post("/finish")
+    async def finish_tour(
+        self,
+        principal: Principal = Depends(require(UserFlag.USE_EMERGENCY_CALL)),
+    ):
+        archive_id = str(uuid.uuid4())
+        if not await tour_store.finish(principal.user_id, archive_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This user's tour is not in progress.",
+            )
+        location_ingestor.forget(principal.user_id)
+        await hospital_dispatcher.cancel(principal.user_id)
+        data = {"finished": True, "archive_id": archive_id}
+        await frame_log.publish(
+            principal.user_id,
+            EmergencyTourOPCode.UPDATE_STATUS.value,
+            {"user_id": principal.user_id, **data},
+        )
+        await dashboard_feed.record(
+            EmergencyTourOPCode.UPDATE_STATUS.value, principal.user_id, data
+        )
+        return envelope({"archive_id": archive_id})
+
+    @router.get("/history")
+    async def tour_history(
+        self,
+        user_id: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int = Query(default=50, ge=1, le=500),
+        _principal: Principal = Depends(require(UserFlag.VIEW_EMERGENCY_CALL)),
+    ):
+        query = TourArchive.all()
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        if since is not None:
+            query = query.filter(finished_at__gte=since)
+        if until is not None:
+            query = query.filter(finished_at__lt=until)
+        # 목록에서는 경로 바이너리를 읽지 않는다
+        tours = (
+            await query.order_by("-finished_at")
+            .limit(limit)
+            .values(*ARCHIVE_SUMMARY_FIELDS)
         )
+        return envelope({"tours": [archive_summary(tour) for tour in tours]})
 
-    @router.websocket("/live")
-    async def live_tour(
-        self, websocket: WebSocket, token: str = Depends(oauth2_scheme)
+    @router.get("/history/{archive_id}")
+    async def tour_replay(
+        self,
+        archive_id: uuid.UUID,
+        max_points: int = Query(default=500, ge=0),
+        _principal: Principal = Depends(require(UserFlag.VIEW_EMERGENCY_CALL)),
     ):
-        if not await self.redis_pool.hexists("emergency", self.get_user_id_from(token)):
-            raise WebSocketException(
-                code=4000,
-                reason="This user's tour is not in progress.",
+        tour = (
+            await TourArchive.filter(id=archive_id)
+            .first()
+            .values(*ARCHIVE_SUMMARY_FIELDS, "track")
+        )
+        if tour is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archived tour not found.",
             )
+        track = Track(tour.pop("track") or b"")
+        return envelope(
+            {
+                **archive_summary(tour),
+                # max_points 가 0 이면 전체 경로를 돌려준다
+                "track": track.to_list(max_points),
+            }
+        )
+
+
+async def nearby_hospitals(user_id: str) -> list[int]:
+    # 구급차에는 현재 위치(아직 없으면 호출한 위치) 기준 매칭 반경 안의 병원만 보낸다
+    (location,) = await tour_store.get_fields(user_id, "current_location")
+    if location:
+        longitude, latitude = map(float, location.split(b","))
+    else:
+        origin = await hospital_dispatcher.origin(user_id)
+        if origin is None:
+            return []
+        latitude, longitude = origin
+    return [
+        hospital_id
+        for hospital_id, _ in hospital_index.radius(
+            latitude, longitude, hospital_matcher.radius
+        )
+    ]
+
 
-        await self.websocket_manager.connect(self.get_user_id_from(token), websocket)
+@router.websocket("/live")
+async def live_tour(websocket: WebSocket, seq: int | None = None):
+    try:
+        principal = token_authority.authenticate(get_websocket_token(websocket))
+    except AuthenticationError:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    if not principal.has(UserFlag.USE_EMERGENCY_CALL):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    user_id = principal.user_id
+    if not await tour_store.exists(user_id):
+        raise WebSocketException(
+            code=4000,
+            reason="This user's tour is not in progress.",
+        )
+
+    codec, subprotocol = negotiate(websocket)
+    await websocket_manager.connect(
+        user_id,
+        websocket,
+        topics=(tour_topic(user_id),),
+        codec=codec,
+        subprotocol=subprotocol,
+    )
+    try:
+        # 재접속하면서 마지막 seq 를 알려 주면 연결하자마자 빠진 프레임을 받는다
+        if seq is not None:
+            await frame_log.resume(user_id, seq)
+        capacity_board.watch(user_id, await nearby_hospitals(user_id))
         while True:
-            data: WebsocketResponse = await websocket.receive_json()
-            if data.op == EmergencyTourOPCode.HELLO:
-                await websocket.send_json(
-                    WebsocketResponse(
-                        op=EmergencyTourOPCode.HELLO, data=None
-                    ).model_dump()
+            op = None
+            try:
+                op, data = await receive_frame(websocket, codec)
+                started = time.perf_counter()
+                websocket_manager.touch(user_id)
+                if op == EmergencyTourOPCode.HELLO.value:
+                    websocket_manager.send_each(
+                        user_id,
+                        {"op": EmergencyTourOPCode.HELLO.value, "data": None},
+                    )
+                elif op == EmergencyTourOPCode.UPDATE_LOCATION.value:
+                    location_ingestor.submit(
+                        user_id,
+                        float(data["location_x"]),
+                        float(data["location_y"]),
+                    )
+                elif op == EmergencyTourOPCode.RESUME.value:
+                    await frame_log.resume(user_id, (data or {}).get("seq"))
+                websocket_frame_seconds.observe(
+                    time.perf_counter() - started, op_label(op)
                 )
+            except INVALID_FRAME as error:
+                websocket_manager.send_each(user_id, error_frame(op, error))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 같은 사용자가 다시 접속했으면 새 연결의 구독은 남겨 둔다
+        if websocket_manager.owns(user_id, websocket):
+            capacity_board.unwatch(user_id)
+        await websocket_manager.disconnect(user_id, websocket)
+
+
+@router.websocket("/dashboard")
+async def dashboard(
+    websocket: WebSocket,
+    statuses: str | None = Query(default=None, alias="status"),
+    user_id: str | None = None,
+    seq: int | None = None,
+    capacity: str | None = None,
+):
+    try:
+        principal = token_authority.authenticate(get_websocket_token(websocket))
+    except AuthenticationError:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    if not principal.has(UserFlag.VIEW_EMERGENCY_CALL):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    try:
+        dashboard_filter = DashboardFilter.parse(statuses, user_id)
+        hospital_ids = capacity_board.parse(capacity) if capacity else ()
+    except ValueError:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Invalid filter."
+        )
+
+    # 같은 사용자가 여러 창에서 대시보드를 열 수 있도록 토큰 단위로 구분한다
+    key = f"dashboard:{principal.token_id}"
+    codec, subprotocol = negotiate(websocket)
+    await websocket_manager.connect(
+        key, websocket, codec=codec, subprotocol=subprotocol
+    )
+    try:
+        await dashboard_feed.attach(key, dashboard_filter, seq)
+        # 병상 현황은 capacity=all 또는 병원 id 목록을 준 대시보드에만 보낸다
+        if capacity:
+            capacity_board.watch(key, hospital_ids)
+        while True:
+            op = None
+            try:
+                op, data = await receive_frame(websocket, codec)
+                websocket_manager.touch(key)
+                if op == EmergencyTourOPCode.HELLO.value:
+                    websocket_manager.send_each(
+                        key,
+                        {"op": EmergencyTourOPCode.HELLO.value, "data": None},
+                    )
+                elif op == EmergencyTourOPCode.RESYNC.value:
+                    await dashboard_feed.resync(key, (data or {}).get("seq"))
+            except INVALID_FRAME as error:
+                websocket_manager.send_each(key, error_frame(op, error))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 같은 토큰으로 다시 접속한 연결의 세션과 구독은 남겨 둔다
+        if websocket_manager.owns(key, websocket):
+            dashboard_feed.detach(key)
+            capacity_board.unwatch(key)
+        await websocket_manager.disconnect(key, websocket)
+
+
+@router.websocket("/hospital")
+async def hospital_offers(websocket: WebSocket):
+    try:
+        principal = token_authority.authenticate(get_websocket_token(websocket))
+    except AuthenticationError:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    if not principal.has(UserFlag.TAKE_EMERGENCY_CALL):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    # 병원은 연결한 계정에 묶인 곳으로만 정해진다
+    hospital_id = (
+        await Hospital.filter(user_id=principal.user_id)
+        .first()
+        .values_list("login_id", flat=True)
+    )
+    if hospital_id is None:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION, reason="No hospital for this user."
+        )
 
-    # @router.post("/call")
-    # async def emergency(
-    #     self,
-    #     patient_data: AmbulanceCallRequest,
-    #     current_user: "DatabaseUser" = Depends(get_current_user),
-    # ):
-    #     url = "https://dapi.kakao.com/v2/local/search/keyword.json"
-    #     params = {
-    #         "y": patient_data.location_y,
-    #         "x": patient_data.location_x,
-    #         "radius": "20000",
-    #         "query": "응급의료센터",
-    #     }
-    #     headers = {"Authorization": "KakaoAK " + os.environ["KAKAO_REST_API_KEY"]}
-    #     async with aiohttp.ClientSession() as session:
-    #         async with session.get(url, headers=headers, params=params) as response:
-    #             result = await response.json()
-    #     hospital = [
-    #         item for item in result["documents"] if not "산부인과" in item["place_name"]
-    #     ]
-    #     return JSONResponse(
-    #         code=200,
-    #         message="Success",
-    #         data={
-    #             "name": hospital[0]["place_name"],
-    #             "address": hospital[0]["address_name"],
-    #             "distance": hospital[0]["distance"],
-    #         },
-    #         errors=[],
-    #     )
+    key = f"hospital:{principal.token_id}"
+    codec, subprotocol = negotiate(websocket)
+    # 요청마다 내용이 다르므로 덮어쓰기 정책을 쓰면 안 된다
+    await websocket_manager.connect(
+        key,
+        websocket,
+        topics=(hospital_topic(hospital_id),),
+        policy=SlowConsumerPolicy.DROP_OLDEST,
+        codec=codec,
+        subprotocol=subprotocol,
+    )
+    try:
+        while True:
+            op = None
+            try:
+                op, data = await receive_frame(websocket, codec)
+                started = time.perf_counter()
+                websocket_manager.touch(key)
+                if op == EmergencyTourOPCode.HELLO.value:
+                    websocket_manager.send_each(
+                        key,
+                        {"op": EmergencyTourOPCode.HELLO.value, "data": None},
+                    )
+                elif op == EmergencyTourOPCode.ACCEPT.value:
+                    accepted = await hospital_dispatcher.accept(
+                        data["user_id"], data["dispatch_id"], hospital_id
+                    )
+                    websocket_manager.send_each(
+                        key,
+                        {
+                            "op": EmergencyTourOPCode.ACCEPT.value,
+                            "data": {
+                                "user_id": data["user_id"],
+                                "dispatch_id": data["dispatch_id"],
+                                "accepted": accepted,
+                            },
+                        },
+                    )
+                elif op == EmergencyTourOPCode.DECLINE.value:
+                    await hospital_dispatcher.decline(
+                        data["user_id"], data["dispatch_id"], hospital_id
+                    )
+                elif op == EmergencyTourOPCode.CAPACITY.value:
+                    # set 은 값을 그대로, add 는 증감으로 반영한다 (예: 입원 {"add": {"occupied": 1}})
+                    result = {"hospital_id": hospital_id}
+                    try:
+                        version = await capacity_board.update(
+                            hospital_id,
+                            values=(data or {}).get("set"),
+                            deltas=(data or {}).get("add"),
+                        )
+                    except (TypeError, ValueError) as error:
+                        result["error"] = str(error)
+                    else:
+                        result.update(version=version, changed=bool(version))
+                    websocket_manager.send_each(
+                        key, {"op": EmergencyTourOPCode.CAPACITY.value, "data": result}
+                    )
+                websocket_frame_seconds.observe(
+                    time.perf_counter() - started, op_label(op)
+                )
+            except INVALID_FRAME as error:
+                websocket_manager.send_each(key, error_frame(op, error))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await websocket_manager.disconnect(key, websocket)